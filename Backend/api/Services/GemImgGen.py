@@ -1,19 +1,26 @@
-from google import genai
-from PIL import Image
+"""
+Image -> ``user_items`` list step of the bestBuy/compareData pipeline.
+
+Nothing here talks to Gemini at import time; call ``get_grocery_items``.
+Standalone run (from Backend/): ``python -m api.Services.GemImgGen``
+"""
+import ast
+import logging
+import mimetypes
 import time
-import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# 🚨 SECURITY WARNING: Hardcoding keys like this is NOT recommended for production.
-# This is done strictly for a quick local demonstration.
-# Use environment variables or a secure secret manager for real applications.
-load_dotenv(Path('Backend/config/.env'))
-HARDCODED_GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from .gemini_client import GeminiAPIError, build_payload, extract_text, get_client, image_part
+from .routing import choose_model
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 MODEL_NAME = "gemini-2.5-flash"
-IMAGE_FILE_PATH ='Backend/dataset/images/p1.jpg'
+IMAGE_FILE_PATH = str(Path(__file__).resolve().parents[2] / 'dataset' / 'images' / 'p1.jpg')
 PROMPT = """
 Analyze the image of a grocery setting (like a kitchen, pantry, or supermarket aisle).
 Crucially, generate a Python list named 'user_items' containing strings, where each string is a visible **grocery item** followed by its estimated quantity (e.g., 'apple 5', 'baguette 1', 'butter 2 sticks').
@@ -24,100 +31,88 @@ Example format for the list:
 Do not include any architectural description, other text, explanation, or markdown formatting (like ```json or ```python) in your response. The response must *only* be the list assignment: user_items = [...]
 """
 
-def describe_image_hardcoded(image_path: str, prompt: str, model_name: str, api_key: str) -> tuple[str, str | None]:
+
+def _load_image(image_path):
+    """Wrap a file on disk like an upload so ``image_part`` can preprocess it."""
+    path = Path(image_path)
+    content_type = mimetypes.guess_type(path.name)[0] or "image/jpeg"
+    return SimpleUploadedFile(path.name, path.read_bytes(), content_type=content_type)
+
+
+def describe_image(image_path: str = IMAGE_FILE_PATH, prompt: str = PROMPT, model_name: str | None = None, use_cache: bool = True) -> tuple[str, str | None]:
     """
-    Connects to the Gemini API and returns the full response text 
+    Send the image to Gemini and return the full printable output
     and the raw text containing the 'user_items' list assignment.
     """
     try:
         start_time = time.time()
-        
-        # 1. Initialize the client using the hardcoded key
-        client = genai.Client(api_key=api_key)
-
-        # 2. Open the image file
-        img = Image.open(image_path)
-        
-        # 3. Call the API with Multimodal Content
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[prompt, img]
-        )
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-        
-        raw_text = response.text.strip()
-        
+        payload = build_payload([{"text": prompt}, image_part(_load_image(image_path))])
+        model_name = model_name or choose_model("describe_image", payload, MODEL_NAME)
+        result = get_client().generate_content(model_name, payload, use_cache=use_cache)
+        execution_time = time.time() - start_time
+
+        raw_text = extract_text(result).strip()
+
         full_output = (
             f"\n--- Gemini Image Description ---\n"
             f"{raw_text}\n"
             f"--------------------------------\n"
-            f"API Call Time (Excluding network latency to first token): {execution_time:.2f} seconds."
+            f"API Call Time: {execution_time:.2f} seconds."
         )
 
         return full_output, raw_text
 
     except FileNotFoundError:
-        return f"Error: Image file not found at '{IMAGE_FILE_PATH}'.", None
-    except Exception as e:
+        logger.warning("Image file not found at %s", image_path)
+        return f"Error: Image file not found at '{image_path}'.", None
+    except GeminiAPIError as e:
+        logger.warning("Gemini API error: %s", e.text)
+        return f"Gemini API error: {e.text}", None
+    except (requests.exceptions.RequestException, KeyError, IndexError) as e:
+        logger.warning("Image description failed: %s", e)
         return f"An error occurred during the API call: {e}", None
 
 
-# ✨ NEW FUNCTION FOR EXPORT ✨
-def get_grocery_items(image_path: str = IMAGE_FILE_PATH, prompt: str = PROMPT, model_name: str = MODEL_NAME, api_key: str = HARDCODED_GEMINI_API_KEY) -> list:
-    """
-    Executes the image description, parses the raw output, and returns the user_items list.
-    """
-    if not api_key:
-        print("API Key is missing for get_grocery_items.")
+def parse_user_items(raw_text: str | None) -> list:
+    """Parse ``user_items = [...]`` as a literal list; anything else gives []."""
+    if not raw_text:
+        return []
+    name, _, value = raw_text.strip().partition("=")
+    if name.strip() != "user_items":
         return []
+    try:
+        items = ast.literal_eval(value.strip())
+    except (ValueError, SyntaxError) as e:
+        logger.warning("Could not parse user_items from Gemini output: %s", e)
+        return []
+    return [str(item) for item in items] if isinstance(items, list) else []
 
-    # Call the core function
-    _, raw_response_text = describe_image_hardcoded(image_path, prompt, model_name, api_key)
 
-    if raw_response_text and raw_response_text.startswith("user_items = ["):
-        try:
-            local_vars = {}
-            # SAFELY execute the string to assign the list to local_vars['user_items']
-            exec(raw_response_text, {}, local_vars) 
-            return local_vars.get('user_items', [])
-        except Exception as e:
-            print(f"Error during parsing/execution of raw response: {e}")
-            return []
-    
-    return []
+def get_grocery_items(image_path: str = IMAGE_FILE_PATH, prompt: str = PROMPT, model_name: str | None = None, use_cache: bool = True) -> list:
+    """
+    Executes the image description, parses the raw output, and returns the user_items list.
+    """
+    _, raw_response_text = describe_image(image_path, prompt, model_name, use_cache)
+    return parse_user_items(raw_response_text)
 
 
 # --- Execution (Kept for testing/standalone run) ---
 if __name__ == "__main__":
-    if HARDCODED_GEMINI_API_KEY is None or HARDCODED_GEMINI_API_KEY == "YOUR_HARDCODED_GEMINI_API_KEY_HERE":
-        print("Please replace 'YOUR_HARDCODED_GEMINI_API_KEY_HERE' with your actual key to run this code.")
+    import os
+
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+    print("Starting image analysis with Gemini 2.5 Flash...")
+    result_output, raw_response_text = describe_image()
+    print(result_output)
+
+    user_items = parse_user_items(raw_response_text)
+    if user_items:
+        print("\n--- Parsed user_items Variable ---")
+        for item in user_items:
+            print(f"  - {item}")
+        print("----------------------------------")
     else:
-        print("Starting fast execution using hardcoded Gemini 2.5 Flash...")
-        
-        # We still run this for the detailed printout, even though the main task 
-        # is now handled by get_grocery_items for external use.
-        result_output, raw_response_text = describe_image_hardcoded(IMAGE_FILE_PATH, PROMPT, MODEL_NAME, HARDCODED_GEMINI_API_KEY)
-        print(result_output)
-
-        # 🚀 NEW LOGIC START 🚀 (Redundant, but kept for console output demonstration)
-        if raw_response_text and raw_response_text.startswith("user_items = ["):
-            try:
-                local_vars = {}
-                exec(raw_response_text, {}, local_vars)
-                user_items = local_vars.get('user_items')
-                
-                if user_items:
-                    print("\n--- Parsed user_items Variable ---")
-                    print(f"Variable Type: {type(user_items)}")
-                    print(f"Variable Value (as a list):")
-                    for item in user_items:
-                        print(f"  - {item}")
-                    print("----------------------------------")
-                else:
-                    print("\nCould not successfully parse the 'user_items' variable.")
-
-            except Exception as e:
-                print(f"\nError during parsing/execution of raw response: {e}")
-        # 🚀 NEW LOGIC END 🚀
\ No newline at end of file
+        print("\nCould not successfully parse the 'user_items' variable.")
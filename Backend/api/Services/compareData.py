@@ -1,54 +1,24 @@
-import os
+"""
+Restock step of the bestBuy/compareData pipeline: compares the inventory
+target with what bestBuy found and saves the restock list.
+
+Nothing here talks to Gemini at import time; call ``run`` (or
+``compare_with_stock`` with a bestBuy result you already have).
+Standalone run (from Backend/): ``python -m api.Services.compareData``
+"""
 import json
-import time
-import sys
+import logging
 from pathlib import Path
-from dotenv import load_dotenv
-
-# ✅ Import the Google GenAI SDK
-from google import genai
-from google.genai.errors import APIError
-
-# -------------------------------------------------------------------
-# 0️⃣ Import final_output from bestBuy.py (safe path handling)
-# -------------------------------------------------------------------
-try:
-    # Ensure we can import from the same directory as this script
-    script_dir = Path(__file__).resolve().parent
-    sys.path.append(str(script_dir))
-    from bestBuy import final_output
-except Exception as e:
-    print(f"⚠️ Could not import bestBuy.final_output ({e}) — using fallback empty data.")
-    final_output = {
-        "price_estimates": [],
-        "coupons_and_deals": [],
-        "cheapest_store_recommendation": {"store": None, "estimated_total_cost": 0.0},
-    }
-
-# -------------------------------------------------------------------
-# 1️⃣ Load environment variables safely
-# -------------------------------------------------------------------
-env_path = Path("Backend/config/.env")
-if not env_path.exists():
-    # fallback to local .env if Backend/config doesn't exist
-    env_path = Path(".env")
 
-load_dotenv(env_path)
-API_KEY = os.getenv("GEMINI_API_KEY")
+from .bestBuy import run as price_pantry_photo
+from .restock_engine import restock_list as compute_restock_list
 
-if not API_KEY:
-    raise ValueError(f"❌ GEMINI_API_KEY missing. Check {env_path}")
-
-# Initialize Gemini client
-try:
-    client = genai.Client(api_key=API_KEY)
-except Exception as e:
-    raise RuntimeError(f"❌ Failed to initialize Gemini client: {e}")
+logger = logging.getLogger(__name__)
 
 # -------------------------------------------------------------------
-# 2️⃣ Inventory Data
+# 1️⃣ Inventory Data
 # -------------------------------------------------------------------
-inventory_target = [
+INVENTORY_TARGET = [
     "spaghetti 5 container", "fusilli pasta 1 bag", "rotini pasta 2 bag",
     "ground coffee 2 can", "green beans 3 cans", "luncheon meat 1 can",
     "olive oil 2 bottle", "vegetable oil 1 bottle", "citrus blend juice 1 bottle",
@@ -57,13 +27,17 @@ inventory_target = [
     "pasta sauce 1 jar", "stewed tomatoes 1 can", "tuna 6 cans","Milk 3 galons"
 ]
 
+OUTPUT_FILE = Path(__file__).resolve().parent / "output" / "restock.json"
+
+
 # -------------------------------------------------------------------
 # 2️⃣ Extract Grocery Data (Safe + Clean)
 # -------------------------------------------------------------------
-try:
+def extract_stock(final_output):
+    """Return ``(stock_actual, cheapest_info)`` from a bestBuy result."""
     price_estimates = final_output.get("price_estimates", [])
     if not isinstance(price_estimates, list):
-        raise ValueError("Invalid format: 'price_estimates' must be a list")
+        price_estimates = []
 
     # ✅ Collect all item names safely
     stock_actual = [
@@ -78,98 +52,53 @@ try:
         cheapest_store_data = {}
 
     cheapest_info = {
-        "store": cheapest_store_data.get("store", "Unknown"),
-        "estimated_total_cost": float(cheapest_store_data.get("estimated_total_cost", 0.0))
+        "store": cheapest_store_data.get("store") or "Unknown",
+        "estimated_total_cost": float(cheapest_store_data.get("estimated_total_cost") or 0.0),
     }
-
-    print("📦 Current Stock (from bestBuy):", stock_actual or "❌ Empty")
-    print("💰 Cheapest Store Info:", cheapest_info)
-
-    if not stock_actual:
-        print("\n⚠️ No items found in stock_actual. Check bestBuy output consistency.")
-        stock_actual = []
-
-except Exception as e:
-    print("\n❌ Error parsing grocery data:", e)
-    stock_actual, cheapest_info = [], {"store": "Unknown", "estimated_total_cost": 0.0}
+    return stock_actual, cheapest_info
 
 
 # -------------------------------------------------------------------
-# 3️⃣ Gemini prompt setup
+# 3️⃣ Local restock diff (no LLM call needed for the comparison)
 # -------------------------------------------------------------------
-MODEL_NAME = "gemini-2.5-flash"
-
-system_instruction = (
-    "You are an inventory management assistant. Compare 'Inventory Target' and 'Actual Stock' "
-    "and generate a Python list named restock_list based on these rules:\n"
-    "1. Include any missing item from Inventory Target.\n"
-    "2. If an item exists but quantity is lower, include the difference.\n"
-    "Output must be ONLY: restock_list = [...], no markdown or explanation."
-)
-
-prompt = f"""
-Inventory Target: {inventory_target}
-Actual Stock: {stock_actual}
-Generate restock_list based on rules.
-"""
+def compare_with_stock(final_output, inventory_target=INVENTORY_TARGET):
+    """Restock list and cheapest store info for ``inventory_target``."""
+    stock_actual, cheapest_info = extract_stock(final_output)
+    if not stock_actual:
+        logger.warning("No priced items in the bestBuy result; check its output")
+    return {
+        "restock_list": compute_restock_list(inventory_target, stock_actual),
+        "cheapest_info": cheapest_info,
+    }
 
-# -------------------------------------------------------------------
-# 4️⃣ Gemini Call (with retry)
-# -------------------------------------------------------------------
-def call_gemini_with_retry(model, contents, system_instruction, max_attempts=3):
-    for attempt in range(1, max_attempts + 1):
-        try:
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config={
-                    "system_instruction": system_instruction,
-                    "response_mime_type": "text/plain"
-                }
-            )
-            if hasattr(response, "text"):
-                return response.text
-            else:
-                return response.candidates[0].content.parts[0].text
-
-        except APIError as e:
-            print(f"⚠️ Gemini APIError (Attempt {attempt}/{max_attempts}): {e}")
-        except Exception as e:
-            print(f"⚠️ Unexpected error (Attempt {attempt}/{max_attempts}): {e}")
-        time.sleep(attempt * 2)
-    raise RuntimeError("❌ Gemini API failed after multiple attempts.")
 
+def save_restock(result, out_file=OUTPUT_FILE):
+    out_file = Path(out_file)
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return out_file
 
-# -------------------------------------------------------------------
-# 5️⃣ Process Gemini Response
-# -------------------------------------------------------------------
-try:
-    print("\n--- Sending request to Gemini for restock analysis... ---")
-    raw_text = call_gemini_with_retry(MODEL_NAME, prompt, system_instruction)
-    print("\n--- Raw Gemini Response ---\n", raw_text)
 
-    restock_list = []
-    cleaned = raw_text.strip().replace("```", "").replace("python", "").strip()
-    if "restock_list" in cleaned:
-        exec(cleaned, {}, locals())
-        restock_list = locals().get("restock_list", [])
+def run(inventory_target=INVENTORY_TARGET, final_output=None, use_cache=True):
+    """
+    Run the whole pipeline: bestBuy (photo -> prices) unless
+    ``final_output`` is given, then the local restock diff.
+    """
+    if final_output is None:
+        final_output = price_pantry_photo(use_cache=use_cache)
+    return compare_with_stock(final_output, inventory_target)
 
-    print("\n✅ Final Restock List =", restock_list)
 
-    # ✅ Save output to /output/restock.json
-    out_dir = Path(__file__).resolve().parent / "output"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / "restock.json"
+if __name__ == "__main__":
+    import os
 
-    with open(out_file, "w", encoding="utf-8") as f:
-        json.dump(
-            {"restock_list": restock_list, "cheapest_info": cheapest_info},
-            f, indent=2
-        )
+    import django
 
-    print(f"💾 Saved restock.json successfully at {out_file}")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
 
-except Exception as e:
-    print("\n--- ERROR ---")
-    print(e)
-    print("--------------------------")
+    result = run()
+    print("\n✅ Final Restock List =", result["restock_list"])
+    print("💰 Cheapest Store Info:", result["cheapest_info"])
+    print(f"💾 Saved restock.json successfully at {save_restock(result)}")
@@ -0,0 +1,150 @@
+# Services/conversion.py
+"""
+Vectorized unit conversion for whole item lists.
+
+Amounts and units are turned into NumPy arrays once, then converted or
+aggregated with array arithmetic instead of per-row string parsing.
+Crossing dimensions uses per-ingredient tables: DENSITIES (g per ml)
+between mass and volume, and UNIT_WEIGHTS (g per item) between count and
+mass/volume. Conversions that are not possible come back as NaN.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from .units import COUNT, MASS, UNIT_FACTORS, VOLUME, normalize_name
+
+UNITS = list(UNIT_FACTORS)
+UNIT_INDEX = {unit: index for index, unit in enumerate(UNITS)}
+DIMENSIONS = (MASS, VOLUME, COUNT)
+_DIM_CODES = np.array([DIMENSIONS.index(UNIT_FACTORS[unit][0]) for unit in UNITS])
+_FACTORS = np.array([UNIT_FACTORS[unit][1] for unit in UNITS])
+MASS_DIM, VOLUME_DIM, COUNT_DIM = range(3)
+
+# Grams per milliliter
+DENSITIES = {
+    "water": 1.0,
+    "milk": 1.03,
+    "cream": 1.01,
+    "yogurt": 1.05,
+    "juice": 1.05,
+    "oil": 0.92,
+    "olive oil": 0.91,
+    "vegetable oil": 0.92,
+    "butter": 0.91,
+    "honey": 1.42,
+    "syrup": 1.33,
+    "flour": 0.53,
+    "sugar": 0.85,
+    "brown sugar": 0.72,
+    "salt": 1.2,
+    "rice": 0.85,
+    "oat": 0.41,
+    "coffee": 0.4,
+    "pasta sauce": 1.05,
+    "ketchup": 1.15,
+}
+
+# Grams per item, for counted ingredients
+UNIT_WEIGHTS = {
+    "egg": 50.0,
+    "apple": 180.0,
+    "banana": 120.0,
+    "orange": 150.0,
+    "onion": 150.0,
+    "potato": 200.0,
+    "tomato": 120.0,
+    "lemon": 100.0,
+    "garlic": 50.0,
+    "avocado": 170.0,
+    "bread": 500.0,
+}
+
+_TABLES = {"density": DENSITIES, "weight": UNIT_WEIGHTS}
+
+
+@lru_cache(maxsize=4096)
+def _table_value(table_name, name):
+    table = _TABLES[table_name]
+    normalized = f" {normalize_name(name)} "
+    # Longest key first so "olive oil" wins over "oil"
+    for key in sorted(table, key=len, reverse=True):
+        if f" {key} " in normalized:
+            return table[key]
+    return np.nan
+
+
+def _lookup(table_name, names):
+    """Per-name table values, NaN where the ingredient is unknown."""
+    return np.array([_table_value(table_name, name) for name in names], dtype=float)
+
+
+def encode_units(units):
+    """Map Unit values to integer codes; unknown/None units become -1."""
+    return np.array([UNIT_INDEX.get(unit, -1) for unit in units], dtype=np.int64)
+
+
+def convert_many(amounts, units, target_unit, names=None):
+    """
+    Convert ``amounts`` (in ``units``) to ``target_unit`` in one pass.
+    ``names`` enables density/weight lookups across dimensions; without
+    it only same-dimension rows convert and the rest are NaN.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    codes = encode_units(units)
+    known = codes >= 0
+    safe_codes = np.where(known, codes, 0)
+
+    base = np.where(known, amounts * _FACTORS[safe_codes], np.nan)
+    dims = np.where(known, _DIM_CODES[safe_codes], -1)
+
+    target_dim = DIMENSIONS.index(UNIT_FACTORS[target_unit][0])
+    target_factor = UNIT_FACTORS[target_unit][1]
+
+    if names is None:
+        target_base = np.where(dims == target_dim, base, np.nan)
+        return target_base / target_factor
+
+    density = _lookup("density", names)  # g / ml
+    weight = _lookup("weight", names)  # g / ea
+
+    # Express every row in grams first, then grams in the target dimension
+    grams = np.select(
+        [dims == MASS_DIM, dims == VOLUME_DIM, dims == COUNT_DIM],
+        [base, base * density, base * weight],
+        default=np.nan,
+    )
+    if target_dim == MASS_DIM:
+        in_target = grams
+    elif target_dim == VOLUME_DIM:
+        in_target = np.where(dims == VOLUME_DIM, base, grams / density)
+    else:
+        in_target = np.where(dims == COUNT_DIM, base, grams / weight)
+    return in_target / target_factor
+
+
+def aggregate(names, amounts, units, target_unit):
+    """
+    Sum quantities per normalized item name in ``target_unit``.
+    Returns ``{name: total}``; rows that cannot be converted are skipped,
+    names with no convertible rows map to NaN.
+    """
+    if not len(names):
+        return {}
+    converted = convert_many(amounts, units, target_unit, names=names)
+    keys, inverse = np.unique([normalize_name(name) for name in names], return_inverse=True)
+    totals = np.zeros(len(keys))
+    np.add.at(totals, inverse, np.nan_to_num(converted))
+    counted = np.zeros(len(keys), dtype=bool)
+    counted[inverse[~np.isnan(converted)]] = True
+    totals[~counted] = np.nan
+    return dict(zip(keys.tolist(), totals.tolist()))
+
+
+def aggregate_items(items, target_unit):
+    """``aggregate`` over InventoryItem rows using their stored amount/unit."""
+    rows = [(item.name, item.amount, item.unit) for item in items if item.amount is not None]
+    if not rows:
+        return {}
+    names, amounts, units = zip(*rows)
+    return aggregate(list(names), amounts, units, target_unit)
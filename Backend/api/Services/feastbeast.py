@@ -1,28 +1,28 @@
 # result_output - from GemImgGen
 
-import base64
 import json
+
+import httpx
 import requests
 from django.conf import settings
 
-def plan_party_with_inventory(list_id, party_prompt, inventory_list_items):
-    """
-    Plans a party based on existing inventory, dishes, and number of people.
-    Returns items that need to be bought or increased in quantity along with store recommendations.
-    
-    Args:
-        list_id: ID of the inventory list to compare against
-        party_prompt: Text describing party dishes and number of people
-        inventory_list_items: List of items currently in inventory
-    
-    Returns:
-        JSON with party_shopping_list and cheapest_info
-    """
+from .gemini_client import (
+    GeminiAPIError,
+    build_payload,
+    extract_text,
+    get_async_client,
+    get_client,
+    strip_fences,
+)
+from .prompt_encoding import encode_inventory
+from .routing import choose_model
+
+MODEL_NAME = "gemini-2.0-flash"
+
+def build_party_payload(list_id, party_prompt, inventory_list_items):
+    """Gemini request for ``plan_party_with_inventory`` (and its async twin)."""
     # Build inventory items text
-    inventory_text = "\n".join([
-        f"- {item['name']}: {item.get('quantity', '0')}" 
-        for item in inventory_list_items
-    ])
+    inventory_text = encode_inventory(inventory_list_items)
 
     # System prompt for party planning
     system_prompt = (
@@ -52,41 +52,72 @@ def plan_party_with_inventory(list_id, party_prompt, inventory_list_items):
         f"Party details:\n{party_prompt}"
     )
 
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [{"text": text_prompt}]
-            }
-        ],
-        "generationConfig": {
-            "temperature": 0.4,
-            "topK": 32,
-            "topP": 1,
-            "maxOutputTokens": 2048,
-        }
-    }
-
-    api_key = settings.GEMINI_API_KEY
-    if not api_key:
+    payload = build_payload([{"text": text_prompt}], generation_config={
+        "temperature": 0.4,
+        "topK": 32,
+        "topP": 1,
+        "maxOutputTokens": 2048,
+    })
+    return payload
+
+
+def plan_party_with_inventory(list_id, party_prompt, inventory_list_items, use_cache=True):
+    """
+    Plans a party based on existing inventory, dishes, and number of people.
+    Returns items that need to be bought or increased in quantity along with store recommendations.
+    
+    Args:
+        list_id: ID of the inventory list to compare against
+        party_prompt: Text describing party dishes and number of people
+        inventory_list_items: List of items currently in inventory
+        use_cache: Set to False to bypass the LLM response cache
+    
+    Returns:
+        JSON with party_shopping_list and cheapest_info
+    """
+    payload = build_party_payload(list_id, party_prompt, inventory_list_items)
+
+    if not settings.GEMINI_API_KEY:
         return {"error": "Missing GEMINI_API_KEY in settings"}
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+    try:
+        result = get_client().generate_content(choose_model("plan_party", payload, MODEL_NAME), payload, use_cache=use_cache)
+    except GeminiAPIError as e:
+        return {"error": f"Gemini API error: {e.text}"}
+    except requests.exceptions.Timeout:
+        return {"error": "Request to Gemini timed out"}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+    return parse_party_result(result)
+
+
+async def plan_party_with_inventory_async(list_id, party_prompt, inventory_list_items, use_cache=True):
+    """``plan_party_with_inventory`` for async views, on the shared async client."""
+    payload = build_party_payload(list_id, party_prompt, inventory_list_items)
+
+    if not settings.GEMINI_API_KEY:
+        return {"error": "Missing GEMINI_API_KEY in settings"}
 
     try:
-        response = requests.post(
-            url,
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=90
+        result = await get_async_client().generate_content(
+            choose_model("plan_party", payload, MODEL_NAME), payload, use_cache=use_cache
         )
+    except GeminiAPIError as e:
+        return {"error": f"Gemini API error: {e.text}"}
+    except httpx.TimeoutException:
+        return {"error": "Request to Gemini timed out"}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {str(e)}"}
 
-        if response.status_code != 200:
-            return {"error": f"Gemini API error: {response.text}"}
+    return parse_party_result(result)
 
-        result = response.json()
-        model_text = result["candidates"][0]["content"]["parts"][0]["text"]
-        cleaned_text = model_text.strip().replace("```json", "").replace("```", "").strip()
+
+def parse_party_result(result):
+    cleaned_text = None
+    try:
+        model_text = extract_text(result)
+        cleaned_text = strip_fences(model_text)
         parsed_json = json.loads(cleaned_text)
 
         if "party_shopping_list" not in parsed_json or "cheapest_info" not in parsed_json:
@@ -94,10 +125,6 @@ def plan_party_with_inventory(list_id, party_prompt, inventory_list_items):
 
         return parsed_json
 
-    except requests.exceptions.Timeout:
-        return {"error": "Request to Gemini timed out"}
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Request failed: {str(e)}"}
     except (KeyError, IndexError) as e:
         return {"error": f"Failed to parse Gemini response: {str(e)}", "raw_output": result}
     except json.JSONDecodeError as e:
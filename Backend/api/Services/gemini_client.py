@@ -0,0 +1,460 @@
+# Services/gemini_client.py
+import asyncio
+import base64
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import Counter
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from ..telemetry import GEMINI_CALL_DURATION, phase
+from .image_preprocess import preprocess_image
+from .llm_cache import get_cache, make_key
+from .outbound import OutboundRejected, get_policy
+from .routing import ahedged, hedge_delay, hedged, record_latency
+from .single_flight import across_processes, across_processes_async, async_flights, flights
+
+logger = logging.getLogger(__name__)
+
+# Slack on top of the retry deadline before another process may take over a
+# claimed call: the last attempt's timeout is capped by the time remaining,
+# but its connect and final read can still finish a little past it.
+LEASE_MARGIN = 10.0
+
+
+def claim_lease():
+    """Seconds a cross-process claim on a call is held: all its retries plus a margin."""
+    return settings.GEMINI_REQUEST_DEADLINE + LEASE_MARGIN
+
+
+class GeminiAPIError(Exception):
+    """Raised when Gemini answers with a non-200 status code."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"Gemini API error ({status_code}): {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class GeminiClient:
+    """
+    Pooled client for the Gemini ``generateContent`` REST endpoint.
+
+    A single ``requests.Session`` is shared by every call so TLS connections
+    are kept alive and reused instead of being re-established per request.
+    Connect and read timeouts are separate: connecting should fail fast,
+    while generation itself may legitimately take tens of seconds.
+    """
+
+    def __init__(self, api_key, base_url, connect_timeout=5.0, read_timeout=90.0, pool_maxsize=10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def url_for(self, model, method="generateContent"):
+        return f"{self.base_url}/models/{model}:{method}"
+
+    def generate_content(self, model, payload, use_cache=True):
+        """
+        POST ``payload`` to ``model`` and return the decoded JSON body.
+        Raises ``GeminiAPIError`` for non-200 answers (503 when the
+        outbound policy refuses the call) and lets ``requests`` exceptions
+        (timeouts, connection errors) propagate once retries run out.
+
+        Responses are served from / stored in the LLM cache unless
+        ``use_cache`` is False; only bodies whose text parses as JSON are
+        stored, so malformed generations are never replayed.
+
+        Identical calls already in flight are joined rather than repeated
+        (see ``single_flight.py``) unless ``LLM_SINGLE_FLIGHT`` is off.
+        """
+        cache = get_cache() if use_cache else None
+        key = make_key(model, payload)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info("Gemini %s call served from cache", model)
+                return cached
+
+        fetch = lambda: self._fetch(model, payload, cache, key)
+        if not settings.LLM_SINGLE_FLIGHT:
+            return fetch()
+        return flights.do(key, lambda: across_processes(key, cache, fetch, lease=claim_lease()))
+
+    def _fetch(self, model, payload, cache, key):
+        result = self._post(model, payload)
+        if cache is not None and _is_cacheable(result):
+            cache.set(key, result)
+        return result
+
+    def _post(self, model, payload):
+        delay = hedge_delay(model, payload)
+        with phase("gemini"):
+            if delay is None:
+                return self._guarded_post(model, payload)
+            return hedged(lambda: self._guarded_post(model, payload), delay)
+
+    def _guarded_post(self, model, payload):
+        """One guarded call: retried, rate-limited and circuit-broken by the outbound policy."""
+        try:
+            return get_policy().call(model, lambda remaining: self._post_once(model, payload, remaining), is_retryable)
+        except OutboundRejected as e:
+            raise GeminiAPIError(503, f"Gemini unavailable ({e.reason})") from e
+
+    def _post_once(self, model, payload, remaining):
+        connect_timeout, read_timeout = self.timeout
+        deadline = max(0.1, min(read_timeout, remaining))
+        started = time.perf_counter()
+        status_code = None
+        try:
+            response = self.session.post(
+                self.url_for(model),
+                params={"key": self.api_key},
+                json=payload,
+                timeout=(connect_timeout, deadline),
+            )
+            status_code = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            logger.info("Gemini %s call finished in %.3fs (status=%s)", model, elapsed, status_code)
+            GEMINI_CALL_DURATION.observe(elapsed, model=model, status=status_code or "error")
+            record_attempt(model, payload, elapsed, deadline, status_code)
+
+        if response.status_code != 200:
+            raise GeminiAPIError(response.status_code, response.text)
+        result = response.json()
+        record_usage(model, result)
+        return result
+
+    def stream_generate_content(self, model, payload, use_cache=True):
+        """
+        POST ``payload`` to ``streamGenerateContent`` (server-sent events)
+        and yield the generated text piece by piece as it arrives.
+        Raises ``GeminiAPIError`` for non-200 answers before yielding, and
+        for an event that is not valid JSON once the stream is under way.
+
+        A cached response for the same request is replayed as one piece;
+        a completed stream is stored in the cache under the same rules as
+        ``generate_content``, so either call can reuse the other's result.
+        """
+        cache = get_cache() if use_cache else None
+        key = make_key(model, payload) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info("Gemini %s stream served from cache", model)
+                yield extract_text(cached)
+                return
+
+        try:
+            with get_policy().guard(model, is_retryable):
+                yield from self._stream(model, payload, cache, key)
+        except OutboundRejected as e:
+            raise GeminiAPIError(503, f"Gemini unavailable ({e.reason})") from e
+
+    def _stream(self, model, payload, cache, key):
+        started = time.perf_counter()
+        response = self.session.post(
+            self.url_for(model, "streamGenerateContent"),
+            params={"key": self.api_key, "alt": "sse"},
+            json=payload,
+            timeout=self.timeout,
+            stream=True,
+        )
+        pieces = []
+        usage = None
+        try:
+            if response.status_code != 200:
+                raise GeminiAPIError(response.status_code, response.text)
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                try:
+                    event = json.loads(line[len("data:"):])
+                except ValueError as e:
+                    # A torn event would leave a gap in the text; fail the stream instead
+                    raise GeminiAPIError(502, f"Malformed stream event from Gemini: {line[:200]}") from e
+                usage = event.get("usageMetadata", usage)  # running totals; the last one counts
+                try:
+                    text = "".join(part.get("text", "") for part in event["candidates"][0]["content"]["parts"])
+                except (KeyError, IndexError):
+                    continue  # e.g. a final chunk that only carries usageMetadata
+                if text:
+                    if not pieces:
+                        logger.info("Gemini %s stream first text after %.3fs", model, time.perf_counter() - started)
+                    pieces.append(text)
+                    yield text
+        finally:
+            response.close()
+            elapsed = time.perf_counter() - started
+            logger.info("Gemini %s stream finished in %.3fs (status=%s)", model, elapsed, response.status_code)
+            GEMINI_CALL_DURATION.observe(elapsed, model=model, status=response.status_code)
+
+        result = {"candidates": [{"content": {"role": "model", "parts": [{"text": "".join(pieces)}]}}]}
+        if usage is not None:
+            result["usageMetadata"] = usage
+            record_usage(model, result)
+        if cache is not None and _is_cacheable(result):
+            cache.set(key, result)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncGeminiClient:
+    """
+    ``GeminiClient`` for async views, on one ``httpx.AsyncClient``.
+
+    An in-flight call costs a coroutine instead of a thread, so one event
+    loop can wait on hundreds of generations. It uses the same LLM cache
+    (the SQLite tier is reached from a worker thread) and raises the same
+    ``GeminiAPIError``; transport failures surface as ``httpx`` exceptions.
+    """
+
+    def __init__(self, api_key, base_url, connect_timeout=5.0, read_timeout=90.0, max_connections=200):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"Content-Type": "application/json"},
+        )
+
+    url_for = GeminiClient.url_for
+
+    async def generate_content(self, model, payload, use_cache=True):
+        """Async ``GeminiClient.generate_content``."""
+        cache = get_cache() if use_cache else None
+        key = make_key(model, payload)
+        if cache is not None:
+            cached = await sync_to_async(cache.get, thread_sensitive=False)(key)
+            if cached is not None:
+                logger.info("Gemini %s call served from cache", model)
+                return cached
+
+        fetch = lambda: self._fetch(model, payload, cache, key)
+        if not settings.LLM_SINGLE_FLIGHT:
+            return await fetch()
+        return await async_flights.do(key, lambda: across_processes_async(key, cache, fetch, lease=claim_lease()))
+
+    async def _fetch(self, model, payload, cache, key):
+        result = await self._post(model, payload)
+        if cache is not None and _is_cacheable(result):
+            await sync_to_async(cache.set, thread_sensitive=False)(key, result)
+        return result
+
+    async def _post(self, model, payload):
+        delay = hedge_delay(model, payload)
+        with phase("gemini"):
+            if delay is None:
+                return await self._guarded_post(model, payload)
+            return await ahedged(lambda: self._guarded_post(model, payload), delay)
+
+    async def _guarded_post(self, model, payload):
+        try:
+            return await get_policy().acall(
+                model, lambda remaining: self._post_once(model, payload, remaining), is_retryable
+            )
+        except OutboundRejected as e:
+            raise GeminiAPIError(503, f"Gemini unavailable ({e.reason})") from e
+
+    async def _post_once(self, model, payload, remaining):
+        deadline = max(0.1, min(self.read_timeout, remaining))
+        timeout = httpx.Timeout(deadline, connect=self.connect_timeout)
+        started = time.perf_counter()
+        status_code = None
+        try:
+            response = await self.client.post(
+                self.url_for(model), params={"key": self.api_key}, json=payload, timeout=timeout
+            )
+            status_code = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            logger.info("Gemini %s async call finished in %.3fs (status=%s)", model, elapsed, status_code)
+            GEMINI_CALL_DURATION.observe(elapsed, model=model, status=status_code or "error")
+            record_attempt(model, payload, elapsed, deadline, status_code)
+
+        if response.status_code != 200:
+            raise GeminiAPIError(response.status_code, response.text)
+        result = response.json()
+        record_usage(model, result)
+        return result
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def record_attempt(model, payload, elapsed, deadline, status_code):
+    """
+    Feed one attempt to the routing tracker. An attempt the model failed
+    (timeout or connection error, i.e. no ``status_code``, 429 or 5xx)
+    counts as at least its ``deadline``, so a model that keeps failing
+    fast is not mistaken for a fast one. Other 4xx answers are the
+    request's fault, not the model's, and keep their real duration.
+    """
+    failed = status_code is None or status_code == 429 or status_code >= 500
+    record_latency(model, payload, max(elapsed, deadline) if failed else elapsed)
+
+
+token_usage = Counter()  # (model, "calls" | "prompt_tokens" | "output_tokens") -> total
+_usage_lock = threading.Lock()
+
+
+def record_usage(model, result):
+    """Log and total the token counts Gemini reports in ``usageMetadata``."""
+    usage = result.get("usageMetadata")
+    if not usage:
+        return
+    prompt_tokens = usage.get("promptTokenCount", 0)
+    output_tokens = usage.get("candidatesTokenCount", 0)
+    with _usage_lock:
+        token_usage[(model, "calls")] += 1
+        token_usage[(model, "prompt_tokens")] += prompt_tokens
+        token_usage[(model, "output_tokens")] += output_tokens
+    logger.info(
+        "Gemini %s tokens: prompt=%s output=%s total=%s",
+        model, prompt_tokens, output_tokens, usage.get("totalTokenCount", prompt_tokens + output_tokens),
+    )
+
+
+# Worth retrying: rate limiting, server errors and transport failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    if isinstance(error, GeminiAPIError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+
+
+def _is_cacheable(result):
+    try:
+        parse_json_text(extract_text(result))
+    except (KeyError, IndexError, TypeError, ValueError):
+        return False
+    return True
+
+
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+
+def _current_config():
+    return (
+        settings.GEMINI_API_KEY,
+        settings.GEMINI_API_BASE_URL,
+        settings.GEMINI_CONNECT_TIMEOUT,
+        settings.GEMINI_READ_TIMEOUT,
+        settings.GEMINI_POOL_MAXSIZE,
+    )
+
+
+def get_client():
+    """
+    Return the process-wide ``GeminiClient``, creating it on first use.
+    The client is rebuilt if the relevant settings change (e.g. in tests).
+    """
+    global _client, _client_config
+    config = _current_config()
+    with _client_lock:
+        if _client is None or _client_config != config:
+            if _client is not None:
+                _client.close()
+            api_key, base_url, connect_timeout, read_timeout, pool_maxsize = config
+            _client = GeminiClient(
+                api_key,
+                base_url,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                pool_maxsize=pool_maxsize,
+            )
+            _client_config = config
+        return _client
+
+
+# httpx.AsyncClient is bound to the event loop it first ran on, so async
+# clients are kept per loop (and dropped with it)
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the ``AsyncGeminiClient`` for the running event loop."""
+    loop = asyncio.get_running_loop()
+    config = (*_current_config(), settings.GEMINI_ASYNC_MAX_CONNECTIONS)
+    entry = _async_clients.get(loop)
+    if entry is None or entry[0] != config:
+        api_key, base_url, connect_timeout, read_timeout, _, max_connections = config
+        client = AsyncGeminiClient(
+            api_key,
+            base_url,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_connections=max_connections,
+        )
+        entry = _async_clients[loop] = (config, client)
+    return entry[1]
+
+
+# --- Payload helpers shared by the Services modules ---
+
+def image_part(image_file):
+    """
+    Encode an uploaded image as an ``inlineData`` part, downscaled and
+    re-encoded first unless ``GEMINI_IMAGE_PREPROCESS`` is off.
+    """
+    with phase("encode"):
+        if settings.GEMINI_IMAGE_PREPROCESS:
+            prepared = preprocess_image(image_file)
+            img_bytes, mime_type = prepared.data, prepared.mime_type
+        else:
+            img_bytes, mime_type = image_file.read(), image_file.content_type
+        return {
+            "inlineData": {
+                "mimeType": mime_type,
+                "data": base64.b64encode(img_bytes).decode("utf-8"),
+            }
+        }
+
+
+def build_payload(parts, generation_config=None):
+    payload = {
+        "contents": [
+            {
+                "role": "user",
+                "parts": parts,
+            }
+        ]
+    }
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    return payload
+
+
+def extract_text(result):
+    """Return the model-generated text of the first candidate."""
+    return result["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def strip_fences(text):
+    """Remove markdown code fences Gemini sometimes wraps around JSON."""
+    return text.strip().replace("```json", "").replace("```", "").strip()
+
+
+def parse_json_text(text):
+    return json.loads(strip_fences(text))
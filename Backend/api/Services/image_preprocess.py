@@ -0,0 +1,69 @@
+# Services/image_preprocess.py
+import io
+import logging
+from typing import NamedTuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    processed_bytes: int
+
+
+def preprocess_image(image_file, max_edge=None, image_format=None, quality=None):
+    """
+    Shrink an uploaded photo before it is base64-encoded for Gemini.
+
+    Applies the EXIF orientation, downscales so the longest edge is at most
+    ``max_edge`` pixels, and re-encodes as JPEG/WebP at ``quality``. The
+    re-encoded image carries no EXIF/GPS metadata. Files Pillow cannot
+    decode, or will not because their pixel count marks them as a
+    decompression bomb, are passed through untouched.
+    """
+    max_edge = max_edge or settings.GEMINI_IMAGE_MAX_EDGE
+    image_format = (image_format or settings.GEMINI_IMAGE_FORMAT).upper()
+    quality = quality or settings.GEMINI_IMAGE_QUALITY
+
+    raw = image_file.read()
+    try:
+        img = Image.open(io.BytesIO(raw))
+        # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+        img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)  # decodes: truncated files fail here
+    except Image.DecompressionBombError as e:
+        logger.warning("Image preprocessing skipped, refusing to decode a possible decompression bomb: %s", e)
+        return PreparedImage(raw, image_file.content_type, len(raw), len(raw))
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning("Image preprocessing skipped, could not decode upload: %s", e)
+        return PreparedImage(raw, image_file.content_type, len(raw), len(raw))
+
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        if image_format == "JPEG":
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    out = io.BytesIO()
+    img.save(out, format=image_format, quality=quality)
+    data = out.getvalue()
+
+    logger.info(
+        "Preprocessed image %s: %d -> %d bytes (%dx%d %s)",
+        getattr(image_file, "name", ""), len(raw), len(data), img.width, img.height, image_format,
+    )
+    return PreparedImage(data, MIME_TYPES[image_format], len(raw), len(data))
@@ -0,0 +1,64 @@
+# Services/json_stream.py
+"""
+Incremental extraction of JSON objects from a streamed, partial JSON
+document, e.g. ``{"shopping_list": [{"item": ..., "quantity": ...}, ...``
+arriving a few tokens at a time. Each object is returned as soon as its
+closing brace arrives, long before the enclosing document is complete.
+"""
+import json
+
+
+class ObjectStream:
+    """
+    Feed text chunks with ``feed``; it returns the objects completed by
+    that chunk that contain every key in ``required_keys``. Enclosing
+    objects (the wrapper around the array) never qualify, so each row is
+    reported once. Markdown fences and other text outside objects are
+    ignored. Work per chunk is linear in the chunk length.
+    """
+
+    def __init__(self, required_keys=("item",)):
+        self.required_keys = tuple(required_keys)
+        self._buffer = []  # characters of the innermost open objects
+        self._starts = []  # buffer offsets of each open "{"
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        completed = []
+        for char in chunk:
+            if self._starts:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = bool(self._starts)
+            elif char == "{":
+                if not self._starts:
+                    self._buffer = ["{"]
+                self._starts.append(len(self._buffer) - 1)
+            elif char == "}" and self._starts:
+                start = self._starts.pop()
+                obj = self._decode("".join(self._buffer[start:]))
+                if obj is not None:
+                    completed.append(obj)
+                if not self._starts:
+                    self._buffer = []
+        return completed
+
+    def _decode(self, text):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return None
+        if isinstance(obj, dict) and all(key in obj for key in self.required_keys):
+            return obj
+        return None
@@ -0,0 +1,200 @@
+# Services/llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def make_key(model, payload):
+    """
+    Content-addressed cache key for a Gemini request.
+
+    Hashes the model name, the final prompt text and the image bytes of
+    every part. Whitespace runs in the text are collapsed first, so
+    prompts that differ only in spacing share one key (and one in-flight
+    call) while the model still gets the text as written. Images are
+    hashed in their base64 form, which is a 1:1 encoding of the original
+    bytes, so identical photos map to one key.
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                digest.update(b"\x00text\x00")
+                digest.update(" ".join(part["text"].split()).encode("utf-8"))
+            elif "inlineData" in part:
+                digest.update(b"\x00image\x00")
+                digest.update(hashlib.sha256(part["inlineData"]["data"].encode("ascii")).digest())
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier response cache: an in-process LRU with a TTL in front of a
+    persistent SQLite file shared by every worker on the host.
+    Pass ``db_path=None`` to keep the cache in memory only.
+
+    The SQLite file also holds the in-flight claims used to coalesce
+    identical calls across processes (``claim`` / ``release``, see
+    ``single_flight.py``).
+    """
+
+    def __init__(self, max_entries=512, ttl=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = str(db_path) if db_path else None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0}
+
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_inflight ("
+                    " key TEXT PRIMARY KEY,"
+                    " expires_at REAL NOT NULL)"
+                )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key, count=True):
+        """
+        Cached value for ``key``, or None. ``count=False`` leaves the hit
+        and miss counters alone, for repeated checks on behalf of one
+        lookup (single-flight polling).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    if count:
+                        self.counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        if self.db_path:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                if count:
+                    self._count("disk_hits")
+                return value
+
+        if count:
+            self._count("misses")
+        return None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+        self._count("sets")
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def claim(self, key, lease):
+        """
+        Mark ``key`` as being computed for ``lease`` seconds. Returns False
+        if a live claim by another caller exists; expired claims are taken over.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_inflight WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO llm_inflight (key, expires_at) VALUES (?, ?)",
+                (key, now + lease),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, key):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_inflight WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        """Drop expired rows from the persistent tier."""
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+                conn.execute("DELETE FROM llm_inflight WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_config = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide ``LLMCache``, or ``None`` when caching is
+    disabled. Rebuilt if the cache settings change.
+    """
+    global _cache, _cache_config
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    config = (settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL, settings.LLM_CACHE_PATH)
+    with _cache_lock:
+        if _cache is None or _cache_config != config:
+            max_entries, ttl, db_path = config
+            _cache = LLMCache(max_entries=max_entries, ttl=ttl, db_path=db_path)
+            _cache_config = config
+        return _cache
@@ -0,0 +1,341 @@
+# Services/outbound.py
+"""
+Outbound control for Gemini calls: a concurrency cap per model, retries
+with exponential backoff and full jitter inside a per-request deadline,
+and a circuit breaker per model that fails fast while Gemini is degraded.
+
+A slow or failing upstream would otherwise hold every worker in a
+blocked Gemini call and starve the CRUD endpoints. With the cap, extra
+callers wait at most ``queue_timeout`` for a slot. Once the breaker has
+seen ``failure_threshold`` consecutive upstream failures it rejects
+calls for ``reset_timeout`` seconds, then lets a single probe through.
+
+Rejections raise ``OutboundRejected``; every decision is counted in
+``OutboundPolicy.stats()``.
+"""
+import asyncio
+import contextlib
+import random
+import threading
+import time
+import weakref
+from collections import Counter
+
+from django.conf import settings
+
+
+class OutboundRejected(Exception):
+    """Raised when a call is refused without reaching the upstream."""
+
+    def __init__(self, model, reason):
+        super().__init__(f"{model}: {reason}")
+        self.model = model
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures -> half-open after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """True if a call may go out; in half-open state only one probe at a time."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def abandon(self):
+        """A probe that never reached the upstream frees the half-open slot."""
+        with self._lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class OutboundPolicy:
+    """
+    Wraps outbound calls: ``call(model, fn, retryable)`` for threads,
+    ``await acall(model, coro_fn, retryable)`` for coroutines and
+    ``with guard(model, retryable)`` for single attempts.
+    ``retryable(exc)`` decides which errors are upstream failures worth
+    retrying (and counting against the breaker); others propagate at once.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=10,
+        async_max_concurrency=200,
+        model_concurrency=None,
+        queue_timeout=5.0,
+        max_attempts=3,
+        base_delay=0.5,
+        max_delay=8.0,
+        deadline=120.0,
+        failure_threshold=5,
+        reset_timeout=30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.async_max_concurrency = async_max_concurrency
+        self.model_concurrency = dict(model_concurrency or {})
+        self.queue_timeout = queue_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._async_semaphores = weakref.WeakKeyDictionary()  # loop -> {model: asyncio.Semaphore}
+        self._breakers = {}
+        self.counters = Counter()
+
+    def _count(self, model, name):
+        with self._lock:
+            self.counters[(model, name)] += 1
+
+    def breaker(self, model):
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[model]
+
+    def _semaphore(self, model):
+        with self._lock:
+            if model not in self._semaphores:
+                limit = self.model_concurrency.get(model, self.max_concurrency)
+                self._semaphores[model] = threading.BoundedSemaphore(limit)
+            return self._semaphores[model]
+
+    def _async_semaphore(self, model):
+        semaphores = self._async_semaphores.setdefault(asyncio.get_running_loop(), {})
+        if model not in semaphores:
+            semaphores[model] = asyncio.Semaphore(self.model_concurrency.get(model, self.async_max_concurrency))
+        return semaphores[model]
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry number ``attempt`` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _admit(self, model, breaker):
+        if not breaker.allow():
+            self._count(model, "rejected_open")
+            raise OutboundRejected(model, "circuit open")
+
+    def _next_delay(self, model, attempt, expires):
+        """Delay before the next attempt, or None when out of attempts or time."""
+        if attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay >= expires:
+            self._count(model, "deadline_exceeded")
+            return None
+        return delay
+
+    def _after_failure(self, model, breaker, error, retryable, attempt, expires):
+        """Delay before retrying ``error``, or None if it should propagate."""
+        if isinstance(error, OutboundRejected):
+            breaker.abandon()
+            return None
+        if not self._record(model, breaker, error, retryable):
+            return None
+        return self._next_delay(model, attempt, expires)
+
+    def _record(self, model, breaker, error, retryable):
+        """Update breaker and counters for one attempt; True if it should be retried."""
+        if error is None:
+            breaker.record_success()
+            self._count(model, "successes")
+            return False
+        if not retryable(error):
+            breaker.record_success()  # the upstream answered; the request was at fault
+            self._count(model, "client_errors")
+            return False
+        breaker.record_failure()
+        self._count(model, "failures")
+        return True
+
+    @contextlib.contextmanager
+    def slot(self, model, expires=None):
+        """Hold one of ``model``'s concurrency slots (no retries), e.g. for a stream."""
+        expires = expires or time.monotonic() + self.deadline
+        wait = min(self.queue_timeout, max(0.0, expires - time.monotonic()))
+        semaphore = self._semaphore(model)
+        if not semaphore.acquire(timeout=wait):
+            self._count(model, "rejected_saturated")
+            raise OutboundRejected(model, "too many concurrent calls")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, model, expires=None):
+        expires = expires or time.monotonic() + self.deadline
+        wait = min(self.queue_timeout, max(0.0, expires - time.monotonic()))
+        semaphore = self._async_semaphore(model)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), wait)
+        except asyncio.TimeoutError:
+            self._count(model, "rejected_saturated")
+            raise OutboundRejected(model, "too many concurrent calls") from None
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @contextlib.contextmanager
+    def guard(self, model, retryable):
+        """
+        A single attempt under the breaker and concurrency cap, for calls
+        that cannot be retried once started (streams).
+        """
+        breaker = self.breaker(model)
+        self._admit(model, breaker)
+        try:
+            with self.slot(model):
+                self._count(model, "attempts")
+                yield
+        except Exception as e:
+            self._after_failure(model, breaker, e, retryable, self.max_attempts, 0)
+            raise
+        except BaseException:  # e.g. the client went away mid-stream
+            breaker.abandon()
+            raise
+        else:
+            self._record(model, breaker, None, retryable)
+
+    def call(self, model, fn, retryable):
+        """
+        Run ``fn(remaining)``, retrying retryable failures with backoff
+        until attempts or the deadline run out. ``remaining`` is the time
+        left before the deadline, to cap the attempt's own timeout.
+        """
+        expires = time.monotonic() + self.deadline
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit(model, breaker)
+            try:
+                with self.slot(model, expires):
+                    self._count(model, "attempts")
+                    result = fn(expires - time.monotonic())
+            except Exception as e:
+                delay = self._after_failure(model, breaker, e, retryable, attempt, expires)
+                if delay is None:
+                    raise
+            except BaseException:
+                breaker.abandon()
+                raise
+            else:
+                self._record(model, breaker, None, retryable)
+                return result
+            self._count(model, "retries")
+            time.sleep(delay)
+
+    async def acall(self, model, coro_fn, retryable):
+        """``call`` for coroutines: awaits ``coro_fn(remaining)``."""
+        expires = time.monotonic() + self.deadline
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit(model, breaker)
+            try:
+                async with self.aslot(model, expires):
+                    self._count(model, "attempts")
+                    result = await coro_fn(expires - time.monotonic())
+            except Exception as e:
+                delay = self._after_failure(model, breaker, e, retryable, attempt, expires)
+                if delay is None:
+                    raise
+            except BaseException:  # e.g. the request was cancelled
+                breaker.abandon()
+                raise
+            else:
+                self._record(model, breaker, None, retryable)
+                return result
+            self._count(model, "retries")
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        """``{model: {"breaker": state, <counter>: n, ...}}``"""
+        with self._lock:
+            counters = dict(self.counters)
+            breakers = dict(self._breakers)
+        stats = {model: {"breaker": breaker.state} for model, breaker in breakers.items()}
+        for (model, name), value in counters.items():
+            stats.setdefault(model, {})[name] = value
+        return stats
+
+
+_policy = None
+_policy_config = None
+_policy_lock = threading.Lock()
+
+
+def get_policy():
+    """Return the process-wide ``OutboundPolicy``, rebuilt if its settings change."""
+    global _policy, _policy_config
+    config = (
+        settings.GEMINI_MAX_CONCURRENCY,
+        settings.GEMINI_ASYNC_MAX_CONNECTIONS,
+        tuple(sorted(settings.GEMINI_MODEL_CONCURRENCY.items())),
+        settings.GEMINI_QUEUE_TIMEOUT,
+        settings.GEMINI_MAX_ATTEMPTS,
+        settings.GEMINI_RETRY_BASE_DELAY,
+        settings.GEMINI_RETRY_MAX_DELAY,
+        settings.GEMINI_REQUEST_DEADLINE,
+        settings.GEMINI_BREAKER_THRESHOLD,
+        settings.GEMINI_BREAKER_RESET,
+    )
+    with _policy_lock:
+        if _policy is None or _policy_config != config:
+            (max_concurrency, async_max_concurrency, model_concurrency, queue_timeout, max_attempts,
+             base_delay, max_delay, deadline, failure_threshold, reset_timeout) = config
+            _policy = OutboundPolicy(
+                max_concurrency=max_concurrency,
+                async_max_concurrency=async_max_concurrency,
+                model_concurrency={model: int(limit) for model, limit in model_concurrency},
+                queue_timeout=queue_timeout,
+                max_attempts=max_attempts,
+                base_delay=base_delay,
+                max_delay=max_delay,
+                deadline=deadline,
+                failure_threshold=failure_threshold,
+                reset_timeout=reset_timeout,
+            )
+            _policy_config = config
+        return _policy
@@ -0,0 +1,90 @@
+# Services/phash.py
+"""
+Perceptual hashes for near-duplicate photo detection, plus a BK-tree so
+Hamming-distance lookups stay fast over thousands of stored hashes.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+
+
+def _grayscale(image_bytes, size):
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft("L", (size[0] * 8, size[1] * 8))
+    img = ImageOps.exif_transpose(img).convert("L")
+    return img.resize(size, Image.Resampling.BILINEAR)
+
+
+def dhash(image_bytes, hash_size=8):
+    """
+    Difference hash: compares horizontally adjacent pixels of a
+    ``(hash_size + 1) x hash_size`` grayscale thumbnail.
+    """
+    pixels = list(_grayscale(image_bytes, (hash_size + 1, hash_size)).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit hash onto a signed BigIntegerField value."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance. A search with radius ``r``
+    only descends into children whose edge distance lies within
+    ``[d - r, d + r]``, so most of the tree is skipped for small radii.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, payload):
+        node = [value, payload, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """Return ``(distance, payload)`` pairs within ``max_distance``, closest first."""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, payload, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, payload))
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in children.items() if low <= edge <= high)
+        found.sort(key=lambda match: match[0])
+        return found
+
+    def __len__(self):
+        return self.size
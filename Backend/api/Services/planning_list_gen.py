@@ -1,15 +1,30 @@
 # Services/planning_list_gen.py
-import base64
-import json
+import logging
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .gemini_client import (
+    GeminiAPIError,
+    build_payload,
+    extract_text,
+    get_async_client,
+    get_client,
+    image_part,
+    parse_json_text,
+)
+from .json_stream import ObjectStream
+from .routing import choose_model
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.0-flash"
 
-def send_to_gemini(image_file, text):
-    """
-    Sends user input (text + optional image) to Gemini to generate a
-    curated shopping list in JSON format (for 1 month or specified duration).
-    """
+
+def build_plan_parts(image_file, text):
+    """Prompt parts shared by ``send_to_gemini`` and ``stream_plan_items``."""
 
     # Base prompt engineering
     system_prompt = (
@@ -26,14 +41,7 @@ def send_to_gemini(image_file, text):
 
     # If an image was provided, encode it
     if image_file:
-        img_bytes = image_file.read()
-        b64_data = base64.b64encode(img_bytes).decode('utf-8')
-        parts.append({
-            "inlineData": {
-                "mimeType": image_file.content_type,
-                "data": b64_data
-            }
-        })
+        parts.append(image_part(image_file))
 
     # Combine user prompt with system guidance
     text_prompt = (
@@ -44,48 +52,76 @@ def send_to_gemini(image_file, text):
     )
 
     parts.append({"text": text_prompt})
+    return parts
+
 
-    # Build full request payload
-    payload = {
-        "model": "gemini-2.0-flash",
-        "contents": [
-            {
-                "role": "user",
-                "parts": parts
-            }
-        ]
-    }
-
-    api_key = settings.GEMINI_API_KEY
-    if not api_key:
+def send_to_gemini(image_file, text, use_cache=True):
+    """
+    Sends user input (text + optional image) to Gemini to generate a
+    curated shopping list in JSON format (for 1 month or specified duration).
+    Pass ``use_cache=False`` to bypass the LLM response cache.
+    """
+    parts = build_plan_parts(image_file, text)
+
+    if not settings.GEMINI_API_KEY:
         return {"error": "Missing GEMINI_API_KEY in settings"}
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+    try:
+        payload = build_payload(parts)
+        result = get_client().generate_content(choose_model("create_plan", payload, MODEL_NAME), payload, use_cache=use_cache)
+    except GeminiAPIError as e:
+        logger.warning("Gemini API error: %s", e.text)
+        return {"error": e.text}
+    except requests.exceptions.Timeout:
+        return {"error": "Request to Gemini timed out"}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Request failed: {str(e)}"}
 
-    response = requests.post(
-        url,
-        headers={"Content-Type": "application/json"},
-        json=payload,
-        timeout=90
-    )
+    return parse_plan_result(result)
 
-    if response.status_code != 200:
-        print("Gemini API error:", response.text)
-        return {"error": response.text}
 
-    # Parse Gemini response
-    result = response.json()
+async def send_to_gemini_async(image_file, text, use_cache=True):
+    """``send_to_gemini`` for async views, on the shared async client."""
+    # Image preprocessing is CPU-bound: keep it off the event loop
+    parts = await sync_to_async(build_plan_parts, thread_sensitive=False)(image_file, text)
 
+    if not settings.GEMINI_API_KEY:
+        return {"error": "Missing GEMINI_API_KEY in settings"}
+
+    try:
+        payload = build_payload(parts)
+        result = await get_async_client().generate_content(
+            choose_model("create_plan", payload, MODEL_NAME), payload, use_cache=use_cache
+        )
+    except GeminiAPIError as e:
+        logger.warning("Gemini API error: %s", e.text)
+        return {"error": e.text}
+    except httpx.TimeoutException:
+        return {"error": "Request to Gemini timed out"}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+    return parse_plan_result(result)
+
+
+def parse_plan_result(result):
     # Extract only the model-generated text
     try:
-        model_text = result["candidates"][0]["content"]["parts"][0]["text"]
-
-        # Try to clean/parse JSON if Gemini adds any noise
-        cleaned_text = model_text.strip().replace("```json", "").replace("```", "")
-        parsed_json = json.loads(cleaned_text)
-
-        return parsed_json  # ✅ return clean JSON object
+        return parse_json_text(extract_text(result))  # ✅ return clean JSON object
     except Exception as e:
-        print("Parsing error:", e)
-        print("Raw Gemini output:", result)
+        logger.warning("Failed to parse Gemini output: %s", e)
+        logger.debug("Raw Gemini output: %s", result)
         return {"error": "Failed to parse Gemini output", "raw_output": result}
+
+
+def stream_plan_items(image_file, text, use_cache=True):
+    """
+    Streaming variant of ``send_to_gemini``: yields each
+    ``{"item": ..., "quantity": ...}`` row as soon as Gemini has finished
+    writing it. Raises ``GeminiAPIError`` / ``requests`` exceptions.
+    """
+    parser = ObjectStream(required_keys=("item",))
+    payload = build_payload(build_plan_parts(image_file, text))
+    model = choose_model("create_plan", payload, MODEL_NAME)
+    for piece in get_client().stream_generate_content(model, payload, use_cache=use_cache):
+        yield from parser.feed(piece)
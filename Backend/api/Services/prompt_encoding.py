@@ -0,0 +1,90 @@
+# Services/prompt_encoding.py
+"""
+Compact inventory encodings for Gemini prompts.
+
+Prompt size grows with every pantry item, so the inventory goes in as a
+pipe-separated table with one header row instead of per-item prose or
+JSON. Items whose names normalize the same way ("Egg", "eggs") are
+merged first. Exact repeats are dropped. The remaining quantities are
+summed when they parse into a common dimension, and listed side by
+side otherwise.
+
+``estimate_tokens`` is a rough, tokenizer-free count. It is good enough
+to compare encodings. The real per-call counts come from Gemini's
+``usageMetadata`` (see ``gemini_client.record_usage``).
+"""
+import json
+import math
+import re
+
+from django.conf import settings
+
+from .units import convert, normalize_name, parse_quantity
+
+ENCODINGS = ("table", "lines", "json")
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+_CELL_RE = re.compile(r"[|\r\n]")
+
+
+def estimate_tokens(text):
+    """Approximate SentencePiece tokens: ~6 letters per token, one per digit and symbol."""
+    return sum(
+        math.ceil(len(piece) / 6) if piece[0].isalpha() else 1
+        for piece in _TOKEN_RE.findall(text)
+    )
+
+
+def _format_amount(amount):
+    """Fixed-point with trailing zeros stripped: no exponent, and only float noise rounded away."""
+    return f"{amount:.6f}".rstrip("0").rstrip(".") or "0"
+
+
+def _merge_quantities(quantities):
+    quantities = [q for q in dict.fromkeys(quantities) if q]
+    if len(quantities) < 2:
+        return quantities[0] if quantities else ""
+    parsed = [parse_quantity(q) for q in quantities]
+    if all(parsed):
+        first = parsed[0]
+        try:
+            total = sum(convert(q, first.unit).amount for q in parsed)
+        except ValueError:  # e.g. "2 kg" and "3 cans"
+            pass
+        else:
+            return f"{_format_amount(total)} {first.unit}"
+    return " + ".join(quantities)
+
+
+def merge_duplicates(items):
+    """``[(name, quantity), ...]`` with same-named items folded together, first spelling kept."""
+    groups = {}
+    for item in items:
+        name = str(item.get("name", "")).strip()
+        key = normalize_name(name) or name.lower()
+        groups.setdefault(key, (name, []))[1].append(str(item.get("quantity") or "").strip())
+    return [(name, _merge_quantities(quantities)) for name, quantities in groups.values()]
+
+
+def _cell(value):
+    return " ".join(_CELL_RE.sub(" ", value).split())
+
+
+def encode_inventory(items, encoding=None):
+    """
+    Render inventory rows (dicts with ``name`` / ``quantity``) for a
+    prompt. ``encoding`` is ``GEMINI_INVENTORY_ENCODING`` by default:
+
+    * ``table``: ``item|quantity`` header, one merged row per item
+    * ``lines``: the old ``- name: quantity`` list, unmerged
+    * ``json``: a JSON array of ``{"name", "quantity"}`` objects, unmerged
+    """
+    encoding = encoding or settings.GEMINI_INVENTORY_ENCODING
+    if encoding == "table":
+        rows = ["item|quantity"] + [f"{_cell(name)}|{_cell(quantity)}" for name, quantity in merge_duplicates(items)]
+        return "\n".join(rows)
+    if encoding == "lines":
+        return "\n".join(f"- {item.get('name', '')}: {item.get('quantity', '')}" for item in items)
+    if encoding == "json":
+        return json.dumps([{"name": item.get("name", ""), "quantity": item.get("quantity", "")} for item in items])
+    raise ValueError(f"Unknown inventory encoding {encoding!r}; expected one of {ENCODINGS}")
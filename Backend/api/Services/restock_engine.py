@@ -0,0 +1,164 @@
+# Services/restock_engine.py
+"""
+Deterministic restock diff: compares the items a list requires with the
+items detected in stock and reports what is missing or low, without an
+LLM call. Names are normalized and fuzzy-matched; quantities are
+compared in base units (see ``units`` and ``conversion``). Stock
+matching uses Gemini only to list what the photo shows and
+``diff_inventory_list`` for the rest.
+"""
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from ..enums import ShoppingItemStatus, Unit
+from .conversion import convert_many
+from .units import Quantity, normalize_name, parse_quantity, split_item
+
+FUZZY_THRESHOLD = 0.82
+
+
+def similarity(a, b):
+    """
+    Score two normalized names in [0, 1]: the better of a character-level
+    ratio (catches typos) and the Dice overlap of their words (catches
+    reordering, "beans green" vs "green beans").
+    """
+    if a == b:
+        return 1.0
+    return max(SequenceMatcher(None, a, b).ratio(), _word_overlap(set(a.split()), set(b.split())))
+
+
+def _word_overlap(words_a, words_b):
+    total = len(words_a) + len(words_b)
+    return 2 * len(words_a & words_b) / total if total else 0.0
+
+
+def _best_match(key, candidates, threshold):
+    """
+    Return the candidate most similar to ``key`` scoring at least
+    ``threshold``, or None. SequenceMatcher's cheap upper bounds skip most
+    candidates before the full ratio is computed; ties go to the
+    alphabetically first candidate.
+    """
+    matcher = SequenceMatcher(None)
+    matcher.set_seq2(key)
+    key_words = set(key.split())
+    best, best_score = None, threshold
+    for candidate, candidate_words in candidates:
+        score = _word_overlap(key_words, candidate_words)
+        matcher.set_seq1(candidate)
+        if matcher.real_quick_ratio() > max(score, best_score) and matcher.quick_ratio() > max(score, best_score):
+            score = max(score, matcher.ratio())
+        if score > best_score or (best is None and score >= best_score):
+            best, best_score = candidate, score
+    return best
+
+
+def _as_entry(item):
+    """
+    Accept "milk 1 gallon", {"name": ..., "quantity": ...} or (name, quantity).
+    Dicts carrying the stored ``amount``/``unit`` of an ``InventoryItem``
+    use those instead of re-parsing ``quantity``.
+    """
+    if isinstance(item, dict):
+        name = str(item.get("name") or item.get("item") or "").strip()
+        if "amount" in item:
+            amount, unit = item["amount"], item.get("unit")
+            return name, Quantity(float(amount), Unit(unit)) if amount is not None and unit else None
+        return name, parse_quantity(item.get("quantity"))
+    if isinstance(item, (tuple, list)):
+        return str(item[0]).strip(), parse_quantity(item[1])
+    return split_item(item)
+
+
+def _format(name, quantity):
+    return f"{name} {round(quantity.amount, 2):g} {quantity.unit.label}" if quantity else name
+
+
+def compare(required_items, stock_items, threshold=FUZZY_THRESHOLD):
+    """
+    Return one row per required item with its ``ShoppingItemStatus``:
+    MISSING when nothing in stock matches, LOW when the matched stock is
+    below the required amount (``shortfall`` holds the difference), OK
+    otherwise. Quantities that cannot be converted count as present.
+    Output order follows ``required_items``; the result only depends on
+    the inputs.
+    """
+    stock = {}
+    for item in stock_items:
+        name, quantity = _as_entry(item)
+        key = normalize_name(name)
+        if not key:
+            continue
+        stock.setdefault(key, []).append(quantity)
+    candidates = [(key, set(key.split())) for key in sorted(stock)]
+
+    rows = []
+    for item in required_items:
+        name, required = _as_entry(item)
+        key = normalize_name(name)
+        if not key:
+            continue
+
+        matched_key = key if key in stock else _best_match(key, candidates, threshold)
+
+        row = {
+            "item": name,
+            "required": _format(name, required) if required else name,
+            "matched": matched_key,
+            "status": ShoppingItemStatus.OK,
+            "shortfall": None,
+        }
+        if matched_key is None:
+            row["status"] = ShoppingItemStatus.MISSING
+            row["shortfall"] = required
+        elif required is not None:
+            have = _total_in(name, required.unit, stock[matched_key])
+            if have is not None and have < required.amount - 1e-9:
+                row["status"] = ShoppingItemStatus.LOW
+                row["shortfall"] = Quantity(required.amount - have, required.unit)
+        rows.append(row)
+    return rows
+
+
+def _total_in(name, unit, quantities):
+    """
+    Sum the stock quantities in ``unit``, crossing mass/volume/count via
+    the ingredient tables in ``conversion``; None if none are comparable.
+    """
+    if any(quantity is None for quantity in quantities):
+        return None  # present without a count: assume enough
+    converted = convert_many(
+        [quantity.amount for quantity in quantities],
+        [quantity.unit for quantity in quantities],
+        unit,
+        names=[name] * len(quantities),
+    )
+    comparable = ~np.isnan(converted)
+    return float(converted[comparable].sum()) if comparable.any() else None
+
+
+def restock_lines(rows):
+    """The missing and low ``compare`` rows as "name amount unit" strings, like the LLM used to return."""
+    return [_format(row["item"], row["shortfall"]) for row in rows if row["status"] != ShoppingItemStatus.OK]
+
+
+def restock_list(required_items, stock_items, threshold=FUZZY_THRESHOLD):
+    """Missing and low items of ``required_items`` (see ``restock_lines``)."""
+    return restock_lines(compare(required_items, stock_items, threshold))
+
+
+def diff_inventory_list(inventory_list, stock_items, threshold=FUZZY_THRESHOLD):
+    """
+    Compare an ``InventoryList`` (or its id) against detected stock items,
+    using each item's stored ``amount``/``unit``. One query.
+    """
+    from ..models import InventoryItem  # the models need the app registry; standalone runs import this first
+
+    required = (
+        InventoryItem.objects.filter(inventory_lists=inventory_list)
+        .order_by("id")
+        .values("name", "amount", "unit")
+    )
+    return compare(list(required), stock_items, threshold)
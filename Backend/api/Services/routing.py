@@ -0,0 +1,209 @@
+# Services/routing.py
+"""
+Latency-aware model routing and hedged Gemini requests.
+
+Every call records its latency per model and input-size bucket
+(``small`` / ``large``, split at ``GEMINI_ROUTE_LARGE_INPUT`` characters
+of prompt text plus base64 image data). Failed attempts count as at
+least their deadline (``gemini_client.record_attempt``), so a model that
+keeps timing out or erroring is routed around. Samples expire after
+``GEMINI_LATENCY_WINDOW`` seconds, so a model that was routed around gets
+tried again once its bad numbers have aged out.
+
+``choose_model(endpoint, payload, default)`` walks the endpoint's
+candidates in ``GEMINI_ROUTES`` (most preferred first) and returns the
+first whose recent p90 for this input size fits ``GEMINI_ROUTE_BUDGET``,
+or the fastest one if none does.
+
+With ``GEMINI_HEDGING`` on, a call that has not answered by the model's
+p90 gets a second identical request; the first good answer wins and the
+other is cancelled (async) or left to finish unused (sync: a blocking
+``requests`` call cannot be interrupted).
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+SMALL, LARGE = "small", "large"
+
+
+def input_size(payload):
+    """Characters of prompt text plus base64 image data in ``payload``."""
+    size = 0
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                size += len(part["text"])
+            elif "inlineData" in part:
+                size += len(part["inlineData"].get("data", ""))
+    return size
+
+
+def size_bucket(payload):
+    return LARGE if input_size(payload) > settings.GEMINI_ROUTE_LARGE_INPUT else SMALL
+
+
+class LatencyTracker:
+    """
+    Recent latencies per ``(model, bucket)``, kept for ``window`` seconds
+    (``GEMINI_LATENCY_WINDOW`` when None), at most ``max_samples`` each.
+    """
+
+    def __init__(self, window=None, max_samples=500):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._lock = threading.Lock()
+
+    def record(self, model, bucket, seconds):
+        with self._lock:
+            self._samples[(model, bucket)].append((time.monotonic(), seconds))
+
+    def _recent(self, model, bucket):
+        window = self.window if self.window is not None else settings.GEMINI_LATENCY_WINDOW
+        cutoff = time.monotonic() - window
+        with self._lock:
+            samples = self._samples.get((model, bucket))
+            if not samples:
+                return []
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            return [seconds for _, seconds in samples]
+
+    def percentile(self, model, bucket, pct, min_samples=1):
+        """Nearest-rank percentile in seconds, or None with fewer than ``min_samples`` recent samples."""
+        recent = sorted(self._recent(model, bucket))
+        if len(recent) < max(1, min_samples):
+            return None
+        return recent[max(0, math.ceil(pct / 100 * len(recent)) - 1)]
+
+    def snapshot(self):
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            f"{model}/{bucket}": {
+                "count": len(self._recent(model, bucket)),
+                "p50": self.percentile(model, bucket, 50),
+                "p90": self.percentile(model, bucket, 90),
+                "p99": self.percentile(model, bucket, 99),
+            }
+            for model, bucket in keys
+        }
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+tracker = LatencyTracker()
+hedge_counters = Counter()  # "launched", "won"; bumped from hedge threads and tasks, so under _hedge_lock
+_hedge_lock = threading.Lock()
+
+
+def _count_hedge(name):
+    with _hedge_lock:
+        hedge_counters[name] += 1
+
+
+def hedge_stats():
+    with _hedge_lock:
+        return dict(hedge_counters)
+
+
+def record_latency(model, payload, seconds):
+    tracker.record(model, size_bucket(payload), seconds)
+
+
+def choose_model(endpoint, payload, default):
+    """Model for one call to ``endpoint``; ``default`` when routing is off or unconfigured."""
+    candidates = settings.GEMINI_ROUTES.get(endpoint)
+    if not settings.GEMINI_ROUTING or not candidates:
+        return default
+
+    bucket = size_bucket(payload)
+    estimates = []
+    for model in candidates:
+        p90 = tracker.percentile(model, bucket, 90, settings.GEMINI_ROUTE_MIN_SAMPLES)
+        if p90 is None or p90 <= settings.GEMINI_ROUTE_BUDGET:
+            return model
+        estimates.append((p90, model))
+    return min(estimates)[1]
+
+
+def hedge_delay(model, payload):
+    """Seconds to wait before hedging a call to ``model``, or None to not hedge."""
+    if not settings.GEMINI_HEDGING:
+        return None
+    return tracker.percentile(
+        model, size_bucket(payload), settings.GEMINI_HEDGE_PERCENTILE, settings.GEMINI_ROUTE_MIN_SAMPLES
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2 * settings.GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini-hedge")
+        return _executor
+
+
+def hedged(fn, delay):
+    """
+    Run ``fn()``; if it has not returned after ``delay`` seconds, run it
+    again in parallel and return the first successful result. Raises the
+    first call's error if both fail.
+    """
+    executor = _get_executor()
+    primary = executor.submit(fn)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    _count_hedge("launched")
+    hedge = executor.submit(fn)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if future is hedge:
+                    _count_hedge("won")
+                return future.result()
+    return primary.result()
+
+
+async def ahedged(coro_fn, delay):
+    """``hedged`` for coroutines; the slower call is cancelled."""
+    primary = asyncio.ensure_future(coro_fn())
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+
+        _count_hedge("launched")
+        hedge = asyncio.ensure_future(coro_fn())
+        tasks.add(hedge)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        _count_hedge("won")
+                    return task.result()
+        return primary.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
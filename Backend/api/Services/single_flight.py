@@ -0,0 +1,161 @@
+# Services/single_flight.py
+"""
+Single-flight coalescing of identical concurrent Gemini calls.
+
+Callers that ask for the same request key while a call for it is in
+flight wait for that call and share its result (or its exception)
+instead of paying for their own.
+
+* Within a process, the first caller becomes the leader and followers
+  wait on it (a ``threading.Event`` for threads, an ``asyncio.Future``
+  for coroutines on the same event loop).
+* Across processes on one host, leaders claim a lease row in the
+  persistent LLM cache file. A leader that finds the key already
+  claimed by another process polls the cache until the result lands,
+  and computes it itself if the claim is released without a result
+  or the lease expires (e.g. the other worker died).
+
+The caller has already counted its own cache lookup, so these polls use
+``cache.get(key, count=False)`` and leave the cache's hit/miss counters
+alone.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from functools import partial
+
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05  # seconds between cache checks while another process computes
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """In-process coalescing for threads: ``do(key, fn)`` runs ``fn`` once per concurrent key."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "followers": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self.counters["leaders" if leader else "followers"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines: ``await do(key, coro_fn)``, one group per event loop."""
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()  # loop -> {key: Future}
+        self.counters = {"leaders": 0, "followers": 0}
+
+    async def do(self, key, coro_fn):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            self.counters["followers"] += 1
+            # shield: a cancelled follower must not cancel the shared call
+            return await asyncio.shield(future)
+
+        self.counters["leaders"] += 1
+        future = calls[key] = loop.create_future()
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody is waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del calls[key]
+
+
+def across_processes(key, cache, fn, lease):
+    """
+    Run ``fn`` unless another process on the host is already computing
+    ``key``, in which case wait (at most ``lease`` seconds) for its result
+    to appear in ``cache``. ``fn`` is expected to store its result there.
+    Without a persistent cache this is just ``fn()``.
+    """
+    if cache is None or not cache.db_path:
+        return fn()
+
+    deadline = time.monotonic() + lease
+    while not cache.claim(key, lease):
+        if time.monotonic() >= deadline:
+            return fn()
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key, count=False)
+        if value is not None:
+            logger.info("Gemini call shared with another process")
+            return value
+
+    try:
+        # The previous holder may have finished between our cache miss and the claim
+        value = cache.get(key, count=False)
+        return value if value is not None else fn()
+    finally:
+        cache.release(key)
+
+
+async def across_processes_async(key, cache, coro_fn, lease):
+    """``across_processes`` for coroutines; cache access runs off the event loop."""
+    if cache is None or not cache.db_path:
+        return await coro_fn()
+
+    claim = sync_to_async(cache.claim, thread_sensitive=False)
+    get = sync_to_async(partial(cache.get, count=False), thread_sensitive=False)
+    deadline = time.monotonic() + lease
+    while not await claim(key, lease):
+        if time.monotonic() >= deadline:
+            return await coro_fn()
+        await asyncio.sleep(POLL_INTERVAL)
+        value = await get(key)
+        if value is not None:
+            logger.info("Gemini call shared with another process")
+            return value
+
+    try:
+        value = await get(key)
+        return value if value is not None else await coro_fn()
+    finally:
+        await sync_to_async(cache.release, thread_sensitive=False)(key)
+
+
+flights = SingleFlight()
+async_flights = AsyncSingleFlight()
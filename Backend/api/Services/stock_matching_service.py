@@ -1,125 +1,135 @@
 # Services/stock_matching_service.py
-import base64
 import json
+import logging
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .gemini_client import (
+    GeminiAPIError,
+    build_payload,
+    extract_text,
+    get_async_client,
+    get_client,
+    image_part,
+    strip_fences,
+)
+from .routing import choose_model
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.0-flash"
+
 
-def match_stock_with_list(image_file, list_id, inventory_list_items):
+def build_stock_matching_payload(image_file, list_id, inventory_list_items):
     """
-    Compares stock image with inventory list items to find missing items
-    and suggests cheapest places to buy them.
-    
-    Args:
-        image_file: Uploaded image of current stock
-        list_id: ID of the inventory list to compare against
-        inventory_list_items: List of items from the inventory list
-    
-    Returns:
-        JSON with restock_list and cheapest_info
+    Gemini request for ``match_stock_with_list`` (and its async twin).
+    Gemini only reports what the photo shows; the missing/low diff
+    against the list is computed locally (``restock_engine``).
     """
-    
-    # Build the list of required items
-    required_items = []
-    for item in inventory_list_items:
-        required_items.append({
-            "name": item.get('name', ''),
-            "quantity": item.get('quantity', '')
-        })
-    
-    # System prompt for stock matching
     system_prompt = (
-        "You are a grocery inventory comparison assistant. "
-        "You will receive an image of current stock/pantry and a list of required items. "
-        "Your task is to:\n"
-        "1. Identify what items from the required list are MISSING or INSUFFICIENT in the stock image\n"
-        "2. Determine the cheapest store to buy these missing items (consider Walmart, Target, Costco, Aldi, etc.)\n"
-        "3. Provide an estimated total cost for all missing items\n\n"
+        "You are a grocery inventory assistant. "
+        "You will receive an image of current stock/pantry. "
+        "List every grocery item visible in the image with its estimated quantity.\n\n"
         "Respond ONLY with valid JSON in this exact format:\n"
         "{\n"
-        '  "restock_list": ["item1 quantity", "item2 quantity", ...],\n'
-        '  "cheapest_info": {\n'
-        '    "store": "Store Name",\n'
-        '    "estimated_total_cost": 0.00\n'
-        "  }\n"
+        '  "stock_items": [{"name": "item name", "quantity": "2 bags"}, ...]\n'
         "}\n"
         "Do NOT include markdown, explanations, or any text outside the JSON."
     )
-    
-    # Build content parts
+
     parts = []
-    
-    # Add image if provided
     if image_file:
-        img_bytes = image_file.read()
-        b64_data = base64.b64encode(img_bytes).decode('utf-8')
-        parts.append({
-            "inlineData": {
-                "mimeType": image_file.content_type,
-                "data": b64_data
-            }
-        })
-    
-    # Create the text prompt with required items
-    required_items_text = "\n".join([
-        f"- {item['name']}: {item['quantity']}" 
-        for item in required_items
-    ])
-    
+        parts.append(image_part(image_file))
+
+    # The list's names let Gemini label matching items the same way
+    list_names = ", ".join(dict.fromkeys(" ".join(str(item.get("name", "")).split()) for item in inventory_list_items))
     text_prompt = (
         f"{system_prompt}\n\n"
-        f"Required items from inventory list (ID: {list_id}):\n"
-        f"{required_items_text}\n\n"
-        "Analyze the stock image and identify which items are missing or need restocking. "
+        f"Items on inventory list (ID: {list_id}), use these names for any of them you see:\n"
+        f"{list_names}\n\n"
         "Format quantities like '3 gallons', '2 bags', '1 bottle', etc."
     )
-    
     parts.append({"text": text_prompt})
+
+    return build_payload(parts, generation_config={
+        "temperature": 0.4,
+        "topK": 32,
+        "topP": 1,
+        "maxOutputTokens": 2048,
+    })
+
+
+def match_stock_with_list(image_file, list_id, inventory_list_items, use_cache=True):
+    """
+    Lists the grocery items visible in a stock photo, named after the
+    inventory list's items where they match.
     
-    # Build request payload
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": parts
-            }
-        ],
-        "generationConfig": {
-            "temperature": 0.4,
-            "topK": 32,
-            "topP": 1,
-            "maxOutputTokens": 2048,
-        }
-    }
+    Args:
+        image_file: Uploaded image of current stock
+        list_id: ID of the inventory list to compare against
+        inventory_list_items: List of items from the inventory list
+        use_cache: Set to False to bypass the LLM response cache
     
-    api_key = settings.GEMINI_API_KEY
-    if not api_key:
+    Returns:
+        JSON with stock_items ([{"name", "quantity"}, ...]), or an error
+    """
+    payload = build_stock_matching_payload(image_file, list_id, inventory_list_items)
+
+    if not settings.GEMINI_API_KEY:
         return {"error": "Missing GEMINI_API_KEY in settings"}
-    
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-    
+
+    try:
+        result = get_client().generate_content(choose_model("stock_matching", payload, MODEL_NAME), payload, use_cache=use_cache)
+    except GeminiAPIError as e:
+        logger.warning("Gemini API error: %s", e.text)
+        return {"error": f"Gemini API error: {e.text}"}
+    except requests.exceptions.Timeout:
+        return {"error": "Request to Gemini timed out"}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+    return parse_stock_matching_result(result)
+
+
+async def match_stock_with_list_async(image_file, list_id, inventory_list_items, use_cache=True):
+    """``match_stock_with_list`` for async views, on the shared async client."""
+    # Image preprocessing is CPU-bound: keep it off the event loop
+    payload = await sync_to_async(build_stock_matching_payload, thread_sensitive=False)(
+        image_file, list_id, inventory_list_items
+    )
+
+    if not settings.GEMINI_API_KEY:
+        return {"error": "Missing GEMINI_API_KEY in settings"}
+
     try:
-        response = requests.post(
-            url,
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=90
+        result = await get_async_client().generate_content(
+            choose_model("stock_matching", payload, MODEL_NAME), payload, use_cache=use_cache
         )
-        
-        if response.status_code != 200:
-            print("Gemini API error:", response.text)
-            return {"error": f"Gemini API error: {response.text}"}
-        
-        # Parse response
-        result = response.json()
-        model_text = result["candidates"][0]["content"]["parts"][0]["text"]
+    except GeminiAPIError as e:
+        logger.warning("Gemini API error: %s", e.text)
+        return {"error": f"Gemini API error: {e.text}"}
+    except httpx.TimeoutException:
+        return {"error": "Request to Gemini timed out"}
+    except httpx.HTTPError as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+    return parse_stock_matching_result(result)
+
+
+def parse_stock_matching_result(result):
+    cleaned_text = None
+    try:
+        model_text = extract_text(result)
         
         # Clean and parse JSON
-        cleaned_text = model_text.strip().replace("```json", "").replace("```", "").strip()
+        cleaned_text = strip_fences(model_text)
         parsed_json = json.loads(cleaned_text)
         
         # Validate response structure
-        if "restock_list" not in parsed_json or "cheapest_info" not in parsed_json:
+        if not isinstance(parsed_json, dict) or not isinstance(parsed_json.get("stock_items"), list):
             return {
                 "error": "Invalid response format from Gemini",
                 "raw_output": parsed_json
@@ -127,13 +137,12 @@ def match_stock_with_list(image_file, list_id, inventory_list_items):
         
         return parsed_json
         
-    except requests.exceptions.Timeout:
-        return {"error": "Request to Gemini timed out"}
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Request failed: {str(e)}"}
     except (KeyError, IndexError) as e:
+        logger.warning("Failed to parse Gemini response: %s", e)
         return {"error": f"Failed to parse Gemini response: {str(e)}", "raw_output": result}
     except json.JSONDecodeError as e:
+        logger.warning("Invalid JSON from Gemini: %s", e)
         return {"error": f"Invalid JSON from Gemini: {str(e)}", "raw_text": cleaned_text}
     except Exception as e:
-        return {"error": f"Unexpected error: {str(e)}"}
\ No newline at end of file
+        logger.exception("Unexpected error while parsing the stock matching result")
+        return {"error": f"Unexpected error: {str(e)}"}
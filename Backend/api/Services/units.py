@@ -0,0 +1,170 @@
+# Services/units.py
+"""
+Parsing of free-text quantities ("5L", "2 lbs", "1/2 cup", "3 cans") into
+an amount plus an ``enums.Unit``, conversion between units of the same
+dimension (mass, volume, count), and item name normalization.
+"""
+import re
+from typing import NamedTuple
+
+from ..enums import Unit
+
+MASS, VOLUME, COUNT = "mass", "volume", "count"
+
+# Unit -> (dimension, factor to the dimension's base unit: g, ml or ea)
+UNIT_FACTORS = {
+    Unit.G: (MASS, 1.0),
+    Unit.KG: (MASS, 1000.0),
+    Unit.OZ: (MASS, 28.349523125),
+    Unit.LB: (MASS, 453.59237),
+    Unit.ML: (VOLUME, 1.0),
+    Unit.L: (VOLUME, 1000.0),
+    Unit.CUP: (VOLUME, 236.5882365),
+    Unit.TBSP: (VOLUME, 14.78676478125),
+    Unit.TSP: (VOLUME, 4.92892159375),
+    Unit.EACH: (COUNT, 1.0),
+}
+
+# Spelling -> (unit, multiplier) for words that are not Unit values themselves
+UNIT_ALIASES = {
+    "g": (Unit.G, 1), "gm": (Unit.G, 1), "gms": (Unit.G, 1), "gram": (Unit.G, 1), "grams": (Unit.G, 1),
+    "kg": (Unit.KG, 1), "kgs": (Unit.KG, 1), "kilo": (Unit.KG, 1), "kilos": (Unit.KG, 1),
+    "kilogram": (Unit.KG, 1), "kilograms": (Unit.KG, 1),
+    "oz": (Unit.OZ, 1), "ounce": (Unit.OZ, 1), "ounces": (Unit.OZ, 1),
+    "lb": (Unit.LB, 1), "lbs": (Unit.LB, 1), "pound": (Unit.LB, 1), "pounds": (Unit.LB, 1),
+    "ml": (Unit.ML, 1), "milliliter": (Unit.ML, 1), "milliliters": (Unit.ML, 1),
+    "millilitre": (Unit.ML, 1), "millilitres": (Unit.ML, 1),
+    "l": (Unit.L, 1), "ltr": (Unit.L, 1), "liter": (Unit.L, 1), "liters": (Unit.L, 1),
+    "litre": (Unit.L, 1), "litres": (Unit.L, 1),
+    "gal": (Unit.L, 3.785411784), "gallon": (Unit.L, 3.785411784), "gallons": (Unit.L, 3.785411784),
+    "galon": (Unit.L, 3.785411784), "galons": (Unit.L, 3.785411784),
+    "cup": (Unit.CUP, 1), "cups": (Unit.CUP, 1),
+    "tbsp": (Unit.TBSP, 1), "tablespoon": (Unit.TBSP, 1), "tablespoons": (Unit.TBSP, 1),
+    "tsp": (Unit.TSP, 1), "teaspoon": (Unit.TSP, 1), "teaspoons": (Unit.TSP, 1),
+    "ea": (Unit.EACH, 1), "each": (Unit.EACH, 1), "x": (Unit.EACH, 1),
+    "dozen": (Unit.EACH, 12), "dozens": (Unit.EACH, 12),
+}
+
+# Packaging words: counted as EACH (2 cans == 2 ea)
+COUNT_WORDS = {
+    "bag", "bags", "bottle", "bottles", "box", "boxes", "bowl", "bowls", "bunch", "bunches",
+    "can", "cans", "carton", "cartons", "container", "containers", "jar", "jars", "loaf",
+    "loaves", "pack", "packs", "packet", "packets", "piece", "pieces", "pc", "pcs",
+    "stick", "sticks", "tin", "tins", "tub", "tubs", "unit", "units",
+}
+
+_NUMBER = r"(?:\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|\.\d+)"
+_QUANTITY_RE = re.compile(rf"^\s*(?P<amount>{_NUMBER})\s*(?P<unit>[a-zA-Z]+\.?)?\b")
+_TRAILING_QUANTITY_RE = re.compile(rf"(?P<amount>{_NUMBER})\s*(?P<unit>[a-zA-Z]+\.?)?\s*$")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+class Quantity(NamedTuple):
+    amount: float
+    unit: str
+
+    @property
+    def dimension(self):
+        return UNIT_FACTORS[self.unit][0]
+
+    def to_base(self):
+        return self.amount * UNIT_FACTORS[self.unit][1]
+
+    def __str__(self):
+        return f"{self.amount:g} {self.unit}"
+
+
+def _parse_number(text):
+    text = text.strip()
+    if " " in text:
+        whole, fraction = text.split(None, 1)
+        return float(whole) + _parse_number(fraction)
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator)
+    return float(text)
+
+
+def lookup_unit(word):
+    """Return ``(Unit, multiplier)`` for a unit spelling, or None."""
+    if not word:
+        return Unit.EACH, 1
+    word = word.lower().rstrip(".")
+    if word in UNIT_ALIASES:
+        return UNIT_ALIASES[word]
+    if word in COUNT_WORDS:
+        return Unit.EACH, 1
+    return None
+
+
+def _to_quantity(amount_text, unit_word):
+    unit_info = lookup_unit(unit_word)
+    if unit_info is None:
+        # Unknown word after a number ("1 large"): treat as a plain count
+        unit_info = Unit.EACH, 1
+    unit, multiplier = unit_info
+    return Quantity(_parse_number(amount_text) * multiplier, unit)
+
+
+def parse_quantity(text):
+    """
+    Parse "5L", "2 lbs", "1 1/2 cups", "dozen" or "3 cans" into a
+    ``Quantity``. Returns None when the text holds no quantity.
+    """
+    if text is None:
+        return None
+    text = str(text).strip()
+    if not text:
+        return None
+    match = _QUANTITY_RE.match(text)
+    if match:
+        return _to_quantity(match.group("amount"), match.group("unit"))
+    unit_info = lookup_unit(text.split()[0])
+    if unit_info is not None and text.split()[0].lower() in ("dozen", "dozens"):
+        return Quantity(float(unit_info[1]), unit_info[0])
+    return None
+
+
+def split_item(text):
+    """
+    Split "milk 1 gallon" / "large eggs dozen" into ``(name, Quantity)``.
+    The quantity is None when the text carries none.
+    """
+    text = str(text).strip()
+    match = _TRAILING_QUANTITY_RE.search(text)
+    if match and match.start() > 0:
+        name = text[:match.start()].strip()
+        return name, _to_quantity(match.group("amount"), match.group("unit"))
+    words = text.split()
+    if len(words) > 1 and words[-1].lower() in ("dozen", "dozens"):
+        return " ".join(words[:-1]), Quantity(12.0, Unit.EACH)
+    return text, None
+
+
+def _singular(word):
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("ches", "shes", "sses", "xes", "oes")):
+        return word[:-2]
+    if len(word) > 2 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_name(name):
+    """Lowercase, strip punctuation and singularize: "Green Beans," -> "green bean"."""
+    words = _NON_WORD_RE.sub(" ", str(name).lower()).split()
+    return " ".join(_singular(word) for word in words)
+
+
+def fold_name(name):
+    """Case- and spacing-insensitive identity of an item name: " Green  BEANS" -> "green beans"."""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def convert(quantity, unit):
+    """Convert ``quantity`` to ``unit``; raises ValueError across dimensions."""
+    dimension, factor = UNIT_FACTORS[unit]
+    if quantity.dimension != dimension:
+        raise ValueError(f"Cannot convert {quantity.unit} to {unit}")
+    return Quantity(quantity.to_base() / factor, unit)
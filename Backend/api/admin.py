@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import InventoryItem, InventoryList, ShoppingList
+from .models import InventoryItem, InventoryList, ShoppingList, Job, StockPhoto, PriceObservation
 
 
 @admin.register(InventoryItem)
@@ -22,3 +22,24 @@ class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('id', 'item_name', 'brand', 'quantity_needed', 'created_at')
     search_fields = ('item_name', 'brand')
     ordering = ('-created_at',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'status_code', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    ordering = ('-created_at',)
+
+
+@admin.register(StockPhoto)
+class StockPhotoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'inventory_list', 'dhash', 'created_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(PriceObservation)
+class PriceObservationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'item', 'store', 'price', 'observed_at')
+    list_filter = ('store',)
+    search_fields = ('item',)
+    ordering = ('-observed_at',)
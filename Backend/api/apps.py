@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete
+
+        from .models import InventoryList
+        from .photo_index import forget_list
+        from .sqlite_tuning import apply_pragmas
+        from .telemetry import install_query_counter
+
+        # WAL and friends on every SQLite connection (api/sqlite_tuning.py)
+        connection_created.connect(apply_pragmas, dispatch_uid="api.sqlite_tuning.pragmas")
+        # Count and time SQL per request (api/telemetry.py)
+        connection_created.connect(install_query_counter, dispatch_uid="api.telemetry.query_counter")
+        # Drop a deleted list's stock photo index (api/photo_index.py)
+        post_delete.connect(forget_list, sender=InventoryList, dispatch_uid="api.photo_index.forget_list")
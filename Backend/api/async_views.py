@@ -0,0 +1,166 @@
+# api/async_views.py
+"""
+Async (ASGI) versions of the Gemini-backed endpoints.
+
+Under an ASGI server each in-flight Gemini call is a suspended coroutine on
+the shared ``httpx.AsyncClient`` instead of a blocked worker thread. The
+ORM is reached through its async API (``aget``, ``async for``) or, for
+transactional writes, ``sync_to_async``, which runs them one at a time on
+a single thread. Under WSGI these views still work, one request per thread.
+
+Request bodies, validation and responses match the sync views in
+``views.py``; the routes live under ``/api/async/``.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from .models import InventoryList
+from .serializers import (
+    CreatePlanSerializer,
+    InventoryItemSerializer,
+    PartyPlanningSerializer,
+    StockListMatchingSerializer,
+)
+from .Services.feastbeast import plan_party_with_inventory_async
+from .Services.planning_list_gen import send_to_gemini_async
+from .Services.stock_matching_service import match_stock_with_list_async
+from .telemetry import phase
+from .views import (
+    party_plan_from_response,
+    plan_from_response,
+    reused_match,
+    stock_match_from_response,
+    stock_photo_key,
+    use_llm_cache,
+)
+
+
+def json_response(body, status_code):
+    return JsonResponse(body, status=status_code, encoder=DjangoJSONEncoder, safe=False)
+
+
+def request_data(request):
+    """JSON body or form/multipart fields plus files, like DRF's ``request.data``."""
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+    return {**request.POST.dict(), **request.FILES.dict()}
+
+
+class AsyncAPIView(View):
+    """CSRF-exempt like DRF's ``APIView``; subclasses define ``async def post``."""
+    http_method_names = ["post", "options"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def validated(self, serializer_class, request):
+        """Return ``(validated_data, None)`` or ``(None, error_response)``."""
+        with phase("parse"):
+            data = request_data(request)
+            serializer = serializer_class(data=data) if data is not None else None
+            valid = serializer is not None and serializer.is_valid()
+        if data is None:
+            return None, json_response({"detail": "JSON parse error"}, status.HTTP_400_BAD_REQUEST)
+        if not valid:
+            return None, json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        return serializer.validated_data, None
+
+
+async def list_items_data(inventory_list):
+    items = [item async for item in inventory_list.inventory_items.all()]
+    return InventoryItemSerializer(items, many=True).data
+
+
+# --- AI Plan Creation ---
+class AsyncCreatePlanView(AsyncAPIView):
+    """POST /api/async/create_plan/ (see ``CreatePlanView``)"""
+
+    async def post(self, request, *args, **kwargs):
+        data, error = self.validated(CreatePlanSerializer, request)
+        if error:
+            return error
+
+        text_input = data.get('text')
+        gemini_response = await send_to_gemini_async(data.get('image'), text_input, use_cache=use_llm_cache(request))
+        body, status_code = await sync_to_async(plan_from_response)(text_input, gemini_response)
+        return json_response(body, status_code)
+
+
+# --- Stock Matching ---
+class AsyncStockMatchingView(AsyncAPIView):
+    """POST /api/async/stock-matching/ (see ``StockMatchingView``)"""
+
+    async def post(self, request, *args, **kwargs):
+        data, error = self.validated(StockListMatchingSerializer, request)
+        if error:
+            return error
+
+        image_file = data.get('image')
+        list_id = data.get('list_id')
+        if not image_file:
+            return json_response({"error": "Image is required for stock matching"}, status.HTTP_400_BAD_REQUEST)
+        if not list_id:
+            return json_response({"error": "list_id is required to compare stock"}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            inventory_list = await InventoryList.objects.aget(id=list_id)
+        except InventoryList.DoesNotExist:
+            return json_response(
+                {"error": f"Inventory list with id {list_id} not found"}, status.HTTP_404_NOT_FOUND
+            )
+
+        items_data = await list_items_data(inventory_list)
+        if not items_data:
+            return json_response(
+                {"error": "The selected inventory list has no items to compare"}, status.HTTP_400_BAD_REQUEST
+            )
+
+        use_cache = use_llm_cache(request)
+        # Hashing decodes the image: CPU-bound, so off the event loop
+        photo_hash, digest = await sync_to_async(stock_photo_key, thread_sensitive=False)(image_file, items_data)
+        if use_cache:
+            reused = await sync_to_async(reused_match)(list_id, inventory_list.name, photo_hash, digest)
+            if reused is not None:
+                return json_response(reused, status.HTTP_200_OK)
+
+        gemini_response = await match_stock_with_list_async(image_file, list_id, items_data, use_cache=use_cache)
+        body, status_code = await sync_to_async(stock_match_from_response)(
+            list_id, inventory_list.name, gemini_response, photo_hash, digest
+        )
+        return json_response(body, status_code)
+
+
+# --- Party Planning ---
+class AsyncPartyPlanningView(AsyncAPIView):
+    """POST /api/async/plan-party/ (see ``PartyPlanningView``)"""
+
+    async def post(self, request, *args, **kwargs):
+        data, error = self.validated(PartyPlanningSerializer, request)
+        if error:
+            return error
+
+        list_id = data.get("list_id")
+        try:
+            inventory_list = await InventoryList.objects.aget(id=list_id)
+        except InventoryList.DoesNotExist:
+            return json_response({"error": "Inventory list not found"}, status.HTTP_404_NOT_FOUND)
+
+        items_data = await list_items_data(inventory_list)
+        if not items_data:
+            return json_response({"error": "Selected inventory list has no items"}, status.HTTP_400_BAD_REQUEST)
+
+        gemini_response = await plan_party_with_inventory_async(
+            list_id, data.get("party_prompt"), items_data, use_cache=use_llm_cache(request)
+        )
+        body, status_code = party_plan_from_response(list_id, inventory_list.name, gemini_response)
+        return json_response(body, status_code)
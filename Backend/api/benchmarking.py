@@ -0,0 +1,165 @@
+# api/benchmarking.py
+"""
+Helpers shared by the benchmark management commands: a throwaway
+database and realistic seed data for it, a fake Gemini upstream wired
+into the settings, latency percentiles, and a background sampler for
+RSS and thread count.
+"""
+import contextlib
+import math
+import multiprocessing
+import random
+import resource
+import threading
+
+from django.db import connection
+from django.test.utils import override_settings
+
+from . import fake_gemini as fake_gemini_server
+from .models import InventoryItem, InventoryList, ShoppingList
+
+FOODS = [
+    "Milk", "Eggs", "Basmati Rice", "Green Beans", "Olive Oil", "Cheddar Cheese", "Tortilla Chips", "Salsa",
+    "Chicken Breast", "Ground Beef", "Spinach", "Bananas", "Apples", "Bread", "Butter", "Pasta", "Tomato Sauce",
+    "Black Beans", "Oats", "Yogurt", "Coffee", "Flour", "Sugar", "Onions", "Garlic", "Potatoes",
+]
+BRANDS = [None, "Kirkland", "Great Value", "365", "Barilla", "Tillamook"]
+QUANTITIES = ["1 gallon", "12", "2 kg", "500 g", "1 bottle", "3 cans", "2 lbs", "1 jar", "1.5 L", "", "dozen"]
+
+
+@contextlib.contextmanager
+def scratch_database(name=None):
+    """
+    Run against a freshly migrated test database so benchmarks never
+    touch real data. For SQLite it is in memory unless ``name`` gives a
+    file path (needed for WAL and for several connections writing).
+    """
+    if name is not None:
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = str(name)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextlib.contextmanager
+def fake_gemini(text, latency=0.0, **options):
+    """
+    Run a fake Gemini upstream in a child process, so its threads and
+    memory do not count towards the numbers being measured, and point
+    the Gemini settings (LLM cache off) at it. Yields its base URL.
+    ``latency`` and ``options`` (fault rates, seed...) are passed to
+    ``FakeGeminiServer``.
+    """
+    context = multiprocessing.get_context("spawn")
+    url_queue = context.Queue()
+    process = context.Process(target=fake_gemini_server.serve, args=(text, latency, url_queue, options), daemon=True)
+    process.start()
+    try:
+        url = url_queue.get(timeout=30)
+        with override_settings(GEMINI_API_KEY="bench-key", GEMINI_API_BASE_URL=url, LLM_CACHE_ENABLED=False):
+            yield url
+    finally:
+        process.terminate()
+        process.join()
+
+
+def seed_database(items=10_000, lists=1_000, links=50_000, shopping=1_000, seed=0):
+    """
+    Bulk-insert ``items`` inventory items, ``lists`` inventory lists
+    sharing ``links`` list/item rows between them (spread evenly, no
+    duplicates), and ``shopping`` shopping list rows. Returns the lists.
+    """
+    rng = random.Random(seed)
+    new_items = []
+    for index in range(items):
+        item = InventoryItem(
+            name=f"{rng.choice(FOODS)} {index}", quantity=rng.choice(QUANTITIES), brand=rng.choice(BRANDS),
+        )
+        item.normalize_name()  # bulk_create skips save()
+        item.parse_quantity()
+        new_items.append(item)
+    item_ids = [item.id for item in InventoryItem.objects.bulk_create(new_items, batch_size=1000)]
+
+    new_lists = InventoryList.objects.bulk_create(
+        [InventoryList(name=f"List {index}", purpose=rng.choice([None, "Weekly", "Party"])) for index in range(lists)],
+        batch_size=1000,
+    )
+    Through = InventoryList.inventory_items.through
+    per_list, extra = divmod(min(links, items * lists), max(lists, 1))
+    rows = [
+        Through(inventorylist_id=inventory_list.id, inventoryitem_id=item_id)
+        for index, inventory_list in enumerate(new_lists)
+        for item_id in rng.sample(item_ids, per_list + (index < extra))
+    ]
+    Through.objects.bulk_create(rows, batch_size=5000)
+
+    ShoppingList.objects.bulk_create(
+        [ShoppingList(item_name=rng.choice(FOODS), quantity_needed=rng.randint(1, 6)) for _ in range(shopping)],
+        batch_size=1000,
+    )
+    return new_lists
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (None when empty)."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(samples):
+    """p50/p95/p99/max of latencies given in seconds, reported in milliseconds."""
+    return {
+        f"{name}_ms": None if value is None else round(value * 1000, 2)
+        for name, value in (
+            ("p50", percentile(samples, 50)),
+            ("p95", percentile(samples, 95)),
+            ("p99", percentile(samples, 99)),
+            ("max", max(samples) if samples else None),
+        )
+    }
+
+
+def current_rss_kb():
+    """Resident set size from /proc (Linux); falls back to the peak RSS."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ResourceSampler:
+    """Samples RSS and live thread count every ``interval`` seconds while active."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_rss_kb = self.peak_rss_kb = current_rss_kb()
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss_kb = max(self.peak_rss_kb, current_rss_kb())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self):
+        return {
+            "rss_start_kb": self.start_rss_kb,
+            "rss_peak_kb": self.peak_rss_kb,
+            "rss_growth_kb": self.peak_rss_kb - self.start_rss_kb,
+            "peak_threads": self.peak_threads,
+        }
@@ -21,4 +21,13 @@ class ShoppingItemStatus(models.TextChoices):
     LOW = "low", "Low"
     OK = "ok", "OK"
     PURCHASED = "purchased", "Purchased"
-    
\ No newline at end of file
+    
+class JobKind(models.TextChoices):
+    CREATE_PLAN = "create_plan", "Create Plan"
+    STOCK_MATCHING = "stock_matching", "Stock Matching"
+
+class JobStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    RUNNING = "running", "Running"
+    SUCCEEDED = "succeeded", "Succeeded"
+    FAILED = "failed", "Failed"
@@ -0,0 +1,330 @@
+# api/fake_gemini.py
+"""
+Local stand-in for the Gemini REST API, for tests, load tests and
+benchmarks. Point ``GEMINI_API_BASE_URL`` at ``server.url`` (or run
+``python manage.py fake_gemini`` and use the URL it prints).
+
+``generateContent`` answers with a canned text: the first of
+``responses`` (prompt substring -> text) that matches the prompt, else
+``text``. With ``recordings`` set, the file (JSON, keyed like the LLM
+cache) is replayed instead. With ``upstream`` set too, calls missing
+from it are forwarded to the real API and added to it. A
+``streamGenerateContent?alt=sse`` call sends the same text split into
+``chunks`` events, ``chunk_delay`` seconds apart.
+
+Response times follow ``latency``, which is a number of seconds or a
+spec like ``uniform:0.2,1.5``, ``lognormal:0.8,0.5`` (median, sigma) or
+``exponential:0.5`` (mean). Faults are drawn per call:
+
+* ``rate_limit_rate``: an immediate 429 ``RESOURCE_EXHAUSTED``
+* ``server_error_rate``: a 503 ``UNAVAILABLE`` after the usual latency
+* ``malformed_rate``: a 200 whose text is truncated JSON, like a
+  generation cut off mid-object
+
+Latency and faults come from one ``random.Random(seed)``, so a run with
+a fixed seed and a single client is reproducible. ``served`` counts the
+outcomes.
+"""
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .Services.llm_cache import make_key
+
+_ERRORS = {
+    429: ("RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota)."),
+    503: ("UNAVAILABLE", "The model is overloaded. Please try again later."),
+}
+
+
+def _response_body(text, prompt_tokens=0, output_tokens=0):
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+
+def _error_body(status):
+    name, message = _ERRORS[status]
+    return {"error": {"code": status, "message": message, "status": name}}
+
+
+def _tokens(text):
+    return -(-len(text) // 4)  # ~4 characters per token
+
+
+def _prompt_text(payload):
+    return "\n".join(
+        part["text"]
+        for content in payload.get("contents", [])
+        for part in content.get("parts", [])
+        if "text" in part
+    )
+
+
+def _model_and_method(path):
+    """``("gemini-2.5-flash", "generateContent")`` from ``/v1beta/models/gemini-2.5-flash:generateContent?...``."""
+    name = path.split("?", 1)[0].rsplit("/", 1)[-1]
+    model, _, method = name.partition(":")
+    return model, method
+
+
+class Latency:
+    """A response time distribution; ``Latency.parse(0.5)`` or ``Latency.parse("uniform:0.2,1.5")``."""
+
+    KINDS = ("fixed", "uniform", "lognormal", "exponential")
+
+    def __init__(self, kind="fixed", *params):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution {kind!r}; expected one of {self.KINDS}")
+        self.kind = kind
+        self.params = tuple(float(p) for p in params) or (0.0,)
+
+    @classmethod
+    def parse(cls, spec):
+        if isinstance(spec, cls):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", spec)
+        kind, _, params = str(spec).partition(":")
+        if not params:
+            return cls("fixed", kind)
+        return cls(kind, *params.split(","))
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params[:2])
+        if self.kind == "lognormal":
+            median, sigma = self.params[:2]
+            return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.kind}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # benchmarks open hundreds of connections at once
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):  # the client gave up: timed out or lost a hedge
+            return
+        super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_POST(self):
+        fake = self.server.fake
+        request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        fake.paths.append(self.path)
+        model, method = _model_and_method(self.path)
+        try:
+            payload = json.loads(request_body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload", "status": "INVALID_ARGUMENT"}})
+            return
+
+        latency, fault = fake.draw()
+        if fault == 429:
+            fake.count("rate_limited")
+            self._send_json(429, _error_body(429))
+            return
+        time.sleep(latency)
+        if fault == 503:
+            fake.count("server_error")
+            self._send_json(503, _error_body(503))
+            return
+
+        try:
+            body = fake.answer(model, payload, self.path)
+        except urllib.error.HTTPError as e:  # upstream refused; pass it on unrecorded
+            fake.count("upstream_error")
+            self._send_raw(e.code, e.read())
+            return
+        if fault == "malformed":
+            fake.count("malformed")
+            text = fake.text_of(body)
+            body = _response_body(text[:max(1, len(text) // 2)], *fake.usage_of(body))
+        else:
+            fake.count("ok")
+
+        if method == "streamGenerateContent":
+            self._stream(fake, body)
+        else:
+            self._send_json(200, body)
+
+    def _send_json(self, status, body):
+        self._send_raw(status, json.dumps(body).encode())
+
+    def _send_raw(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, fake, body):
+        text = fake.text_of(body)
+        prompt_tokens, _ = fake.usage_of(body)
+        size = -(-len(text) // fake.chunks) or 1
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        sent = ""
+        for piece in pieces:
+            sent += piece
+            event = _response_body(piece, prompt_tokens, _tokens(sent))
+            self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(fake.chunk_delay)
+        self.close_connection = True
+        fake.stream_finished.set()
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGeminiServer:
+    """Threaded HTTP server on an ephemeral port (by default); use as a context manager."""
+
+    def __init__(
+        self, text='{"shopping_list": []}', latency=0.0, chunks=1, chunk_delay=0.0, host="127.0.0.1", port=0,
+        responses=None, rate_limit_rate=0.0, server_error_rate=0.0, malformed_rate=0.0, seed=None,
+        recordings=None, upstream=None,
+    ):
+        self.text = text
+        self.latency = Latency.parse(latency)
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.responses = dict(responses or {})
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.malformed_rate = malformed_rate
+        self.recordings_path = Path(recordings) if recordings else None
+        self.recordings = self._load_recordings()
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.paths = []
+        self.served = Counter()
+        self.stream_finished = threading.Event()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def draw(self):
+        """``(latency_seconds, fault)`` for one call; fault is None, 429, 503 or ``"malformed"``."""
+        with self._lock:
+            latency = max(0.0, self.latency.sample(self._rng))
+            roll = self._rng.random()
+        for fault, rate in ((429, self.rate_limit_rate), (503, self.server_error_rate), ("malformed", self.malformed_rate)):
+            if roll < rate:
+                return latency, fault
+            roll -= rate
+        return latency, None
+
+    def count(self, outcome):
+        with self._lock:
+            self.served[outcome] += 1
+
+    def answer(self, model, payload, path):
+        """Response body for a successful call: recorded, forwarded upstream, or canned."""
+        key = make_key(model, payload)
+        recorded = self.recordings.get(key)
+        if recorded is not None:
+            self.count("replayed")
+            return recorded["response"]
+        if self.upstream:
+            body = self._forward(model, payload, path)
+            self._record(key, model, body)
+            self.count("recorded")
+            return body
+
+        prompt = _prompt_text(payload)
+        text = next((text for pattern, text in self.responses.items() if pattern in prompt), self.text)
+        return _response_body(text, _tokens(prompt), _tokens(text))
+
+    @staticmethod
+    def text_of(body):
+        try:
+            return body["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            return ""
+
+    @staticmethod
+    def usage_of(body):
+        usage = body.get("usageMetadata") or {}
+        return usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0)
+
+    def _forward(self, model, payload, path):
+        # Streams are recorded from a plain generateContent call and re-chunked on replay
+        query = path.partition("?")[2].replace("alt=sse", "").strip("&")
+        url = f"{self.upstream}/models/{model}:generateContent" + (f"?{query}" if query else "")
+        request = urllib.request.Request(
+            url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return json.loads(response.read())
+
+    def _load_recordings(self):
+        if self.recordings_path is None or not self.recordings_path.exists():
+            return {}
+        return json.loads(self.recordings_path.read_text(encoding="utf-8"))
+
+    def _record(self, key, model, body):
+        with self._lock:
+            self.recordings[key] = {"model": model, "response": body}
+            if self.recordings_path is not None:
+                partial = self.recordings_path.with_suffix(self.recordings_path.suffix + ".tmp")
+                partial.write_text(json.dumps(self.recordings, indent=1), encoding="utf-8")
+                partial.replace(self.recordings_path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def serve(text, latency, url_queue, options=None):
+    """Child-process entry point: serve until terminated, sending the URL back first."""
+    server = FakeGeminiServer(text, latency=latency, **(options or {}))
+    url_queue.put(server.url)
+    server.serve_forever()
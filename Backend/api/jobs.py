@@ -0,0 +1,106 @@
+# api/jobs.py
+"""
+Broker-less background jobs for long-running Gemini calls.
+
+Jobs run on an in-process thread pool (the work is I/O bound, so threads
+are enough) and their status/result is stored in the ``Job`` table, which
+clients poll via ``GET /api/jobs/<id>/``.
+
+A job whose process died stays ``pending``/``running`` in the table, so
+``fail_stale_jobs`` marks jobs older than ``API_JOB_TIMEOUT`` as failed.
+It runs when a process starts its worker pool and when a client polls
+an unfinished job. A worker that finishes after its job was failed does
+not overwrite that outcome.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .enums import JobStatus
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            fail_stale_jobs()  # left behind by a previous process
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.API_JOB_WORKERS,
+                thread_name_prefix="api-job",
+            )
+        return _executor
+
+
+def submit_job(kind, func, *args, **kwargs):
+    """
+    Create a ``Job`` row and schedule ``func(*args, **kwargs)`` on the
+    worker pool. ``func`` must return a ``(body, status_code)`` tuple.
+    With ``API_JOBS_EAGER`` the job runs inline (useful in tests).
+    """
+    job = Job.objects.create(kind=kind)
+    if settings.API_JOBS_EAGER:
+        _run_job(job.pk, func, args, kwargs)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_job, job.pk, func, args, kwargs, True))
+    return job
+
+
+def stale_cutoff():
+    """Unfinished jobs created before this time are considered lost."""
+    return timezone.now() - timedelta(seconds=settings.API_JOB_TIMEOUT)
+
+
+def fail_stale_jobs(jobs=None):
+    """
+    Mark ``pending``/``running`` jobs created more than ``API_JOB_TIMEOUT``
+    seconds ago as failed (500). ``jobs`` narrows the check to a queryset;
+    returns the number of jobs failed.
+    """
+    jobs = Job.objects.all() if jobs is None else jobs
+    failed = jobs.filter(status__in=[JobStatus.PENDING, JobStatus.RUNNING], created_at__lt=stale_cutoff()).update(
+        status=JobStatus.FAILED,
+        status_code=500,
+        result={"error": f"Job did not finish within {settings.API_JOB_TIMEOUT} seconds"},
+        finished_at=timezone.now(),
+    )
+    if failed:
+        logger.warning("Marked %d stale job(s) as failed", failed)
+    return failed
+
+
+def _run_job(job_id, func, args, kwargs, in_worker=False):
+    if in_worker:
+        close_old_connections()
+    try:
+        started = Job.objects.filter(pk=job_id, status=JobStatus.PENDING).update(
+            status=JobStatus.RUNNING, started_at=timezone.now()
+        )
+        if not started:  # failed as stale while it waited for a worker
+            return
+        try:
+            body, status_code = func(*args, **kwargs)
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            body, status_code = {"error": f"Unexpected error: {str(e)}"}, 500
+
+        Job.objects.filter(pk=job_id, status=JobStatus.RUNNING).update(
+            status=JobStatus.SUCCEEDED if status_code < 400 else JobStatus.FAILED,
+            status_code=status_code,
+            result=body,
+            finished_at=timezone.now(),
+        )
+    finally:
+        if in_worker:
+            connection.close()
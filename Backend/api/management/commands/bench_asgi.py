@@ -0,0 +1,139 @@
+"""
+Compare the sync (WSGI) and async (ASGI) Gemini endpoints under load.
+
+Both modes run in-process against a slow fake Gemini upstream and a
+scratch database: WSGI through ``httpx.WSGITransport`` on a fixed pool of
+worker threads (like one gunicorn gthread worker), ASGI through
+``httpx.ASGITransport`` on a single event loop. ``--mode both`` runs each
+mode in its own subprocess so their memory numbers do not mix.
+
+    python manage.py bench_asgi --requests 200 --concurrency 200 --latency 1
+"""
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from api.benchmarking import ResourceSampler, fake_gemini, latency_summary, scratch_database
+from api.models import InventoryItem, InventoryList
+
+# Endpoint -> (sync path, async path)
+ENDPOINTS = {
+    "plan-party": ("/api/plan-party/", "/api/async/plan-party/"),
+    "create_plan": ("/api/create_plan/", "/api/async/create_plan/"),
+}
+
+FAKE_RESPONSE = json.dumps({
+    "shopping_list": [{"item": "Milk", "quantity": "1 gallon"}, {"item": "Eggs", "quantity": "dozen"}],
+    "party_shopping_list": ["tortilla chips 3 bags", "salsa 2 jars"],
+    "cheapest_info": {"store": "Walmart", "estimated_total_cost": 18.5},
+})
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrency and memory of the WSGI vs ASGI Gemini endpoints against a fake upstream."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["wsgi", "asgi", "both"], default="both")
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="plan-party")
+        parser.add_argument("--requests", type=int, default=200, help="Total requests to send.")
+        parser.add_argument("--concurrency", type=int, default=200, help="Requests the client keeps in flight.")
+        parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads (the sync in-flight limit).")
+        parser.add_argument("--latency", type=float, default=1.0, help="Fake Gemini response time in seconds.")
+
+    def handle(self, *args, **options):
+        if options["mode"] == "both":
+            results = [self.run_in_subprocess(mode, options) for mode in ("wsgi", "asgi")]
+        else:
+            results = [self.run_mode(options["mode"], options)]
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_in_subprocess(self, mode, options):
+        command = [
+            sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_asgi",
+            "--mode", mode,
+            "--endpoint", options["endpoint"],
+            "--requests", str(options["requests"]),
+            "--concurrency", str(options["concurrency"]),
+            "--threads", str(options["threads"]),
+            "--latency", str(options["latency"]),
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise CommandError(f"{mode} run failed:\n{completed.stderr}")
+        return json.loads(completed.stdout)[0]
+
+    def run_mode(self, mode, options):
+        sync_path, async_path = ENDPOINTS[options["endpoint"]]
+        with scratch_database(), fake_gemini(FAKE_RESPONSE, latency=options["latency"]):
+            payload = self.seed(options["endpoint"])
+            if mode == "wsgi":
+                in_flight = min(options["threads"], options["concurrency"])
+                drive = lambda: self.drive_wsgi(sync_path, payload, options["requests"], in_flight)
+            else:
+                in_flight = options["concurrency"]
+                drive = lambda: asyncio.run(self.drive_asgi(async_path, payload, options["requests"], in_flight))
+
+            with ResourceSampler() as sampler:
+                started = time.perf_counter()
+                latencies, statuses = drive()
+                wall = time.perf_counter() - started
+
+        return {
+            "mode": mode,
+            "endpoint": options["endpoint"],
+            "requests": options["requests"],
+            "in_flight_limit": in_flight,
+            "upstream_latency_s": options["latency"],
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(len(latencies) / wall, 2),
+            "errors": sum(1 for code in statuses if code >= 400),
+            **latency_summary(latencies),
+            **sampler.report(),
+        }
+
+    def seed(self, endpoint):
+        if endpoint == "create_plan":
+            return {"text": "Weekly groceries for two"}
+        inventory_list = InventoryList.objects.create(name="Bench party")
+        inventory_list.inventory_items.set(
+            InventoryItem.objects.create(name=f"Item {index}", quantity=f"{index + 1} ea") for index in range(20)
+        )
+        return {"list_id": inventory_list.id, "party_prompt": "Nachos and dip for 12 guests"}
+
+    def drive_wsgi(self, path, payload, total, threads):
+        app = get_wsgi_application()
+        local = threading.local()
+
+        def one_request(_):
+            if not hasattr(local, "client"):
+                local.client = httpx.Client(transport=httpx.WSGITransport(app=app), base_url="http://localhost")
+            started = time.perf_counter()
+            response = local.client.post(path, json=payload)
+            return time.perf_counter() - started, response.status_code
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(one_request, range(total)))
+        return [latency for latency, _ in results], [code for _, code in results]
+
+    async def drive_asgi(self, path, payload, total, concurrency):
+        app = get_asgi_application()
+        limit = asyncio.Semaphore(concurrency)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost", timeout=None) as client:
+            async def one_request():
+                async with limit:
+                    started = time.perf_counter()
+                    response = await client.post(path, json=payload)
+                    return time.perf_counter() - started, response.status_code
+
+            results = await asyncio.gather(*(one_request() for _ in range(total)))
+        return [latency for latency, _ in results], [code for _, code in results]
@@ -0,0 +1,240 @@
+"""
+Benchmark every API route end to end, as a baseline to compare commits.
+
+Runs against a scratch database seeded with realistic volumes (10k items,
+1k lists, 50k list/item rows by default) and a fake Gemini upstream in a
+child process (``--latency``, 0 by default, so the numbers are Django's
+own). Each scenario sends ``--requests`` requests through the Django test
+client from ``--concurrency`` threads and reports p50/p95/p99 latency,
+SQL queries per request, throughput and peak RSS, as JSON:
+
+    python manage.py bench_endpoints --output bench/$(git rev-parse --short HEAD).json
+    python manage.py bench_endpoints --baseline bench/abc1234.json --only inventory
+
+``--baseline`` adds each scenario's change against an earlier run. The
+``async/*`` routes run here under WSGI; see ``bench_asgi`` for ASGI.
+"""
+import io
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+
+from api.benchmarking import ResourceSampler, current_rss_kb, fake_gemini, latency_summary, scratch_database, seed_database
+from api.enums import JobKind, JobStatus
+from api.models import Job, ShoppingList
+from api.profiling import make_token
+
+FAKE_RESPONSE = json.dumps({
+    "shopping_list": [{"item": "Milk", "quantity": "1 gallon"}, {"item": "Eggs", "quantity": "dozen"}],
+    "party_shopping_list": ["tortilla chips 3 bags", "salsa 2 jars"],
+    "stock_items": [{"name": "Milk", "quantity": "1 gallon"}],
+    "cheapest_info": {"store": "Walmart", "estimated_total_cost": 18.5},
+})
+
+
+def new_client():
+    # Outside the test runner "testserver" is not in ALLOWED_HOSTS
+    return Client(SERVER_NAME="localhost")
+
+
+def photo(index):
+    """A distinct small PNG per call, so stock matching is not answered by photo dedup."""
+    rng = random.Random(index)
+    image = Image.new("RGB", (64, 64))
+    image.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(64 * 64)])
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    buffer.seek(0)
+    buffer.name = f"stock-{index}.png"
+    return buffer
+
+
+class Command(BaseCommand):
+    help = "Benchmark latency, queries, throughput and memory of every API route against seeded data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=1, help="Client threads per scenario.")
+        parser.add_argument("--items", type=int, default=10_000)
+        parser.add_argument("--lists", type=int, default=1_000)
+        parser.add_argument("--links", type=int, default=50_000, help="List/item (M2M) rows.")
+        parser.add_argument("--latency", default="0", help="Fake Gemini latency (seconds or a fake_gemini spec).")
+        parser.add_argument("--only", action="append", default=[], help="Run scenarios whose name contains this.")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        parser.add_argument("--baseline", help="Earlier report to compare against.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as f:
+                    baseline = json.load(f)["scenarios"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        with scratch_database(), fake_gemini(FAKE_RESPONSE, latency=options["latency"]), \
+                tempfile.TemporaryDirectory() as profile_dir, override_settings(PROFILE_DIR=profile_dir):
+            started = time.perf_counter()
+            lists = seed_database(options["items"], options["lists"], options["links"])
+            seed_s = time.perf_counter() - started
+            scenarios = self.scenarios(lists)
+            selected = [s for s in scenarios if not options["only"] or any(part in s[0] for part in options["only"])]
+            if not selected:
+                raise CommandError(f"No scenario matches {options['only']}; have {[s[0] for s in scenarios]}")
+            results = {name: self.run_scenario(send, user, options) for name, send, user in selected}
+
+        if baseline:
+            for name, result in results.items():
+                if name in baseline:
+                    result["vs_baseline"] = self.compare(result, baseline[name])
+
+        report = {"meta": self.meta(options, seed_s), "scenarios": results}
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            self.stderr.write(f"Wrote {len(results)} scenarios to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def scenarios(self, lists):
+        """
+        ``[(name, send(client, index) -> response, user), ...]``, one or
+        more per route; ``user`` (or None) is logged in before timing.
+        """
+        inventory_list = lists[len(lists) // 2]
+        item_id = inventory_list.inventory_items.values_list("id", flat=True).first()
+        item_ids = list(inventory_list.inventory_items.values_list("id", flat=True)[:5])
+        shopping_id = ShoppingList.objects.values_list("id", flat=True).first()
+        job = Job.objects.create(
+            kind=JobKind.CREATE_PLAN, status=JobStatus.SUCCEEDED, status_code=200, result=json.loads(FAKE_RESPONSE),
+        )
+        admin = User.objects.create_superuser("bench-admin", "bench@example.com", "bench")
+        capture = new_client().get(f"/api/inventory-lists/{inventory_list.id}/", HTTP_X_PROFILE=make_token())["X-Profile-Capture"]
+        plan = {"text": "Weekly groceries for two"}
+        party = {"list_id": inventory_list.id, "party_prompt": "Nachos and dip for 12 guests"}
+        typed = ["ch", "chi", "chick", "chicken b", "tom", "tomato sau", "kirk", "basm"]  # autocomplete keystrokes
+        typos = ["chiken", "tomatoe sause", "bannanas", "yoghurt", "potatos"]
+
+        def stock(path):
+            return lambda c, i: c.post(path, {"list_id": inventory_list.id, "image": photo(i)})
+
+        return [
+            ("api-root", lambda c, i: c.get("/api/"), admin),
+            ("inventory-items list", lambda c, i: c.get("/api/inventory-items/"), None),
+            ("inventory-items retrieve", lambda c, i: c.get(f"/api/inventory-items/{item_id}/"), None),
+            ("inventory-items create", lambda c, i: c.post(
+                "/api/inventory-items/", {"name": f"Bench item {i}", "quantity": "2 kg"}, content_type="application/json",
+            ), None),
+            ("inventory-items update", lambda c, i: c.patch(
+                f"/api/inventory-items/{item_id}/", {"quantity": f"{i % 9 + 1} lbs"}, content_type="application/json",
+            ), None),
+            ("inventory-lists list", lambda c, i: c.get("/api/inventory-lists/"), None),
+            ("inventory-lists retrieve", lambda c, i: c.get(f"/api/inventory-lists/{inventory_list.id}/"), None),
+            ("inventory-lists create", lambda c, i: c.post(
+                "/api/inventory-lists/", {"name": f"Bench list {i}", "item_ids": item_ids}, content_type="application/json",
+            ), None),
+            ("shopping-lists list", lambda c, i: c.get("/api/shopping-lists/"), None),
+            ("shopping-lists retrieve", lambda c, i: c.get(f"/api/shopping-lists/{shopping_id}/"), None),
+            ("inventory-lists-all", lambda c, i: c.get("/api/inventory-lists-all/"), None),
+            ("inventory-lists-all summary", lambda c, i: c.get("/api/inventory-lists-all/", {"summary": 1}), None),
+            ("inventory-lists-all page", lambda c, i: c.get("/api/inventory-lists-all/", {"page_size": 50}), None),
+            ("inventory-lists-all list_id", lambda c, i: c.get("/api/inventory-lists-all/", {"list_id": inventory_list.id}), None),
+            ("create_plan", lambda c, i: c.post("/api/create_plan/", plan), None),
+            ("create_plan stream", lambda c, i: c.post("/api/create_plan/stream/", plan), None),
+            ("stock-matching", stock("/api/stock-matching/"), None),
+            ("plan-party", lambda c, i: c.post("/api/plan-party/", party, content_type="application/json"), None),
+            ("jobs", lambda c, i: c.get(f"/api/jobs/{job.id}/"), None),
+            ("profiles list", lambda c, i: c.get("/api/profiles/"), admin),
+            ("profiles download", lambda c, i: c.get(f"/api/profiles/{capture}/"), admin),
+            ("async create_plan", lambda c, i: c.post("/api/async/create_plan/", plan, content_type="application/json"), None),
+            ("async stock-matching", stock("/api/async/stock-matching/"), None),
+            ("async plan-party", lambda c, i: c.post("/api/async/plan-party/", party, content_type="application/json"), None),
+            ("search", lambda c, i: c.get("/api/search/", {"q": typed[i % len(typed)], "fuzzy": 0}), None),
+            ("search fuzzy", lambda c, i: c.get("/api/search/", {"q": typos[i % len(typos)]}), None),
+            ("metrics", lambda c, i: c.get("/metrics"), None),
+        ]
+
+    def run_scenario(self, send, user, options):
+        def client():
+            client = new_client()
+            if user is not None:
+                client.force_login(user)
+            return client
+
+        for index in range(options["warmup"]):
+            self.measure(client(), send, -1 - index)
+
+        def one_request(index):
+            return self.measure(client(), send, index)
+
+        with ResourceSampler() as sampler:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                samples = list(pool.map(one_request, range(options["requests"])))
+            wall = time.perf_counter() - started
+
+        latencies = [latency for latency, _, _ in samples]
+        queries = sorted(count for _, count, _ in samples)
+        return {
+            "requests": len(samples),
+            "errors": sum(1 for _, _, code in samples if code >= 400),
+            "status_codes": sorted({code for _, _, code in samples}),
+            "throughput_rps": round(len(samples) / wall, 2),
+            **latency_summary(latencies),
+            "queries_per_request": round(sum(queries) / len(queries), 2),
+            "queries_max": queries[-1],
+            "rss_peak_kb": sampler.report()["rss_peak_kb"],
+        }
+
+    def measure(self, client, send, index):
+        """``(seconds, queries, status_code)`` for one request, streamed bodies read to the end."""
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = send(client, index)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            seconds = time.perf_counter() - started
+        return seconds, len(queries), response.status_code
+
+    def compare(self, result, before):
+        """Relative change per metric (``+0.25`` = 25% higher than the baseline)."""
+        change = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request", "rss_peak_kb"):
+            if result.get(key) is not None and before.get(key):
+                change[key] = round(result[key] / before[key] - 1, 3)
+        return change
+
+    def meta(self, options, seed_s):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "seed": {"items": options["items"], "lists": options["lists"], "links": options["links"], "seconds": round(seed_s, 2)},
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "upstream_latency": options["latency"],
+            "rss_end_kb": current_rss_kb(),
+        }
@@ -0,0 +1,135 @@
+"""
+Measure concurrent SQLite write throughput with and without the tuning.
+
+Writer threads alternate between a plan save (``persist_plan``: one
+list and a few items in a transaction that reads, then writes) and a
+single item insert, while reader threads keep listing. Every mode runs
+in its own subprocess on a fresh database file:
+
+* ``default``: stock Django settings (rollback journal, deferred transactions)
+* ``tuned``: ``SQLITE_TUNING`` (WAL, pragmas, ``BEGIN IMMEDIATE``)
+* ``queued``: tuned, plus ``SQLITE_WRITE_QUEUE`` batching writes on one thread
+
+    python manage.py bench_sqlite_writes --threads 16 --writes 100 --readers 2
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from api.benchmarking import latency_summary, scratch_database
+from api.models import InventoryItem, InventoryList
+from api.sqlite_tuning import current_pragmas
+from api.views import persist_plan
+from api.write_queue import run_write, write_queue
+
+MODES = {  # mode -> environment for its subprocess
+    "default": {"SQLITE_TUNING": "0", "SQLITE_WRITE_QUEUE": "0"},
+    "tuned": {"SQLITE_TUNING": "1", "SQLITE_WRITE_QUEUE": "0"},
+    "queued": {"SQLITE_TUNING": "1", "SQLITE_WRITE_QUEUE": "1"},
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent SQLite writes: stock settings vs WAL tuning vs the write queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=[*MODES, "all"], default="all")
+        parser.add_argument("--threads", type=int, default=16, help="Writer threads.")
+        parser.add_argument("--writes", type=int, default=100, help="Writes per writer thread.")
+        parser.add_argument("--readers", type=int, default=2, help="Reader threads running meanwhile.")
+
+    def handle(self, *args, **options):
+        if options["mode"] == "all":
+            results = [self.run_in_subprocess(mode, options) for mode in MODES]
+        else:
+            results = [self.run_mode(options["mode"], options)]
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_in_subprocess(self, mode, options):
+        command = [
+            sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_sqlite_writes",
+            "--mode", mode,
+            "--threads", str(options["threads"]),
+            "--writes", str(options["writes"]),
+            "--readers", str(options["readers"]),
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True, env={**os.environ, **MODES[mode]})
+        if completed.returncode != 0:
+            raise CommandError(f"{mode} run failed:\n{completed.stderr}")
+        return json.loads(completed.stdout)[0]
+
+    def run_mode(self, mode, options):
+        with tempfile.TemporaryDirectory() as tmp, scratch_database(Path(tmp) / "bench.sqlite3"):
+            journal_mode = current_pragmas(connection)["journal_mode"] if settings.SQLITE_TUNING else "delete"
+            stop_reading = threading.Event()
+            latencies, errors, reads = [], Counter(), Counter()
+
+            def write(thread_index):
+                try:
+                    for index in range(options["writes"]):
+                        started = time.perf_counter()
+                        try:
+                            if index % 2:
+                                run_write(InventoryItem.objects.create, name=f"Item {thread_index}-{index}", quantity="2 lbs")
+                            else:
+                                run_write(persist_plan, f"Plan {thread_index}-{index}", [
+                                    {"item": "Milk", "quantity": f"{index % 4 + 1} gallon"},
+                                    *({"item": f"Item {thread_index}-{index}-{k}", "quantity": "1 kg"} for k in range(4)),
+                                ])
+                        except OperationalError as e:
+                            errors[str(e)] += 1
+                        else:
+                            latencies.append(time.perf_counter() - started)
+                finally:
+                    connection.close()
+
+            def read():
+                try:
+                    while not stop_reading.is_set():
+                        try:
+                            list(InventoryList.objects.order_by("-id").values("id", "name")[:20])
+                            reads["ok"] += 1
+                        except OperationalError as e:
+                            errors[f"read: {e}"] += 1
+                finally:
+                    connection.close()
+
+            readers = [threading.Thread(target=read) for _ in range(options["readers"])]
+            writers = [threading.Thread(target=write, args=(index,)) for index in range(options["threads"])]
+            for thread in readers:
+                thread.start()
+            started = time.perf_counter()
+            for thread in writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            wall = time.perf_counter() - started
+            stop_reading.set()
+            for thread in readers:
+                thread.join()
+
+        attempted = options["threads"] * options["writes"]
+        return {
+            "mode": mode,
+            "journal_mode": journal_mode,
+            "writer_threads": options["threads"],
+            "reader_threads": options["readers"],
+            "writes_attempted": attempted,
+            "writes_ok": len(latencies),
+            "errors": dict(errors),
+            "wall_s": round(wall, 3),
+            "writes_per_s": round(len(latencies) / wall, 1),
+            "reads_per_s": round(reads["ok"] / wall, 1),
+            **latency_summary(latencies),
+            **({"queue": dict(write_queue.counters)} if settings.SQLITE_WRITE_QUEUE else {}),
+        }
@@ -0,0 +1,74 @@
+"""
+Run the fake Gemini API (``api/fake_gemini.py``) until interrupted, so a
+dev server or load test can run offline:
+
+    python manage.py fake_gemini --port 8765 --latency lognormal:0.8,0.5 \\
+        --rate-limit-rate 0.05 --server-error-rate 0.02 --malformed-rate 0.01 --seed 1
+    GEMINI_API_BASE_URL=http://127.0.0.1:8765/v1beta python manage.py runserver
+
+Record real answers once (calls are forwarded with the caller's API key),
+then replay them offline:
+
+    python manage.py fake_gemini --recordings gemini.json --upstream https://generativelanguage.googleapis.com/v1beta
+    python manage.py fake_gemini --recordings gemini.json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.fake_gemini import FakeGeminiServer, Latency
+
+
+class Command(BaseCommand):
+    help = "Serve a local stand-in for the Gemini API with configurable latency and faults."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--text", default='{"shopping_list": []}', help="Default response text.")
+        parser.add_argument("--responses", help="JSON file mapping prompt substrings to response texts.")
+        parser.add_argument("--latency", default="0", help='Seconds, or "uniform:LOW,HIGH", "lognormal:MEDIAN,SIGMA", "exponential:MEAN".')
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered 429.")
+        parser.add_argument("--server-error-rate", type=float, default=0.0, help="Share of calls answered 503.")
+        parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of calls with truncated JSON text.")
+        parser.add_argument("--seed", type=int, help="Seed for latency and fault draws.")
+        parser.add_argument("--chunks", type=int, default=4, help="SSE events per streamed response.")
+        parser.add_argument("--chunk-delay", type=float, default=0.05)
+        parser.add_argument("--recordings", help="JSON file of recorded responses to replay (and extend with --upstream).")
+        parser.add_argument("--upstream", help="Real Gemini base URL to forward and record unrecorded calls to.")
+
+    def handle(self, *args, **options):
+        if options["upstream"] and not options["recordings"]:
+            raise CommandError("--upstream needs --recordings to record into.")
+        try:
+            latency = Latency.parse(options["latency"])
+            responses = None
+            if options["responses"]:
+                with open(options["responses"], encoding="utf-8") as f:
+                    responses = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        server = FakeGeminiServer(
+            options["text"],
+            latency=latency,
+            chunks=options["chunks"],
+            chunk_delay=options["chunk_delay"],
+            host=options["host"],
+            port=options["port"],
+            responses=responses,
+            rate_limit_rate=options["rate_limit_rate"],
+            server_error_rate=options["server_error_rate"],
+            malformed_rate=options["malformed_rate"],
+            seed=options["seed"],
+            recordings=options["recordings"],
+            upstream=options["upstream"],
+        )
+        self.stdout.write(f"Fake Gemini on {server.url} (latency {latency}); set GEMINI_API_BASE_URL={server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.stdout.write(json.dumps(dict(server.served), sort_keys=True))
@@ -0,0 +1,20 @@
+"""
+Print a token that makes one API request run under the profiler:
+
+    python manage.py profile_token
+    curl -H "X-Profile: <token>" http://localhost:8000/api/stock-matching/ ...
+
+The capture is listed at /api/profiles/ (admin only).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed token for the X-Profile header / ?profile= flag."
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
+        self.stderr.write(f"Valid for {settings.PROFILE_TOKEN_MAX_AGE} seconds.")
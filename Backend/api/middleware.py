@@ -0,0 +1,97 @@
+# api/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import profiling, telemetry
+
+
+class TimingMiddleware:
+    """
+    Times every request by phase (see ``api/telemetry.py``), adds a
+    ``Server-Timing`` header and records the request histograms.
+    Streaming responses get no header: it is sent before the body is
+    generated, so it would leave out most of the work. Their histograms
+    cover the time to the response headers.
+    Works under both WSGI and ASGI; keep it first in ``MIDDLEWARE`` so
+    the total covers the rest of the stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings, token = telemetry.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            telemetry.end_request(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = telemetry.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            telemetry.end_request(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        """Time DRF's rendering of ``Response`` data (runs just before ``render()``)."""
+        timings = telemetry.current_timings()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.add("render", time.perf_counter() - started)
+            )
+        return response
+
+    def finish(self, request, response, timings):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unmatched>"
+        if not response.streaming:
+            response["Server-Timing"] = timings.server_timing()
+        telemetry.observe_request(view, request.method, response.status_code, timings)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Runs requests that carry a valid profiling token under cProfile and
+    names the capture in an ``X-Profile-Capture`` header (see
+    ``api/profiling.py``). Under ASGI only the event-loop thread is
+    profiled, including whatever else it runs meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not profiling.should_profile(request):
+            return self.get_response(request)
+        with profiling.Capture(request) as capture:
+            response = self.get_response(request)
+        response["X-Profile-Capture"] = capture.name
+        return response
+
+    async def __acall__(self, request):
+        if not profiling.should_profile(request):
+            return await self.get_response(request)
+        with profiling.Capture(request) as capture:
+            response = await self.get_response(request)
+        response["X-Profile-Capture"] = capture.name
+        return response
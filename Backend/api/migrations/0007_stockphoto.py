@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dhash', models.BigIntegerField()),
+                ('items_digest', models.CharField(max_length=64)),
+                ('restock_list', models.JSONField(default=list)),
+                ('cheapest_info', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('inventory_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_photos', to='api.inventorylist')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['inventory_list', 'created_at'], name='api_stockph_invento_b0f34a_idx')],
+            },
+        ),
+    ]
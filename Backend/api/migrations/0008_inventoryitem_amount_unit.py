@@ -0,0 +1,109 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:06
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of api.Services.units.parse_quantity as of this migration, so
+# replaying it gives the same backfill whatever later happens to that module.
+UNIT_ALIASES = {
+    "g": ("g", 1), "gm": ("g", 1), "gms": ("g", 1), "gram": ("g", 1), "grams": ("g", 1),
+    "kg": ("kg", 1), "kgs": ("kg", 1), "kilo": ("kg", 1), "kilos": ("kg", 1),
+    "kilogram": ("kg", 1), "kilograms": ("kg", 1),
+    "oz": ("oz", 1), "ounce": ("oz", 1), "ounces": ("oz", 1),
+    "lb": ("lb", 1), "lbs": ("lb", 1), "pound": ("lb", 1), "pounds": ("lb", 1),
+    "ml": ("ml", 1), "milliliter": ("ml", 1), "milliliters": ("ml", 1),
+    "millilitre": ("ml", 1), "millilitres": ("ml", 1),
+    "l": ("l", 1), "ltr": ("l", 1), "liter": ("l", 1), "liters": ("l", 1),
+    "litre": ("l", 1), "litres": ("l", 1),
+    "gal": ("l", 3.785411784), "gallon": ("l", 3.785411784), "gallons": ("l", 3.785411784),
+    "galon": ("l", 3.785411784), "galons": ("l", 3.785411784),
+    "cup": ("cup", 1), "cups": ("cup", 1),
+    "tbsp": ("tbsp", 1), "tablespoon": ("tbsp", 1), "tablespoons": ("tbsp", 1),
+    "tsp": ("tsp", 1), "teaspoon": ("tsp", 1), "teaspoons": ("tsp", 1),
+    "ea": ("ea", 1), "each": ("ea", 1), "x": ("ea", 1),
+    "dozen": ("ea", 12), "dozens": ("ea", 12),
+}
+COUNT_WORDS = {
+    "bag", "bags", "bottle", "bottles", "box", "boxes", "bowl", "bowls", "bunch", "bunches",
+    "can", "cans", "carton", "cartons", "container", "containers", "jar", "jars", "loaf",
+    "loaves", "pack", "packs", "packet", "packets", "piece", "pieces", "pc", "pcs",
+    "stick", "sticks", "tin", "tins", "tub", "tubs", "unit", "units",
+}
+_NUMBER = r"(?:\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|\.\d+)"
+_QUANTITY_RE = re.compile(rf"^\s*(?P<amount>{_NUMBER})\s*(?P<unit>[a-zA-Z]+\.?)?\b")
+
+
+def _parse_number(text):
+    text = text.strip()
+    if " " in text:
+        whole, fraction = text.split(None, 1)
+        return float(whole) + _parse_number(fraction)
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator)
+    return float(text)
+
+
+def _lookup_unit(word):
+    if not word:
+        return "ea", 1
+    word = word.lower().rstrip(".")
+    if word in UNIT_ALIASES:
+        return UNIT_ALIASES[word]
+    if word in COUNT_WORDS:
+        return "ea", 1
+    return None
+
+
+def parse_quantity(text):
+    """``(amount, unit)`` for "5L", "2 lbs", "1 1/2 cups", "dozen" or "3 cans"; None without a quantity."""
+    if text is None:
+        return None
+    text = str(text).strip()
+    if not text:
+        return None
+    match = _QUANTITY_RE.match(text)
+    if match:
+        unit, multiplier = _lookup_unit(match.group("unit")) or ("ea", 1)
+        return _parse_number(match.group("amount")) * multiplier, unit
+    if text.split()[0].lower() in ("dozen", "dozens"):
+        return 12.0, "ea"
+    return None
+
+
+def backfill_amount_unit(apps, schema_editor):
+    InventoryItem = apps.get_model('api', 'InventoryItem')
+    batch = []
+    for item in InventoryItem.objects.exclude(quantity=None).only('id', 'quantity').iterator(chunk_size=1000):
+        parsed = parse_quantity(item.quantity)
+        if parsed is None:
+            continue
+        item.amount, item.unit = parsed
+        batch.append(item)
+        if len(batch) >= 1000:
+            InventoryItem.objects.bulk_update(batch, ['amount', 'unit'])
+            batch = []
+    if batch:
+        InventoryItem.objects.bulk_update(batch, ['amount', 'unit'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_stockphoto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='amount',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='unit',
+            field=models.CharField(blank=True, choices=[('ea', 'each'), ('g', 'gram'), ('kg', 'kilogram'), ('ml', 'milliliter'), ('l', 'liter'), ('oz', 'ounce'), ('lb', 'pound'), ('cup', 'cup'), ('tbsp', 'tablespoon'), ('tsp', 'teaspoon')], max_length=8, null=True),
+        ),
+        migrations.RunPython(backfill_amount_unit, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_inventoryitem_amount_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('store', models.CharField(max_length=50)),
+                ('item_key', models.CharField(max_length=200)),
+                ('item', models.CharField(max_length=200)),
+                ('price', models.FloatField()),
+                ('observed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_key', 'store', 'observed_at'], name='api_priceob_item_ke_ce8cbc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+def fold_name(name):
+    """Frozen copy of api.Services.units.fold_name as of this migration."""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Fold items whose names differ only in case or spacing into the oldest
+    one, which takes the first non-empty quantity/brand of the group.
+    Memberships of the merged items are moved to it, and every item gets
+    its `normalized_name`.
+    """
+    InventoryItem = apps.get_model('api', 'InventoryItem')
+    InventoryList = apps.get_model('api', 'InventoryList')
+    Membership = InventoryList.inventory_items.through
+
+    groups = {}
+    for item in InventoryItem.objects.order_by('id').iterator(chunk_size=1000):
+        item.normalized_name = fold_name(item.name)
+        groups.setdefault(item.normalized_name, []).append(item)
+
+    survivors, duplicate_ids = [], {}
+    for items in groups.values():
+        keeper = items[0]
+        for duplicate in items[1:]:
+            keeper.quantity = keeper.quantity or duplicate.quantity
+            keeper.brand = keeper.brand or duplicate.brand
+            if keeper.amount is None and keeper.quantity == duplicate.quantity:
+                keeper.amount, keeper.unit = duplicate.amount, duplicate.unit
+            duplicate_ids[duplicate.id] = keeper.id
+        survivors.append(keeper)
+
+    if duplicate_ids:
+        moved = [
+            Membership(inventorylist_id=list_id, inventoryitem_id=duplicate_ids[item_id])
+            for list_id, item_id in Membership.objects.filter(
+                inventoryitem_id__in=duplicate_ids
+            ).values_list('inventorylist_id', 'inventoryitem_id').iterator(chunk_size=1000)
+        ]
+        Membership.objects.bulk_create(moved, batch_size=1000, ignore_conflicts=True)
+        ids = list(duplicate_ids)
+        for start in range(0, len(ids), 500):
+            InventoryItem.objects.filter(id__in=ids[start:start + 500]).delete()  # and their memberships
+
+    InventoryItem.objects.bulk_update(
+        survivors, ['normalized_name', 'quantity', 'brand', 'amount', 'unit'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_priceobservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='inventoryitem',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='inventorylist',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# Frozen copy of the FTS5 indexes and sync triggers that api/search.py
+# queries, as of this migration (api.search.install_search builds the same
+# statements; a later migration that needs them again should copy them too).
+INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_item_search USING fts5("
+    "name, brand, content='api_inventoryitem', content_rowid='id', tokenize='trigram')",
+    "DROP TRIGGER IF EXISTS api_item_search_ai",
+    "DROP TRIGGER IF EXISTS api_item_search_ad",
+    "DROP TRIGGER IF EXISTS api_item_search_au",
+    "CREATE TRIGGER api_item_search_ai AFTER INSERT ON api_inventoryitem BEGIN "
+    "INSERT INTO api_item_search(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "CREATE TRIGGER api_item_search_ad AFTER DELETE ON api_inventoryitem BEGIN "
+    "INSERT INTO api_item_search(api_item_search, rowid, name, brand) VALUES ('delete', old.id, old.name, old.brand); END",
+    "CREATE TRIGGER api_item_search_au AFTER UPDATE OF name, brand ON api_inventoryitem BEGIN "
+    "INSERT INTO api_item_search(api_item_search, rowid, name, brand) VALUES ('delete', old.id, old.name, old.brand); "
+    "INSERT INTO api_item_search(rowid, name, brand) VALUES (new.id, new.name, new.brand); END",
+    "INSERT INTO api_item_search(api_item_search) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_shopping_search USING fts5("
+    "item_name, content='api_shoppinglist', content_rowid='id', tokenize='trigram')",
+    "DROP TRIGGER IF EXISTS api_shopping_search_ai",
+    "DROP TRIGGER IF EXISTS api_shopping_search_ad",
+    "DROP TRIGGER IF EXISTS api_shopping_search_au",
+    "CREATE TRIGGER api_shopping_search_ai AFTER INSERT ON api_shoppinglist BEGIN "
+    "INSERT INTO api_shopping_search(rowid, item_name) VALUES (new.id, new.item_name); END",
+    "CREATE TRIGGER api_shopping_search_ad AFTER DELETE ON api_shoppinglist BEGIN "
+    "INSERT INTO api_shopping_search(api_shopping_search, rowid, item_name) VALUES ('delete', old.id, old.item_name); END",
+    "CREATE TRIGGER api_shopping_search_au AFTER UPDATE OF item_name ON api_shoppinglist BEGIN "
+    "INSERT INTO api_shopping_search(api_shopping_search, rowid, item_name) VALUES ('delete', old.id, old.item_name); "
+    "INSERT INTO api_shopping_search(rowid, item_name) VALUES (new.id, new.item_name); END",
+    "INSERT INTO api_shopping_search(api_shopping_search) VALUES ('rebuild')",
+]
+UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {fts}_{suffix}"
+    for fts in ("api_item_search", "api_shopping_search") for suffix in ("ai", "ad", "au")
+] + ["DROP TABLE IF EXISTS api_item_search", "DROP TABLE IF EXISTS api_shopping_search"]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_inventoryitem_normalized_name_and_more'),
+    ]
+
+    operations = [
+        # FTS5 trigram indexes + sync triggers (api/search.py); SQLite only
+        migrations.RunPython(run_on_sqlite(INSTALL), run_on_sqlite(UNINSTALL)),
+    ]
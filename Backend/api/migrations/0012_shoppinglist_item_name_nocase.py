@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# Case-insensitive prefix search on shopping lists (api/search.py): SQLite
+# runs ``item_name LIKE 'q%'`` as a range scan only on a NOCASE index.
+# SQLite only, like the FTS tables in 0011.
+INSTALL = ['CREATE INDEX IF NOT EXISTS api_shopping_item_nocase ON api_shoppinglist ("item_name" COLLATE NOCASE)']
+UNINSTALL = ["DROP INDEX IF EXISTS api_shopping_item_nocase"]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_item_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(INSTALL), run_on_sqlite(UNINSTALL)),
+    ]
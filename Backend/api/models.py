@@ -1,21 +1,55 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+
+from .enums import JobKind, JobStatus, Unit
+from .Services.units import fold_name, parse_quantity
 
 # Table 1: Inventory Items
 class InventoryItem(models.Model):
     name = models.CharField(max_length=100, default="Untitled Item")
+    # fold_name(name), kept on every write; one item per name regardless of case and spacing
+    normalized_name = models.CharField(max_length=100, unique=True, editable=False)
     quantity = models.CharField(max_length=100, blank=True, null=True)
     brand = models.CharField(max_length=100, blank=True, null=True)
+    # Parsed from `quantity` on every write; null when it holds no amount
+    amount = models.FloatField(blank=True, null=True)
+    unit = models.CharField(max_length=8, choices=Unit.choices, blank=True, null=True)
 
     def __str__(self):
         return f"{self.name} ({self.quantity})"
 
+    def parse_quantity(self):
+        """Fill `amount`/`unit` from the free-text `quantity`."""
+        parsed = parse_quantity(self.quantity)
+        self.amount, self.unit = (parsed.amount, parsed.unit) if parsed else (None, None)
+
+    def normalize_name(self):
+        """Fill `normalized_name` from `name`."""
+        self.normalized_name = fold_name(self.name)
+
+    def save(self, *args, **kwargs):
+        self.normalize_name()
+        self.parse_quantity()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "name" in update_fields:
+                update_fields.add("normalized_name")
+            if "quantity" in update_fields:
+                update_fields |= {"amount", "unit"}
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
 
 # Table 2: Inventory List (for meal or purpose)
 class InventoryList(models.Model):
     name = models.CharField(max_length=100)
     purpose = models.CharField(max_length=200, blank=True, null=True)
     inventory_items = models.ManyToManyField(InventoryItem, related_name='inventory_lists')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # newest-first listing and cursor pages
 
     def __str__(self):
         return f"{self.name}"
@@ -26,7 +60,53 @@ class ShoppingList(models.Model):
     item_name = models.CharField(max_length=100)
     brand = models.CharField(max_length=100, blank=True, null=True)
     quantity_needed = models.FloatField(default=1)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"{self.item_name} ({self.quantity_needed})"
+
+
+# Table 4: Background jobs for long-running Gemini calls (async mode)
+class Job(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32, choices=JobKind.choices)
+    status = models.CharField(max_length=16, choices=JobStatus.choices, default=JobStatus.PENDING)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+# Table 5: Perceptual hashes of stock photos, for reusing near-duplicate matches
+class StockPhoto(models.Model):
+    inventory_list = models.ForeignKey(InventoryList, on_delete=models.CASCADE, related_name='stock_photos')
+    dhash = models.BigIntegerField()
+    items_digest = models.CharField(max_length=64)
+    restock_list = models.JSONField(default=list)
+    cheapest_info = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['inventory_list', 'created_at'])]
+
+    def __str__(self):
+        return f"Photo {self.id} for list {self.inventory_list_id}"
+
+
+# Table 6: Store prices seen by the price lookup, reused until they go stale
+class PriceObservation(models.Model):
+    store = models.CharField(max_length=50)
+    item_key = models.CharField(max_length=200)  # normalized item text, quantity included
+    item = models.CharField(max_length=200)
+    price = models.FloatField()
+    observed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['item_key', 'store', 'observed_at'])]
+
+    def __str__(self):
+        return f"{self.item} @ {self.store}: {self.price}"
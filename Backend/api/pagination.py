@@ -0,0 +1,18 @@
+# api/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Newest-first cursor pagination. ``id`` breaks ties between rows
+    created in the same instant so pages never overlap or skip rows.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    # InventoryItem has no created_at; ids are monotonic so they order the same way
+    ordering = ('-id',)
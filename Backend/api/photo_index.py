@@ -0,0 +1,145 @@
+# api/photo_index.py
+"""
+Per-list index of recent stock photo hashes.
+
+Each list gets an in-process BK-tree that is filled incrementally from the
+``StockPhoto`` table (only rows newer than the last one seen are loaded),
+so rows written by other workers are picked up with one cheap query.
+Each index has its own lock, so one list's rebuild does not hold up
+lookups for other lists. Recording a photo deletes the list's rows that
+have aged out of the dedup window, which keeps the table and rebuilds
+bounded. Indexes themselves are dropped once unused for a whole window
+(everything in them has expired by then), when more than
+``STOCK_PHOTO_INDEX_MAX_LISTS`` lists are indexed (least recently used
+first), and when their list is deleted.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import StockPhoto
+from .Services.phash import BKTree, dhash, hamming, to_signed, to_unsigned
+
+
+def items_digest(items_data):
+    """Fingerprint of the list contents; a reused result must match it."""
+    canonical = json.dumps(
+        sorted((item.get("name", ""), item.get("quantity") or "") for item in items_data)
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def hash_upload(image_file):
+    """dHash of an uploaded photo; rewinds the file for the next reader."""
+    image_file.seek(0)
+    value = dhash(image_file.read())
+    image_file.seek(0)
+    return value
+
+
+class _ListIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tree = BKTree()
+        self.last_id = 0
+        self.built_at = None
+        self.used_at = time.monotonic()
+
+
+_indexes = OrderedDict()  # list id -> _ListIndex, least recently used first
+_lock = threading.Lock()  # guards _indexes only; each index's own lock guards its tree
+
+
+def clear_index():
+    """Drop every in-process index; they are rebuilt from the table on demand."""
+    with _lock:
+        _indexes.clear()
+
+
+def forget_list(sender, instance, **kwargs):
+    """``post_delete`` receiver for ``InventoryList`` (see ``ApiConfig.ready``)."""
+    with _lock:
+        _indexes.pop(instance.pk, None)
+
+
+def _window():
+    return timedelta(seconds=settings.STOCK_PHOTO_DEDUP_WINDOW)
+
+
+def _index_for(list_id):
+    """
+    Return the list's index, loading rows added since the last call.
+    The tree is rebuilt once per window so expired hashes do not pile up,
+    and other lists' idle indexes are evicted.
+    """
+    now = time.monotonic()
+    with _lock:
+        index = _indexes.get(list_id)
+        if index is None:
+            index = _indexes[list_id] = _ListIndex()
+        index.used_at = now
+        _indexes.move_to_end(list_id)
+        # Evict from the least recently used end: over the cap, or idle a whole window
+        while len(_indexes) > 1:
+            oldest = next(iter(_indexes.values()))
+            idle = now - oldest.used_at > settings.STOCK_PHOTO_DEDUP_WINDOW
+            if len(_indexes) <= settings.STOCK_PHOTO_INDEX_MAX_LISTS and not idle:
+                break
+            _indexes.popitem(last=False)
+
+    with index.lock:
+        if index.built_at is None or time.monotonic() - index.built_at > settings.STOCK_PHOTO_DEDUP_WINDOW:
+            index.tree, index.last_id, index.built_at = BKTree(), 0, time.monotonic()
+            rows = StockPhoto.objects.filter(inventory_list_id=list_id, created_at__gte=timezone.now() - _window())
+        else:
+            rows = StockPhoto.objects.filter(inventory_list_id=list_id, id__gt=index.last_id)
+
+        for row_id, value, created_at in rows.order_by("id").values_list("id", "dhash", "created_at"):
+            index.tree.add(to_unsigned(value), (row_id, created_at))
+            index.last_id = row_id
+        return index
+
+
+def find_recent_match(list_id, photo_hash, digest):
+    """
+    Return the most similar ``StockPhoto`` for ``list_id`` taken within
+    the dedup window whose list contents match ``digest``, or None.
+    """
+    index = _index_for(list_id)
+    with index.lock:
+        matches = index.tree.search(photo_hash, settings.STOCK_PHOTO_DEDUP_DISTANCE)
+    cutoff = timezone.now() - _window()
+    candidate_ids = [row_id for _, (row_id, created_at) in matches if created_at >= cutoff]
+    if not candidate_ids:
+        return None
+
+    photos = StockPhoto.objects.in_bulk(candidate_ids)
+    for row_id in candidate_ids:
+        photo = photos.get(row_id)
+        # Re-check against the stored row in case the index holds a stale entry
+        if (
+            photo is not None
+            and photo.inventory_list_id == list_id
+            and photo.items_digest == digest
+            and hamming(to_unsigned(photo.dhash), photo_hash) <= settings.STOCK_PHOTO_DEDUP_DISTANCE
+        ):
+            return photo
+    return None
+
+
+def record_photo(list_id, photo_hash, digest, restock_list, cheapest_info):
+    """Store a matched photo and drop the list's photos that have left the dedup window."""
+    StockPhoto.objects.filter(inventory_list_id=list_id, created_at__lt=timezone.now() - _window()).delete()
+    return StockPhoto.objects.create(
+        inventory_list_id=list_id,
+        dhash=to_signed(photo_hash),
+        items_digest=digest,
+        restock_list=restock_list,
+        cheapest_info=cheapest_info,
+    )
@@ -0,0 +1,189 @@
+# api/price_catalog.py
+"""
+Store price catalog.
+
+Prices found by the Gemini search step (``Services/bestBuy.py``) are kept
+as ``PriceObservation`` rows and reused until ``PRICE_CATALOG_TTL``
+passes. Basket totals and the cheapest store are computed locally as an
+item x store matrix product, so only items without a fresh price for
+every store have to go back to the LLM.
+
+Gemini does not always echo item names verbatim ("basmati rice 5 kg" for
+"basmati rice 5kg"), so estimates are stored under the name that was
+asked for. An echoed name matches a requested one when it is equal after
+normalizing, equal once spacing and punctuation are dropped, or close
+(``difflib``, ratio >= ``MATCH_CUTOFF``).
+"""
+import difflib
+import re
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PriceObservation
+from .Services.units import normalize_name
+
+STORES = ("Walmart", "Food Lion", "Harris Teeter")
+MATCH_CUTOFF = 0.8
+
+_NOT_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def item_key(item):
+    return normalize_name(item)[:200]
+
+
+def _compact(item):
+    return _NOT_ALNUM_RE.sub("", item_key(item))
+
+
+def match_requested(names, requested):
+    """
+    ``{echoed name: requested item}`` for the ``names`` Gemini returned;
+    names that match no requested item (or one already taken) are left out.
+    """
+    unclaimed = {}
+    for item in requested:
+        unclaimed.setdefault(_compact(item), item)
+    matches = {}
+    for name in names:
+        compact = _compact(name)
+        if compact not in unclaimed:
+            close = difflib.get_close_matches(compact, list(unclaimed), n=1, cutoff=MATCH_CUTOFF)
+            if not close:
+                continue
+            compact = close[0]
+        matches[name] = unclaimed.pop(compact)
+    return matches
+
+
+def _cutoff(ttl=None):
+    ttl = settings.PRICE_CATALOG_TTL if ttl is None else ttl
+    return timezone.now() - timedelta(seconds=ttl)
+
+
+def record_estimates(price_estimates, stores=STORES, observed_at=None, requested=None):
+    """
+    Store the ``price_estimates`` rows of a bestBuy response
+    (``{"item": ..., "prices": {store: price}}``). Missing, zero and
+    non-numeric prices are skipped so they are looked up again next time.
+    With ``requested`` (the items that were asked about), each row is
+    stored under the requested item it matches (see ``match_requested``).
+    Returns the number of observations written.
+    """
+    observed_at = observed_at or timezone.now()
+    estimates = [
+        (str(estimate.get("item") or "").strip(), estimate.get("prices"))
+        for estimate in price_estimates if isinstance(estimate, dict)
+    ]
+    matches = match_requested([item for item, _ in estimates if item], requested) if requested else {}
+    rows = []
+    for item, prices in estimates:
+        item = matches.get(item, item)
+        if not item or not isinstance(prices, dict):
+            continue
+        for store in stores:
+            price = prices.get(store)
+            if isinstance(price, bool) or not isinstance(price, (int, float)) or not price > 0:
+                continue
+            rows.append(PriceObservation(
+                store=store, item_key=item_key(item), item=item[:200], price=float(price), observed_at=observed_at,
+            ))
+    PriceObservation.objects.bulk_create(rows)
+    return len(rows)
+
+
+def price_matrix(items, stores=STORES, ttl=None):
+    """
+    Latest fresh price per (item, store) as an ``len(items) x len(stores)``
+    array, NaN where the catalog has no fresh price. One query.
+    """
+    keys = [item_key(item) for item in items]
+    rows = {key: index for index, key in enumerate(keys)}
+    columns = {store: index for index, store in enumerate(stores)}
+    matrix = np.full((len(keys), len(stores)), np.nan)
+    if not keys:
+        return matrix
+
+    observations = (
+        PriceObservation.objects
+        .filter(item_key__in=set(keys), store__in=stores, observed_at__gte=_cutoff(ttl))
+        .order_by("observed_at", "id")
+        .values_list("item_key", "store", "price")
+    )
+    # Oldest first, so later observations overwrite earlier ones
+    for key, store, price in observations:
+        matrix[rows[key], columns[store]] = price
+    # Duplicate items in the list share one catalog row
+    for index, key in enumerate(keys):
+        if index != rows[key]:
+            matrix[index] = matrix[rows[key]]
+    return matrix
+
+
+def stale_items(items, stores=STORES, ttl=None):
+    """Items lacking a fresh price for at least one store: the ones to ask the LLM about."""
+    matrix = price_matrix(items, stores, ttl)
+    return [item for item, row in zip(items, np.isnan(matrix).any(axis=1)) if row]
+
+
+def basket_totals(matrix, stores=STORES, quantities=None):
+    """
+    Per-store basket cost as ``quantities @ matrix``. Item strings carry
+    their own quantity ("milk 1 gallon"), so each row counts once unless
+    ``quantities`` says otherwise. Returns ``(totals, missing)`` dicts;
+    ``missing`` counts the items a store has no price for.
+    """
+    quantities = np.ones(len(matrix)) if quantities is None else np.asarray(quantities, dtype=float)
+    known = ~np.isnan(matrix)
+    totals = quantities @ np.where(known, matrix, 0.0)
+    missing = (~known).sum(axis=0)
+    return (
+        {store: round(float(total), 2) for store, total in zip(stores, totals)},
+        {store: int(count) for store, count in zip(stores, missing)},
+    )
+
+
+def cheapest_store(totals, missing):
+    """
+    The store with the lowest total among those pricing the most items,
+    so a store is never "cheapest" just because prices are missing.
+    """
+    if not totals:
+        return {"store": None, "estimated_total_cost": 0.0}
+    store = min(totals, key=lambda name: (missing[name], totals[name]))
+    return {"store": store, "estimated_total_cost": totals[store]}
+
+
+def restock_estimate(items, stores=STORES, ttl=None):
+    """
+    ``cheapest_info`` for buying ``items``, from catalog prices alone (no
+    LLM call); ``store`` is "Unknown" when the catalog prices none of them.
+    """
+    matrix = price_matrix(items, stores, ttl)
+    if np.isnan(matrix).all():
+        return {"store": "Unknown", "estimated_total_cost": 0.0}
+    return cheapest_store(*basket_totals(matrix, stores))
+
+
+def basket_summary(items, stores=STORES, ttl=None):
+    """
+    ``price_estimates``, per-store totals and ``cheapest_store_recommendation``
+    for ``items`` from the catalog alone, shaped like the bestBuy output.
+    """
+    matrix = price_matrix(items, stores, ttl)
+    totals, missing = basket_totals(matrix, stores)
+    return {
+        "price_estimates": [
+            {
+                "item": item,
+                "prices": {store: (None if np.isnan(price) else float(price)) for store, price in zip(stores, row)},
+            }
+            for item, row in zip(items, matrix)
+        ],
+        "store_totals": totals,
+        "missing_prices": missing,
+        "cheapest_store_recommendation": cheapest_store(totals, missing),
+    }
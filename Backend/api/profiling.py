@@ -0,0 +1,121 @@
+# api/profiling.py
+"""
+Opt-in cProfile capture of single requests.
+
+A request to ``/api/...`` carrying a valid signed token, in either the
+``X-Profile`` header or the ``?profile=`` query parameter, runs under
+cProfile (see ``ProfilingMiddleware``). Its stats are written as a
+``.prof`` file (``python -m pstats`` / ``snakeviz`` format) to
+``PROFILE_DIR``, which keeps the newest ``PROFILE_KEEP`` captures.
+
+Tokens come from ``python manage.py profile_token`` and expire after
+``PROFILE_TOKEN_MAX_AGE`` seconds. Requests without the flag pay only
+one header lookup and one substring test.
+"""
+import cProfile
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = "HTTP_X_PROFILE"
+QUERY_PARAM = "profile"
+
+_SALT = "api.profiling"
+_VALUE = "profile"
+_SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+_NAME_RE = re.compile(r"^[A-Za-z0-9._-]+\.prof$")
+
+
+def make_token():
+    return signing.TimestampSigner(salt=_SALT).sign(_VALUE)
+
+
+def token_is_valid(token):
+    try:
+        return signing.TimestampSigner(salt=_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE) == _VALUE
+    except signing.BadSignature:  # includes SignatureExpired
+        return False
+
+
+def requested_token(request):
+    """The profiling token sent with ``request``, or None (cheap when absent)."""
+    token = request.META.get(HEADER)
+    if token:
+        return token
+    if f"{QUERY_PARAM}=" in request.META.get("QUERY_STRING", ""):
+        return request.GET.get(QUERY_PARAM)
+    return None
+
+
+def should_profile(request):
+    if not request.path.startswith("/api/"):
+        return False
+    token = requested_token(request)
+    return token is not None and token_is_valid(token)
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def capture_name(request, seconds):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    slug = _SLUG_RE.sub("-", request.path).strip("-")[:60] or "root"
+    return f"{stamp}-{request.method}-{slug}-{seconds * 1000:.0f}ms.prof"
+
+
+def save_capture(profiler, request, seconds):
+    """Dump ``profiler`` for ``request`` and prune old captures; returns the file name."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = capture_name(request, seconds)
+    profiler.dump_stats(directory / name)
+    for old in list_captures()[settings.PROFILE_KEEP:]:
+        (directory / old["name"]).unlink(missing_ok=True)
+    return name
+
+
+def list_captures():
+    """Captures on disk, newest first."""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    captures = []
+    for path in directory.glob("*.prof"):
+        stat = path.stat()
+        captures.append({
+            "name": path.name,
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        })
+    return sorted(captures, key=lambda capture: capture["name"], reverse=True)
+
+
+def capture_path(name):
+    """Path of capture ``name``, or None if it is not a capture file."""
+    if not _NAME_RE.match(name):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
+
+
+class Capture:
+    """``with Capture(request) as capture: ...``; ``capture.name`` is set on exit."""
+
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.name = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.name = save_capture(self.profiler, self.request, time.perf_counter() - self.started)
@@ -0,0 +1,44 @@
+# api/renderers.py
+"""
+Renderers for streamed responses. Views stream ``(event, data)`` pairs
+through ``render_event``; ``render`` covers ordinary ``Response`` objects
+(e.g. validation errors) so they arrive in the same format.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+
+class StreamRenderer(BaseRenderer):
+    charset = "utf-8"
+
+    def render_event(self, event, data):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        event = "error" if response is not None and response.status_code >= 400 else "message"
+        return self.render_event(event, data)
+
+
+class EventStreamRenderer(StreamRenderer):
+    """Server-Sent Events: ``event: <name>`` and one ``data:`` line per event."""
+    media_type = "text/event-stream"
+    format = "sse"
+
+    def render_event(self, event, data):
+        return f"event: {event}\ndata: {_dumps(data)}\n\n".encode(self.charset)
+
+
+class NDJSONRenderer(StreamRenderer):
+    """Newline-delimited JSON: one ``{"event": ..., "data": ...}`` object per line."""
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render_event(self, event, data):
+        return (_dumps({"event": event, "data": data}) + "\n").encode(self.charset)
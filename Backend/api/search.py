@@ -0,0 +1,182 @@
+# api/search.py
+"""
+Item search for autocomplete.
+
+Inventory items (``name``, ``brand``) and shopping list rows
+(``item_name``) are indexed in SQLite FTS5 tables with the ``trigram``
+tokenizer. Every three-letter run is a token, so a quoted term matches
+anywhere inside a word: prefixes, infixes, any case. The tables are
+external-content indexes over the model tables, and triggers keep them
+in step. That also covers ``bulk_create``/``bulk_update`` and the plan
+upsert, which never send model signals.
+
+Each step below only runs while there is room under ``limit``:
+
+1. Prefix: names starting with the query, alphabetically (a range scan
+   on the ``normalized_name`` index for items, on the ``COLLATE NOCASE``
+   ``item_name`` index for shopping lists).
+2. Substring: every term of 3+ characters must appear. Candidates are
+   ranked by FTS5's bm25 (name weighted over brand), then by length.
+3. Fuzzy: rows containing at least two of the query's trigrams (any one
+   for tiny queries) are scored by the share of the query's trigrams
+   they contain. This absorbs most single-letter typos ("chiken",
+   "tomatos"). Rows under ``SEARCH_FUZZY_MIN_SIMILARITY`` are dropped.
+
+Steps 2 and 3 rank the first ``SEARCH_CANDIDATES`` matches in rowid
+order, not every match. Ordering all matches by rank makes FTS5 score
+each one, and a common trigram ("chi", "tom") hits a good share of a
+large catalog. The cap keeps a keystroke in the low milliseconds, and
+since step 1 already returns the names that start with the query, the
+best autocomplete answers are not lost to it.
+
+Queries with no term of 3+ characters stop after step 1.
+
+Migration 0011 creates the tables and triggers from a frozen copy of
+``_index_sql``. SQLite remakes a table for most ``AlterField``
+migrations, and that drops its triggers, so the search would silently
+go stale. A migration that alters ``InventoryItem`` or ``ShoppingList``
+must re-create them at the end: copy 0011's statements into it, as
+migrations must not import this module. ``SearchTests`` checks that the
+migrated schema still has every trigger. ``install_search()`` repairs a
+live database by hand.
+"""
+from itertools import combinations
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Collate
+
+from .models import InventoryItem, ShoppingList
+from .Services.units import fold_name
+
+# kind -> (FTS table, content table, indexed columns, column weights for bm25)
+INDEXES = {
+    "items": ("api_item_search", "api_inventoryitem", ("name", "brand"), (10.0, 1.0)),
+    "shopping_lists": ("api_shopping_search", "api_shoppinglist", ("item_name",), (1.0,)),
+}
+MODELS = {"items": InventoryItem, "shopping_lists": ShoppingList}
+NAME_COLUMNS = {"items": "name", "shopping_lists": "item_name"}
+
+
+def _index_sql(fts, table, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"DROP TRIGGER IF EXISTS {fts}_ai",
+        f"DROP TRIGGER IF EXISTS {fts}_ad",
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def install_search(apps=None, schema_editor=None):
+    """Create (or repair) the FTS tables and triggers and rebuild them; a ``RunPython`` function."""
+    conn = schema_editor.connection if schema_editor is not None else connection
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for fts, table, columns, _ in INDEXES.values():
+            for statement in _index_sql(fts, table, columns):
+                cursor.execute(statement)
+
+
+def uninstall_search(apps=None, schema_editor=None):
+    conn = schema_editor.connection if schema_editor is not None else connection
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for fts, _, _, _ in INDEXES.values():
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def trigrams(text):
+    """Trigrams of each word of ``text`` (folded); words under 3 characters add none."""
+    grams = set()
+    for word in fold_name(text).split():
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _candidates(kind, match, ranked):
+    """The first ``SEARCH_CANDIDATES`` rows matching ``match``: (rowid, [bm25,] *columns)."""
+    fts, _, columns, weights = INDEXES[kind]
+    rank = f"bm25({fts}, {', '.join(map(str, weights))}), " if ranked else ""  # bm25 is most of a fuzzy query's cost
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, {rank}{', '.join(columns)} FROM {fts} WHERE {fts} MATCH %s LIMIT %s",
+            [match, settings.SEARCH_CANDIDATES],
+        )
+        return cursor.fetchall()
+
+
+def _prefix_ids(kind, query, limit):
+    if kind == "items":  # range scan on the unique normalized_name index (LIKE would scan the table)
+        rows = InventoryItem.objects.filter(normalized_name__gte=query, normalized_name__lt=query + "\U0010ffff")
+        rows = rows.order_by("normalized_name")
+    else:  # LIKE 'q%' range scan on the NOCASE item_name index
+        rows = ShoppingList.objects.filter(item_name__istartswith=query).order_by(Collate("item_name", "NOCASE"))
+    return list(rows.values_list("id", flat=True)[:limit])
+
+
+def _substring_ids(kind, terms, limit, exclude):
+    rows = _candidates(kind, " AND ".join(_quote(term) for term in terms), ranked=True)
+    ranked = sorted((rank, len(name or ""), rowid) for rowid, rank, name, *_ in rows if rowid not in exclude)
+    return [rowid for _, _, rowid in ranked[:limit]]
+
+
+def _fuzzy_ids(kind, query, limit, exclude):
+    wanted = sorted(trigrams(query))
+    if not wanted:
+        return []
+    if len(wanted) > 2:  # any pair of trigrams: single common ones would flood the candidates
+        match = " OR ".join(f"({_quote(a)} AND {_quote(b)})" for a, b in combinations(wanted, 2))
+    else:
+        match = " OR ".join(_quote(gram) for gram in wanted)
+    scored = []
+    for rowid, *values in _candidates(kind, match, ranked=False):
+        if rowid in exclude:
+            continue
+        score = max(len(set(wanted) & trigrams(value or "")) / len(wanted) for value in values)
+        if score >= settings.SEARCH_FUZZY_MIN_SIMILARITY:
+            scored.append((-score, len(values[0] or ""), rowid))
+    return [rowid for _, _, rowid in sorted(scored)[:limit]]
+
+
+def search_ids(kind, text, limit, fuzzy=True):
+    """Ids of ``kind`` rows matching ``text``, best first, at most ``limit``."""
+    query = fold_name(text)
+    if not query:
+        return []
+    if connection.vendor != "sqlite":
+        rows = MODELS[kind].objects.filter(**{f"{NAME_COLUMNS[kind]}__icontains": query})
+        return list(rows.values_list("id", flat=True)[:limit])
+
+    ids = _prefix_ids(kind, query, limit)
+    terms = [term for term in query.split() if len(term) >= 3]
+    if terms and len(ids) < limit:
+        ids += _substring_ids(kind, terms, limit - len(ids), set(ids))
+    if terms and fuzzy and len(ids) < limit:
+        ids += _fuzzy_ids(kind, query, limit - len(ids), set(ids))
+    return ids
+
+
+def search(kind, text, limit, fuzzy=True):
+    """Model instances of ``kind`` matching ``text``, in rank order."""
+    ids = search_ids(kind, text, limit, fuzzy)
+    rows = MODELS[kind].objects.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
@@ -1,17 +1,58 @@
 from rest_framework import serializers
-from .models import InventoryItem, InventoryList, ShoppingList
+from .models import InventoryItem, InventoryList, ShoppingList, Job
+from .Services.units import fold_name
 
 
+def requested_fields(request):
+    """Return the set of field names from ``?fields=a,b``, or None if absent."""
+    if request is None:
+        return None
+    fields_param = request.query_params.get('fields')
+    if not fields_param:
+        return None
+    return {name.strip() for name in fields_param.split(',') if name.strip()}
+
+
+# --- Sparse fieldsets (?fields=id,name) ---
+class SparseFieldsetsMixin:
+    """
+    Drops readable fields not listed in ``?fields=`` on GET requests.
+    Only the top-level serializer is trimmed; nested serializers are
+    bound later and never see the request at construction time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        wanted = requested_fields(request)
+        if wanted is None:
+            return
+        for name, field in list(self.fields.items()):
+            if name not in wanted and not field.write_only:
+                self.fields.pop(name)
+
 
 # --- Inventory Item Serializer ---
-class InventoryItemSerializer(serializers.ModelSerializer):
+class InventoryItemSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = InventoryItem
-        fields = ['id', 'name', 'quantity', 'brand']
+        fields = ['id', 'name', 'quantity', 'brand', 'amount', 'unit']
+        read_only_fields = ['amount', 'unit']
+
+    def validate_name(self, value):
+        # normalized_name is unique: answer 400 here rather than fail on insert
+        duplicates = InventoryItem.objects.filter(normalized_name=fold_name(value))
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("An inventory item with this name already exists.")
+        return value
 
 
 # --- Inventory List Serializer ---
-class InventoryListSerializer(serializers.ModelSerializer):
+class InventoryListSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     inventory_items = InventoryItemSerializer(many=True, read_only=True)
     item_ids = serializers.PrimaryKeyRelatedField(
         many=True, queryset=InventoryItem.objects.all(), write_only=True, source='inventory_items'
@@ -22,8 +63,18 @@ class InventoryListSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'purpose', 'inventory_items', 'item_ids', 'created_at']
 
 
+# --- Inventory List Summary Serializer (no nested items) ---
+class InventoryListSummarySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    # Expects a queryset annotated with item_count=Count('inventory_items')
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = InventoryList
+        fields = ['id', 'name', 'purpose', 'item_count', 'created_at']
+
+
 # --- Shopping List Serializer ---
-class ShoppingListSerializer(serializers.ModelSerializer):
+class ShoppingListSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = ShoppingList
         fields = ['id', 'item_name', 'brand', 'quantity_needed', 'created_at']
@@ -39,4 +90,10 @@ class StockListMatchingSerializer(serializers.Serializer):
 
 class PartyPlanningSerializer(serializers.Serializer):
     list_id = serializers.IntegerField(required=True)
-    party_prompt = serializers.CharField(required=True, max_length=500)
\ No newline at end of file
+    party_prompt = serializers.CharField(required=True, max_length=500)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'status_code', 'result', 'created_at', 'started_at', 'finished_at']
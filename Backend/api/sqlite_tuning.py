@@ -0,0 +1,36 @@
+# api/sqlite_tuning.py
+"""
+Production settings for SQLite, applied to every new connection.
+
+The stock settings open each connection in rollback-journal mode, where
+a reader blocks the writer, and with deferred transactions, where two
+requests that read and then write fail at once with "database is
+locked". ``SQLITE_TUNING`` applies ``SQLITE_PRAGMAS`` on connect: WAL
+journal, ``synchronous=NORMAL``, a ``busy_timeout``, a larger page cache
+and memory-mapped reads. Together with ``transaction_mode=IMMEDIATE``
+and ``CONN_MAX_AGE`` in ``DATABASES``, writers wait their turn instead
+of failing, and the pragmas are not re-run per request. See
+``write_queue.py`` for batching small writes, and ``manage.py
+bench_sqlite_writes`` for the numbers.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """``connection_created`` receiver (see ``ApiConfig.ready``)."""
+    if connection.vendor != "sqlite" or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def current_pragmas(connection):
+    """Effective value of each ``SQLITE_PRAGMAS`` entry on ``connection`` (None if not reported)."""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in settings.SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()  # e.g. no mmap_size row for in-memory databases
+            values[name] = row[0] if row else None
+    return values
@@ -0,0 +1,221 @@
+# api/telemetry.py
+"""
+Per-request timing breakdown and Prometheus-style metrics.
+
+``TimingMiddleware`` (api/middleware.py) opens a ``RequestTimings`` for
+each request. Code on the request path reports into it with
+``with phase("encode"): ...``, which is a no-op outside a request. Every
+SQL query is counted and timed as the ``db`` phase through a connection
+execute wrapper. The breakdown is returned in the ``Server-Timing``
+header and fed into the histograms below. ``render_metrics()`` writes
+those histograms, plus the Gemini client counters, in the Prometheus
+text format for ``/metrics``.
+"""
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.queries = 0
+
+    def add(self, name, seconds):
+        self.phases[name] += seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """``Server-Timing`` header value, durations in milliseconds."""
+        entries = []
+        for name, seconds in self.phases.items():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if name == "db":
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def start_request():
+    """Begin collecting for the current request; returns ``(timings, reset_token)``."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Add the time spent in the block to phase ``name`` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Connection execute wrapper: time and count queries made for a request."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.add("db", time.perf_counter() - started)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """``connection_created`` receiver (see ``ApiConfig.ready``)."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+# --- Metrics ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set, in the Prometheus model."""
+
+    def __init__(self, name, documentation, labelnames, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}  # label values -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {values[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {values[-2]}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_DURATION = Histogram(
+    "smartshelf_request_duration_seconds", "Time to produce a response, per view.", ("view", "method", "status"),
+)
+REQUEST_PHASE = Histogram(
+    "smartshelf_request_phase_seconds", "Time per request phase (parse, encode, gemini, db, render...).", ("view", "phase"),
+)
+REQUEST_QUERIES = Histogram(
+    "smartshelf_request_db_queries", "SQL queries per request.", ("view",), buckets=QUERY_BUCKETS,
+)
+GEMINI_CALL_DURATION = Histogram(
+    "smartshelf_gemini_call_duration_seconds", "Outbound Gemini HTTP calls (each attempt).", ("model", "status"),
+)
+
+HISTOGRAMS = (REQUEST_DURATION, REQUEST_PHASE, REQUEST_QUERIES, GEMINI_CALL_DURATION)
+
+
+def observe_request(view, method, status, timings):
+    REQUEST_DURATION.observe(timings.elapsed(), view=view, method=method, status=status)
+    for name, seconds in timings.phases.items():
+        REQUEST_PHASE.observe(seconds, view=view, phase=name)
+    REQUEST_QUERIES.observe(timings.queries, view=view)
+
+
+def _counter(name, documentation, samples):
+    """Lines for a counter family from ``[(labels_dict, value), ...]``."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+
+def _gemini_client_lines():
+    from .Services.gemini_client import token_usage
+    from .Services.outbound import get_policy
+    from .Services.routing import hedge_stats
+
+    tokens = [
+        ({"model": model, "kind": kind}, value)
+        for (model, kind), value in sorted(token_usage.items()) if kind != "calls"
+    ]
+    outbound = [
+        ({"model": model, "event": event}, value)
+        for model, stats in sorted(get_policy().stats().items())
+        for event, value in sorted(stats.items()) if event != "breaker"
+    ]
+    breaker_states = ("closed", "open", "half_open")
+    breakers = [
+        ({"model": model, "state": state}, int(stats.get("breaker") == state))
+        for model, stats in sorted(get_policy().stats().items()) if "breaker" in stats
+        for state in breaker_states
+    ]
+    lines = _counter("smartshelf_gemini_tokens_total", "Tokens reported in Gemini usageMetadata.", tokens)
+    lines += _counter("smartshelf_gemini_outbound_total", "Outbound policy events (attempts, retries, rejections...).", outbound)
+    lines += _counter("smartshelf_gemini_hedges_total", "Hedged Gemini requests.", [
+        ({"result": name}, value) for name, value in sorted(hedge_stats().items())
+    ])
+    lines += ["# HELP smartshelf_gemini_breaker_state Circuit breaker state per model (1 = current).",
+              "# TYPE smartshelf_gemini_breaker_state gauge"]
+    lines += [f"smartshelf_gemini_breaker_state{_labels(labels.keys(), labels.values())} {value}" for labels, value in breakers]
+    return lines
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+    lines.extend(_gemini_client_lines())
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,1660 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import pstats
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image, ImageEnhance
+from rest_framework.test import APIClient
+
+from .benchmarking import seed_database
+from .fake_gemini import FakeGeminiServer, Latency
+from .enums import JobKind, JobStatus, ShoppingItemStatus, Unit
+from .models import InventoryItem, InventoryList, Job, PriceObservation, ShoppingList, StockPhoto
+from .serializers import InventoryItemSerializer
+from . import jobs, photo_index
+from .photo_index import clear_index, find_recent_match, record_photo
+from .profiling import make_token
+from .search import INDEXES, search_ids
+from .sqlite_tuning import current_pragmas
+from .write_queue import WriteQueue, run_write, write_queue
+from .price_catalog import basket_summary, record_estimates, stale_items
+from .Services.feastbeast import plan_party_with_inventory
+from .Services.GemImgGen import describe_image, parse_user_items
+from .Services.image_preprocess import preprocess_image
+from .Services.gemini_client import (
+    AsyncGeminiClient, GeminiAPIError, GeminiClient, LEASE_MARGIN, get_client, is_retryable, record_attempt,
+    token_usage,
+)
+from .Services.json_stream import ObjectStream
+from .Services import llm_cache
+from .Services.llm_cache import LLMCache, get_cache, make_key
+from .Services.outbound import OutboundPolicy, OutboundRejected
+from .Services.planning_list_gen import send_to_gemini
+from .Services.prompt_encoding import ENCODINGS, encode_inventory, estimate_tokens
+from .Services.routing import LARGE, SMALL, ahedged, choose_model, hedge_stats, hedged, tracker
+from .Services.single_flight import across_processes, across_processes_async
+from .Services.bestBuy import FALLBACK_ITEMS, fetch_price_estimates, price_basket, run as bestbuy_run
+from .Services.conversion import aggregate, aggregate_items, convert_many
+from .Services.phash import BKTree, hamming
+from .Services.restock_engine import diff_inventory_list, restock_list
+from .Services.stock_matching_service import build_stock_matching_payload, match_stock_with_list
+from .Services.units import Quantity, parse_quantity, split_item
+from .telemetry import HISTOGRAMS
+from .views import match_stock, plan_from_response, save_plan_items
+
+
+def make_photo_image(width, height, seed=1):
+    """A noisy RGB picture, so encoders cannot shrink it to nothing."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (32, 32))
+    img.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(32 * 32)])
+    return img.resize((width, height))
+
+
+def make_photo(brightness=1.0, seed=1):
+    rng = random.Random(seed)
+    img = Image.new("RGB", (64, 48))
+    img.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(64 * 48)])
+    img = ImageEnhance.Brightness(img.resize((640, 480))).enhance(brightness)
+    out = io.BytesIO()
+    img.save(out, format="JPEG")
+    return SimpleUploadedFile("pantry.jpg", out.getvalue(), content_type="image/jpeg")
+
+
+class SavePlanItemsTests(TestCase):
+    def test_bulk_persistence_uses_fixed_number_of_queries(self):
+        InventoryItem.objects.create(name="Milk", quantity="1L")
+        inventory_list = InventoryList.objects.create(name="Monthly")
+        shopping_data = [{"item": "Milk", "quantity": "5L"}] + [
+            {"item": f"Item {i}", "quantity": str(i)} for i in range(60)
+        ]
+
+        # upsert on normalized_name + M2M insert + stored names
+        with self.assertNumQueries(3):
+            created = save_plan_items(inventory_list, shopping_data)
+
+        self.assertEqual(len(created), 61)
+        self.assertEqual(inventory_list.inventory_items.count(), 61)
+        self.assertEqual(InventoryItem.objects.get(name="Milk").quantity, "5L")
+        self.assertEqual(InventoryItem.objects.filter(name="Milk").count(), 1)
+
+    def test_repeated_names_keep_last_quantity(self):
+        inventory_list = InventoryList.objects.create(name="Monthly")
+        created = save_plan_items(inventory_list, [
+            {"item": "Rice", "quantity": "1kg"},
+            {"item": " ", "quantity": "1"},
+            {"item": "Rice", "quantity": "2kg"},
+        ])
+
+        self.assertEqual(created, [{"name": "Rice", "quantity": "2kg"}])
+        self.assertEqual(inventory_list.inventory_items.get().quantity, "2kg")
+
+
+class InventoryListReadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        items = InventoryItem.objects.bulk_create([
+            InventoryItem(name=f"Item {i}", normalized_name=f"item {i}", quantity="1") for i in range(10)
+        ])
+        for i in range(5):
+            inventory_list = InventoryList.objects.create(name=f"List {i}")
+            inventory_list.inventory_items.set(items[:i * 2])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_viewset_list_prefetches_items(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/inventory-lists/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_lists_all_prefetches_items(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/inventory-lists-all/")
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["inventory_lists"][0]["inventory_items"]), 8)
+
+    def test_summary_uses_single_annotated_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/inventory-lists-all/?summary=1")
+        summary = response.data["inventory_lists"][0]
+        self.assertEqual(summary["item_count"], 8)
+        self.assertNotIn("inventory_items", summary)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/inventory-lists/?summary=1")
+        self.assertEqual(sorted(row["item_count"] for row in response.data["results"]), [0, 2, 4, 6, 8])
+
+
+class PaginationAndSparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        item = InventoryItem.objects.create(name="Milk", quantity="1L")
+        for i in range(5):
+            InventoryList.objects.create(name=f"List {i}").inventory_items.add(item)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_cursor_pages_cover_every_list_once(self):
+        names = []
+        url = "/api/inventory-lists/?page_size=2"
+        while url:
+            response = self.client.get(url)
+            names.extend(row["name"] for row in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(names, [f"List {i}" for i in reversed(range(5))])
+
+    def test_lists_all_is_paginated_only_on_request(self):
+        response = self.client.get("/api/inventory-lists-all/")
+        self.assertEqual(response.data["count"], 5)
+        self.assertNotIn("next", response.data)
+
+        response = self.client.get("/api/inventory-lists-all/?page_size=3")
+        self.assertEqual(response.data["count"], 3)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_fields_param_trims_output_and_skips_prefetch(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/inventory-lists/?fields=id,name")
+        self.assertEqual(set(response.data["results"][0]), {"id", "name"})
+
+        response = self.client.get("/api/inventory-items/?fields=name")
+        self.assertEqual(response.data["results"], [{"name": "Milk"}])
+
+    def test_fields_param_does_not_drop_write_fields(self):
+        item = InventoryItem.objects.get()
+        response = self.client.post(
+            "/api/inventory-lists/?fields=id",
+            {"name": "New", "item_ids": [item.id]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["inventory_items"]), 1)
+
+
+class StockPhotoDedupTests(TestCase):
+    def setUp(self):
+        clear_index()
+
+    def test_bk_tree_matches_linear_scan(self):
+        rng = random.Random(7)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        tree = BKTree()
+        for value in hashes:
+            tree.add(value, value)
+
+        probe = hashes[123] ^ 0b1011
+        expected = sorted(value for value in hashes if hamming(value, probe) <= 6)
+        self.assertEqual(sorted(payload for _, payload in tree.search(probe, 6)), expected)
+
+    @mock.patch("api.views.match_stock_with_list")
+    def test_near_duplicate_photo_reuses_previous_result(self, gemini):
+        gemini.return_value = {"stock_items": [{"name": "milk", "quantity": "1 gallon"}]}
+        inventory_list = InventoryList.objects.create(name="Pantry")
+        inventory_list.inventory_items.add(InventoryItem.objects.create(name="milk", quantity="2 gallons"))
+        items_data = InventoryItemSerializer(inventory_list.inventory_items.all(), many=True).data
+
+        first, _ = match_stock(make_photo(), inventory_list.id, "Pantry", items_data)
+        second, _ = match_stock(make_photo(brightness=1.05), inventory_list.id, "Pantry", items_data)
+        other, _ = match_stock(make_photo(seed=2), inventory_list.id, "Pantry", items_data)
+
+        self.assertFalse(first["deduplicated"])
+        self.assertTrue(second["deduplicated"])
+        self.assertEqual(first["restock_list"], ["milk 3.79 liter"])
+        self.assertEqual(first["cheapest_info"], {"store": "Unknown", "estimated_total_cost": 0.0})  # nothing priced yet
+        self.assertEqual(second["restock_list"], first["restock_list"])
+        self.assertFalse(other["deduplicated"])
+        self.assertEqual(gemini.call_count, 2)
+        self.assertEqual(StockPhoto.objects.count(), 2)
+
+    @mock.patch("api.views.match_stock_with_list")
+    def test_changed_list_or_cache_bypass_calls_gemini(self, gemini):
+        gemini.return_value = {"stock_items": []}
+        inventory_list = InventoryList.objects.create(name="Pantry")
+
+        match_stock(make_photo(), inventory_list.id, "Pantry", [{"name": "milk", "quantity": "1"}])
+        match_stock(make_photo(), inventory_list.id, "Pantry", [{"name": "milk", "quantity": "2"}])
+        match_stock(make_photo(), inventory_list.id, "Pantry", [{"name": "milk", "quantity": "2"}], use_cache=False)
+
+        self.assertEqual(gemini.call_count, 3)
+
+    def test_lookups_do_not_wait_for_another_lists_index(self):
+        pantry, fridge = InventoryList.objects.create(name="Pantry"), InventoryList.objects.create(name="Fridge")
+        record_photo(fridge.id, 0b1011, "digest", [], {})
+
+        with photo_index._index_for(pantry.id).lock:  # e.g. the pantry's index is being rebuilt
+            self.assertEqual(find_recent_match(fridge.id, 0b1001, "digest").dhash, 0b1011)
+
+    @override_settings(STOCK_PHOTO_DEDUP_WINDOW=60)
+    def test_recording_prunes_photos_outside_the_window(self):
+        pantry, fridge = InventoryList.objects.create(name="Pantry"), InventoryList.objects.create(name="Fridge")
+        expired = record_photo(pantry.id, 1, "digest", [], {})
+        recent = record_photo(pantry.id, 2, "digest", [], {})
+        other_list = record_photo(fridge.id, 3, "digest", [], {})
+        StockPhoto.objects.filter(pk__in=[expired.pk, other_list.pk]).update(
+            created_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        record_photo(pantry.id, 4, "digest", [], {})
+        self.assertEqual(
+            set(StockPhoto.objects.values_list("dhash", flat=True)),
+            {recent.dhash, other_list.dhash, 4},
+        )
+
+
+    @override_settings(STOCK_PHOTO_DEDUP_WINDOW=60, STOCK_PHOTO_INDEX_MAX_LISTS=2)
+    def test_indexes_are_evicted_when_idle_over_the_cap_or_deleted(self):
+        pantry, fridge, freezer = (InventoryList.objects.create(name=name) for name in ("Pantry", "Fridge", "Freezer"))
+        for inventory_list in (pantry, fridge, freezer):
+            find_recent_match(inventory_list.id, 1, "digest")
+        self.assertEqual(list(photo_index._indexes), [fridge.id, freezer.id])  # least recently used goes first
+
+        photo_index._indexes[fridge.id].used_at -= 61
+        find_recent_match(freezer.id, 1, "digest")
+        self.assertEqual(list(photo_index._indexes), [freezer.id])  # idle for a whole window
+
+        freezer.delete()
+        self.assertEqual(photo_index._indexes, {})
+
+class RestockEngineTests(TestCase):
+    def test_parse_quantities(self):
+        self.assertEqual(parse_quantity("5L"), Quantity(5.0, Unit.L))
+        self.assertEqual(parse_quantity("2 lbs"), Quantity(2.0, Unit.LB))
+        self.assertEqual(parse_quantity("1 1/2 cups"), Quantity(1.5, Unit.CUP))
+        self.assertEqual(parse_quantity("3 cans"), Quantity(3.0, Unit.EACH))
+        self.assertIsNone(parse_quantity("some"))
+        self.assertEqual(split_item("large eggs dozen"), ("large eggs", Quantity(12.0, Unit.EACH)))
+
+    def test_missing_low_and_fuzzy_matches(self):
+        target = ["spaghetti 5 container", "green beans 3 cans", "olive oil 2 bottle", "Milk 1 gallon", "ketchup 1 bottle"]
+        stock = ["Spaghetti 2 containers", "beans green 3 can", "milk 2000 ml", "ketchp"]
+
+        self.assertEqual(restock_list(target, stock), [
+            "spaghetti 3 each",
+            "olive oil 2 each",
+            "Milk 1.79 liter",
+        ])
+        self.assertEqual(restock_list(target, stock), restock_list(target, list(reversed(stock))))
+
+    def test_diff_inventory_list_statuses(self):
+        inventory_list = InventoryList.objects.create(name="Pantry")
+        inventory_list.inventory_items.set([
+            InventoryItem.objects.create(name="Rice", quantity="2kg"),
+            InventoryItem.objects.create(name="Flour", quantity="1 kg"),
+            InventoryItem.objects.create(name="Salt", quantity=None),
+        ])
+        rows = diff_inventory_list(inventory_list, [{"name": "rice", "quantity": "500 g"}, "salt"])
+
+        statuses = {row["item"]: row["status"] for row in rows}
+        self.assertEqual(statuses, {
+            "Rice": ShoppingItemStatus.LOW,
+            "Flour": ShoppingItemStatus.MISSING,
+            "Salt": ShoppingItemStatus.OK,
+        })
+
+    def test_diff_uses_the_stored_amount_and_unit(self):
+        inventory_list = InventoryList.objects.create(name="Pantry")
+        inventory_list.inventory_items.add(InventoryItem.objects.create(name="Rice", quantity="2kg"))
+        InventoryItem.objects.update(quantity="plenty")  # bypasses save(): amount/unit keep 2 kg
+
+        with self.assertNumQueries(1):
+            rows = diff_inventory_list(inventory_list.id, [{"name": "rice", "quantity": "500 g"}])
+        self.assertEqual(rows[0]["shortfall"], Quantity(1.5, Unit.KG))
+
+    @override_settings(GEMINI_API_KEY="test-key", LLM_CACHE_ENABLED=False)
+    def test_stock_matching_asks_gemini_only_what_the_photo_shows(self):
+        inventory_list = InventoryList.objects.create(name="Pantry")
+        inventory_list.inventory_items.set([
+            InventoryItem.objects.create(name="Rice", quantity="2kg"),
+            InventoryItem.objects.create(name="Eggs", quantity="12"),
+        ])
+        record_estimates([{"item": "Eggs 12 each", "prices": {"Walmart": 3.5, "Food Lion": 3.0, "Harris Teeter": 4.0}}])
+        answer = {"stock_items": [{"name": "Rice", "quantity": "2 kg"}, {"name": "Milk", "quantity": "1 gallon"}]}
+
+        with FakeGeminiServer(json.dumps(answer)) as fake, override_settings(GEMINI_API_BASE_URL=fake.url):
+            payload = build_stock_matching_payload(None, inventory_list.id, [{"name": "Rice", "quantity": "2kg"}])
+            response = APIClient().post(
+                "/api/stock-matching/", {"image": make_photo(), "list_id": inventory_list.id}, format="multipart"
+            )
+
+        self.assertNotIn("2kg", payload["contents"][0]["parts"][-1]["text"])  # no quantities: no diff to do
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["restock_list"], ["Eggs 12 each"])
+        self.assertEqual(response.data["cheapest_info"], {"store": "Food Lion", "estimated_total_cost": 3.0})
+
+
+class ConversionTests(TestCase):
+    def test_item_save_stores_parsed_quantity(self):
+        item = InventoryItem.objects.create(name="Milk", quantity="1 gallon")
+        self.assertAlmostEqual(item.amount, 3.785411784)
+        self.assertEqual(item.unit, Unit.L)
+
+        item.quantity = "some"
+        item.save(update_fields=["quantity"])
+        item.refresh_from_db()
+        self.assertIsNone(item.amount)
+        self.assertIsNone(item.unit)
+
+    def test_save_plan_items_parses_quantities(self):
+        inventory_list = InventoryList.objects.create(name="Week")
+        InventoryItem.objects.create(name="Rice", quantity="1 kg")
+        save_plan_items(inventory_list, [{"item": "Rice", "quantity": "500 g"}, {"item": "Eggs", "quantity": "dozen"}])
+
+        self.assertEqual(InventoryItem.objects.get(name="Rice").amount, 500.0)
+        eggs = InventoryItem.objects.get(name="Eggs")
+        self.assertEqual((eggs.amount, eggs.unit), (12.0, Unit.EACH))
+
+    def test_convert_many_crosses_dimensions_with_tables(self):
+        result = convert_many(
+            [2, 1, 500, 3, 1],
+            [Unit.CUP, Unit.KG, Unit.ML, Unit.EACH, None],
+            Unit.G,
+            names=["flour", "sugar", "milk", "eggs", "salt"],
+        )
+        self.assertAlmostEqual(result[0], 2 * 236.5882365 * 0.53)
+        self.assertEqual(result[1], 1000.0)
+        self.assertAlmostEqual(result[2], 515.0)
+        self.assertEqual(result[3], 150.0)
+        self.assertTrue(math.isnan(result[4]))
+
+        same_dimension_only = convert_many([1, 1], [Unit.L, Unit.KG], Unit.ML)
+        self.assertEqual(same_dimension_only[0], 1000.0)
+        self.assertTrue(math.isnan(same_dimension_only[1]))
+
+    def test_aggregate_sums_per_normalized_name(self):
+        totals = aggregate(
+            ["Milk", "milk", "Eggs", "mystery"],
+            [1, 500, 6, 2],
+            [Unit.L, Unit.ML, Unit.EACH, Unit.EACH],
+            Unit.ML,
+        )
+        self.assertEqual(totals["milk"], 1500.0)
+        # Eggs have a weight but no density, so they cannot become milliliters
+        self.assertTrue(math.isnan(totals["egg"]))
+        self.assertTrue(math.isnan(totals["mystery"]))
+
+        items = [InventoryItem(name="Rice", quantity="1 kg"), InventoryItem(name="rice", quantity="250 g")]
+        for item in items:
+            item.parse_quantity()
+        self.assertEqual(aggregate_items(items, Unit.G), {"rice": 1250.0})
+
+
+class ImagePreprocessTests(TestCase):
+    def upload(self, img, image_format="JPEG", **save_options):
+        out = io.BytesIO()
+        img.save(out, format=image_format, **save_options)
+        return SimpleUploadedFile(f"photo.{image_format.lower()}", out.getvalue(), content_type=f"image/{image_format.lower()}")
+
+    def decoded(self, prepared):
+        return Image.open(io.BytesIO(prepared.data))
+
+    def test_downscales_to_max_edge_and_reencodes(self):
+        prepared = preprocess_image(self.upload(make_photo_image(3000, 2000), "PNG"), max_edge=1000, image_format="JPEG", quality=80)
+        img = self.decoded(prepared)
+        self.assertEqual((img.format, img.size, prepared.mime_type), ("JPEG", (1000, 667), "image/jpeg"))
+        self.assertLess(prepared.processed_bytes, prepared.original_bytes)
+        self.assertEqual(prepared.processed_bytes, len(prepared.data))
+
+        prepared = preprocess_image(self.upload(make_photo_image(300, 200)), max_edge=1000, image_format="webp", quality=80)
+        self.assertEqual((self.decoded(prepared).format, self.decoded(prepared).size), ("WEBP", (300, 200)))
+        self.assertEqual(prepared.mime_type, "image/webp")
+
+    def test_applies_exif_orientation_and_drops_metadata(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # stored sideways: rotate 90 degrees clockwise to view
+        exif[0x010F] = "PhoneCam"
+        prepared = preprocess_image(self.upload(make_photo_image(400, 200), exif=exif), max_edge=1000)
+        img = self.decoded(prepared)
+        self.assertEqual(img.size, (200, 400))
+        self.assertEqual(dict(img.getexif()), {})
+
+    def test_transparent_images_get_a_white_background(self):
+        prepared = preprocess_image(self.upload(Image.new("RGBA", (10, 10), (0, 0, 0, 0)), "PNG"), image_format="JPEG")
+        img = self.decoded(prepared)
+        self.assertEqual(img.mode, "RGB")
+        self.assertGreater(min(img.getpixel((5, 5))), 250)
+
+    def test_undecodable_uploads_pass_through(self):
+        truncated = self.upload(make_photo_image(300, 200)).read()[:400]
+        for data in (b"not an image", truncated):
+            with self.subTest(data=data[:12]):
+                upload = SimpleUploadedFile("photo.jpg", data, content_type="image/jpeg")
+                self.assertEqual(preprocess_image(upload), (data, "image/jpeg", len(data), len(data)))
+
+    def test_decompression_bombs_are_not_decoded(self):
+        upload = self.upload(make_photo_image(300, 200), "PNG")
+        data = upload.read()
+        upload.seek(0)
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 10_000):  # 60,000 pixels is over twice the limit
+            self.assertEqual(preprocess_image(upload), (data, "image/png", len(data), len(data)))
+            upload.seek(0)
+            response = APIClient().post("/api/create_plan/", {"text": "Weekly groceries", "image": upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("image", response.json())
+
+
+@override_settings(PRICE_CATALOG_TTL=3600)
+class PriceCatalogTests(TestCase):
+    def test_only_missing_or_stale_items_need_lookup(self):
+        record_estimates([
+            {"item": "Milk 1 gallon", "prices": {"Walmart": 3.5, "Food Lion": 3.8, "Harris Teeter": 4.2}},
+            {"item": "eggs dozen", "prices": {"Walmart": 2.9, "Food Lion": None, "Harris Teeter": 3.4}},
+        ])
+        record_estimates(
+            [{"item": "rice 5kg", "prices": {"Walmart": 9.0, "Food Lion": 9.5, "Harris Teeter": 11.0}}],
+            observed_at=timezone.now() - timedelta(hours=2),
+        )
+        self.assertEqual(PriceObservation.objects.count(), 8)
+
+        self.assertEqual(
+            stale_items(["milk 1 gallon", "eggs dozen", "rice 5kg", "bread 1 loaf"]),
+            ["eggs dozen", "rice 5kg", "bread 1 loaf"],
+        )
+
+    def test_basket_totals_prefer_stores_with_complete_prices(self):
+        record_estimates([
+            {"item": "milk 1 gallon", "prices": {"Walmart": 3.5, "Food Lion": 3.0, "Harris Teeter": 4.0}},
+            {"item": "bread 1 loaf", "prices": {"Walmart": 2.0, "Harris Teeter": 2.5}},
+        ])
+        record_estimates([{"item": "milk 1 gallon", "prices": {"Harris Teeter": 3.25}}])
+
+        with self.assertNumQueries(1):
+            summary = basket_summary(["milk 1 gallon", "bread 1 loaf"])
+
+        self.assertEqual(summary["store_totals"], {"Walmart": 5.5, "Food Lion": 3.0, "Harris Teeter": 5.75})
+        self.assertEqual(summary["missing_prices"], {"Walmart": 0, "Food Lion": 1, "Harris Teeter": 0})
+        self.assertEqual(summary["cheapest_store_recommendation"], {"store": "Walmart", "estimated_total_cost": 5.5})
+        self.assertIsNone(summary["price_estimates"][1]["prices"]["Food Lion"])
+
+    def test_reformatted_names_are_stored_under_the_requested_item(self):
+        requested = ["basmati rice 5kg", "Milk 1 gallon", "large eggs dozen", "white bottles"]
+        written = record_estimates([
+            {"item": "Basmati Rice 5 kg", "prices": {"Walmart": 9.0, "Food Lion": 9.5, "Harris Teeter": 11.0}},
+            {"item": "milk (1 gallon)", "prices": {"Walmart": 3.5, "Food Lion": 3.8, "Harris Teeter": 4.2}},
+            {"item": "Large Egg, dozen", "prices": {"Walmart": 2.9, "Food Lion": 3.1, "Harris Teeter": 3.4}},
+            {"item": "Olive Oil", "prices": {"Walmart": 7.0}},  # not asked for: kept under its own name
+        ], requested=requested)
+
+        self.assertEqual(written, 10)
+        self.assertEqual(stale_items(requested), ["white bottles"])
+        self.assertEqual(basket_summary(requested[:3])["store_totals"], {"Walmart": 15.4, "Food Lion": 16.4, "Harris Teeter": 18.6})
+        self.assertEqual(
+            set(PriceObservation.objects.values_list("item", flat=True)),
+            {"basmati rice 5kg", "Milk 1 gallon", "large eggs dozen", "Olive Oil"},
+        )
+
+    def test_price_basket_does_not_requery_items_gemini_renamed(self):
+        answer = json.dumps({
+            "price_estimates": [{"item": "Basmati Rice 5 kg", "prices": {"Walmart": 9.0, "Food Lion": 9.5, "Harris Teeter": 11.0}}],
+            "coupons_and_deals": [{"store": "Walmart", "deal": "$1 off rice", "applies_to_items": ["Basmati Rice 5 kg"]}],
+        })
+        with FakeGeminiServer(answer) as fake, override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=fake.url, LLM_CACHE_ENABLED=False,
+        ):
+            first = price_basket(["basmati rice 5kg"])
+            second = price_basket(["basmati rice 5kg"])
+
+        self.assertEqual(len(fake.paths), 1)
+        self.assertEqual((first["looked_up"], second["looked_up"]), (1, 0))
+        self.assertEqual(second["price_estimates"][0]["prices"]["Walmart"], 9.0)
+        self.assertEqual(len(first["coupons_and_deals"]), 1)
+        self.assertEqual(second["coupons_and_deals"], [])  # only from a fresh lookup
+
+
+IMPORT_BUDGET_SECONDS = 1.5
+
+# Imports every api.Services module with networking disabled and reports the time taken
+IMPORT_PROBE = """
+import json, os, pkgutil, socket, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+import django
+django.setup()
+
+attempts = []
+def refuse(*args, **kwargs):
+    attempts.append(repr(args))
+    raise OSError("network disabled during import")
+socket.socket.connect = refuse
+socket.create_connection = refuse
+
+import api.Services
+names = sorted(m.name for m in pkgutil.iter_modules(api.Services.__path__, "api.Services."))
+started = time.perf_counter()
+for name in names:
+    __import__(name)
+print(json.dumps({"modules": names, "seconds": time.perf_counter() - started, "connects": attempts}))
+"""
+
+
+class ImportTimeTests(TestCase):
+    def test_services_import_fast_and_offline(self):
+        backend_dir = Path(__file__).resolve().parents[1]
+        completed = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=backend_dir, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.assertIn("api.Services.bestBuy", report["modules"])
+        self.assertIn("api.Services.compareData", report["modules"])
+        self.assertEqual(report["connects"], [])
+        self.assertLess(report["seconds"], IMPORT_BUDGET_SECONDS)
+
+    def test_pipeline_errors_are_logged_not_printed(self):
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+                self.assertLogs("api.Services", "WARNING") as logs:
+            self.assertEqual(parse_user_items("user_items = ['milk 1 gallon'"), [])
+            with mock.patch("api.Services.bestBuy.get_grocery_items", return_value=[]), \
+                    mock.patch("api.Services.bestBuy.price_basket", return_value={}) as price_basket_mock:
+                bestbuy_run("pantry.jpg")
+
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertEqual(price_basket_mock.call_args.args[0], FALLBACK_ITEMS)
+        self.assertTrue(any("Could not parse user_items" in line for line in logs.output))
+        self.assertTrue(any("pricing the fallback list" in line for line in logs.output))
+
+
+class StreamingPlanTests(TestCase):
+    PLAN = json.dumps({"shopping_list": [
+        {"item": "Milk", "quantity": "5L"},
+        {"item": "Rice {basmati}", "quantity": "2 kg"},
+        {"item": "Eggs", "quantity": "dozen"},
+    ]}, indent=2)
+
+    def setUp(self):
+        self.stub = FakeGeminiServer("```json\n" + self.PLAN + "\n```", chunks=6, chunk_delay=0.15).start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=self.stub.url, LLM_CACHE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_object_stream_yields_rows_as_they_complete(self):
+        parser = ObjectStream()
+        rows = []
+        for char in self.PLAN:
+            rows.extend(parser.feed(char))
+            if len(rows) == 1:
+                self.assertNotIn("Eggs", [row["item"] for row in rows])
+        self.assertEqual([row["item"] for row in rows], ["Milk", "Rice {basmati}", "Eggs"])
+
+    def test_sse_events_arrive_before_generation_ends(self):
+        response = APIClient().post("/api/create_plan/stream/", {"text": "Weekly groceries"}, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertNotIn("Server-Timing", response)  # it would be sent before the generation it should cover
+
+        chunks = iter(response.streaming_content)
+        first = next(chunks).decode()
+        self.assertTrue(first.startswith("event: list\n"))
+        first_item = next(chunks).decode()
+        self.assertFalse(self.stub.stream_finished.is_set())
+        rest = b"".join(chunks).decode()
+
+        self.assertIn('"name":"Milk"', first_item)
+        self.assertIn("event: done", rest)
+        self.assertTrue(self.stub.paths[0].startswith("/v1beta/models/gemini-2.0-flash:streamGenerateContent?"))
+
+        inventory_list = InventoryList.objects.get()
+        self.assertEqual(
+            sorted(inventory_list.inventory_items.values_list("name", flat=True)),
+            ["Eggs", "Milk", "Rice {basmati}"],
+        )
+
+    def test_ndjson_format(self):
+        response = APIClient().post("/api/create_plan/stream/", {"text": "Weekly groceries"}, HTTP_ACCEPT="application/x-ndjson")
+        events = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual([event["event"] for event in events], ["list", "item", "item", "item", "done"])
+        self.assertEqual(events[-1]["data"]["inventory_list"]["items"][2], {"name": "Eggs", "quantity": "dozen"})
+
+
+    def test_malformed_stream_event_ends_in_an_error_event(self):
+        response = mock.Mock(status_code=200)
+        response.iter_lines.return_value = iter([
+            'data: {"candidates": [{"content": {"parts": [{"text": "{\\"shopping_list\\": ["}]}}]}',
+            'data: {"candidates": [{"content": ',
+        ])
+        with mock.patch.object(get_client().session, "post", return_value=response):
+            streamed = APIClient().post("/api/create_plan/stream/", {"text": "Weekly groceries"}, HTTP_ACCEPT="text/event-stream")
+            body = b"".join(streamed.streaming_content).decode()
+
+        self.assertIn("event: error", body)
+        self.assertIn("Malformed stream event", body)
+        self.assertNotIn("event: done", body)
+        response.close.assert_called_once()
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGeminiServer(json.dumps({
+            "shopping_list": [{"item": "Milk", "quantity": "5L"}],
+            "party_shopping_list": ["chips 3 bags"],
+            "cheapest_info": {"store": "Aldi", "estimated_total_cost": 9.5},
+        })).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=self.fake.url, LLM_CACHE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    async def test_async_create_plan(self):
+        response = await self.async_client.post("/api/async/create_plan/", {"text": "Weekly groceries"})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["inventory_list"]["items"], [{"name": "Milk", "quantity": "5L"}])
+        self.assertTrue(await InventoryList.objects.filter(inventory_items__name="Milk").aexists())
+
+    async def test_async_party_planning_matches_sync_view(self):
+        inventory_list = await InventoryList.objects.acreate(name="Party")
+        await inventory_list.inventory_items.aadd(await InventoryItem.objects.acreate(name="Salsa", quantity="1 jar"))
+        payload = {"list_id": inventory_list.id, "party_prompt": "Nachos for 10"}
+
+        async_response = await self.async_client.post("/api/async/plan-party/", payload, content_type="application/json")
+        sync_response = await self.async_client.post("/api/plan-party/", payload, content_type="application/json")
+
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_async_validation_and_missing_list(self):
+        response = await self.async_client.post("/api/async/plan-party/", {"party_prompt": "x"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("list_id", response.json())
+
+        response = await self.async_client.post("/api/async/stock-matching/", {"list_id": 999, "image": make_photo()})
+        self.assertEqual(response.status_code, 404)
+
+
+class LLMCacheTests(TestCase):
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = LLMCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "b" is now the oldest
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.stats()["memory_entries"], 2)
+
+    def test_entries_expire_after_ttl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = LLMCache(ttl=60, db_path=Path(tmp) / "cache.sqlite3")
+            now = time.time()
+            with mock.patch.object(llm_cache.time, "time", return_value=now):
+                cache.set("key", {"answer": 42})
+            with mock.patch.object(llm_cache.time, "time", return_value=now + 59):
+                self.assertEqual(cache.get("key"), {"answer": 42})
+            with mock.patch.object(llm_cache.time, "time", return_value=now + 61):
+                self.assertIsNone(cache.get("key"))  # gone from both tiers
+                self.assertEqual(cache.stats()["memory_entries"], 0)
+
+    def test_disk_hits_are_promoted_to_memory_and_counted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Two caches on one file stand in for two worker processes
+            other, ours = LLMCache(db_path=Path(tmp) / "cache.sqlite3"), LLMCache(db_path=Path(tmp) / "cache.sqlite3")
+            other.set("key", {"answer": 42})
+            self.assertIsNone(ours.get("missing"))
+            self.assertEqual(ours.get("key"), {"answer": 42})  # from SQLite
+            self.assertEqual(ours.get("key"), {"answer": 42})  # now from memory
+            self.assertEqual(
+                {name: ours.stats()[name] for name in ("memory_hits", "disk_hits", "misses", "sets")},
+                {"memory_hits": 1, "disk_hits": 1, "misses": 1, "sets": 0},
+            )
+            self.assertEqual(ours.stats()["hit_ratio"], 2 / 3)
+            self.assertEqual(other.stats()["sets"], 1)
+
+    def test_disabled_cache(self):
+        with override_settings(LLM_CACHE_ENABLED=False):
+            self.assertIsNone(get_cache())
+        with tempfile.TemporaryDirectory() as tmp, override_settings(LLM_CACHE_ENABLED=True, LLM_CACHE_PATH=str(Path(tmp) / "c.sqlite3")):
+            self.assertIs(get_cache(), get_cache())
+
+
+class LLMCacheBypassTests(TestCase):
+    PLAN = json.dumps({"shopping_list": [{"item": "Milk", "quantity": "5L"}]})
+
+    def setUp(self):
+        self.fake = FakeGeminiServer(self.PLAN).start()
+        self.addCleanup(self.fake.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=self.fake.url,
+            LLM_CACHE_ENABLED=True, LLM_CACHE_PATH=str(Path(tmp.name) / "cache.sqlite3"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def plan(self, path="/api/create_plan/", **headers):
+        response = APIClient().post(path, {"text": "Weekly groceries"}, **headers)
+        self.assertEqual(response.status_code, 201)
+        return len(self.fake.paths)
+
+    def test_repeat_calls_hit_the_cache_unless_bypassed(self):
+        self.assertEqual(self.plan(), 1)
+        self.assertEqual(self.plan(), 1)
+        self.assertEqual(self.plan("/api/create_plan/?no_cache=1"), 2)
+        self.assertEqual(self.plan(HTTP_CACHE_CONTROL="no-cache"), 3)
+        self.assertEqual(self.plan(), 3)
+
+    def test_disabled_cache_always_calls_gemini(self):
+        with override_settings(LLM_CACHE_ENABLED=False):
+            self.assertEqual(self.plan(), 1)
+            self.assertEqual(self.plan(), 2)
+
+
+class SingleFlightTests(TestCase):
+    PLAN = json.dumps({"shopping_list": [{"item": "Milk", "quantity": "5L"}]})
+
+    def setUp(self):
+        self.fake = FakeGeminiServer(self.PLAN, latency=0.3).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=self.fake.url, LLM_CACHE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_concurrent_identical_calls_share_one_request(self):
+        texts = ["Weekly groceries", "  Weekly   groceries\n"] * 4
+        results = [None] * len(texts)
+
+        def call(index):
+            results[index] = send_to_gemini(None, texts[index])
+
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(len(texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.fake.paths), 1)
+        self.assertEqual(results, [json.loads(self.PLAN)] * len(texts))
+
+        send_to_gemini(None, "Weekly groceries")  # nothing in flight any more
+        self.assertEqual(len(self.fake.paths), 2)
+
+    def test_prompt_reaches_the_model_as_written(self):
+        eggs = json.dumps({"shopping_list": [{"item": "Eggs", "quantity": "12"}]})
+        self.fake.responses = {"- Milk\n- Eggs": eggs}
+
+        # Only the key is whitespace-folded; the model still sees the list's lines
+        self.assertEqual(send_to_gemini(None, "- Milk\n- Eggs"), json.loads(eggs))
+        self.assertEqual(make_key("m", {"contents": [{"parts": [{"text": "- Milk\n- Eggs"}]}]}),
+                         make_key("m", {"contents": [{"parts": [{"text": "- Milk - Eggs "}]}]}))
+
+    def test_async_calls_share_one_request(self):
+        payload = {"contents": [{"role": "user", "parts": [{"text": "Nachos for 10"}]}]}
+
+        async def run():
+            client = AsyncGeminiClient("test-key", self.fake.url)
+            try:
+                return await asyncio.gather(*(client.generate_content("m", payload) for _ in range(5)))
+            finally:
+                await client.aclose()
+
+        results = asyncio.run(run())
+        self.assertEqual(len(self.fake.paths), 1)
+        self.assertEqual(len({json.dumps(result) for result in results}), 1)
+
+    @override_settings(GEMINI_REQUEST_DEADLINE=200.0, GEMINI_READ_TIMEOUT=30.0)
+    def test_claims_outlast_every_retry(self):
+        payload = {"contents": [{"role": "user", "parts": [{"text": "Nachos for 10"}]}]}
+        with mock.patch("api.Services.gemini_client.across_processes", wraps=across_processes) as claim:
+            GeminiClient("test-key", self.fake.url, read_timeout=30.0).generate_content("m", payload)
+        self.assertEqual(claim.call_args.kwargs["lease"], 200.0 + LEASE_MARGIN)
+
+        async def run():
+            client = AsyncGeminiClient("test-key", self.fake.url, read_timeout=30.0)
+            try:
+                await client.generate_content("m", payload)
+            finally:
+                await client.aclose()
+
+        with mock.patch("api.Services.gemini_client.across_processes_async", wraps=across_processes_async) as claim:
+            asyncio.run(run())
+        self.assertEqual(claim.call_args.kwargs["lease"], 200.0 + LEASE_MARGIN)
+
+    def test_waits_for_a_call_claimed_by_another_process(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Two caches on one file stand in for two worker processes
+            other, ours = LLMCache(db_path=Path(tmp) / "cache.sqlite3"), LLMCache(db_path=Path(tmp) / "cache.sqlite3")
+            self.assertTrue(other.claim("key", lease=30))
+            self.assertFalse(ours.claim("key", lease=30))
+
+            def finish_elsewhere():
+                time.sleep(0.2)
+                other.set("key", {"answer": 42})
+                other.release("key")
+
+            threading.Thread(target=finish_elsewhere).start()
+            result = across_processes("key", ours, lambda: self.fail("computed twice"), lease=30)
+            self.assertEqual(result, {"answer": 42})
+            # Polling for the other process's result is not a cache lookup of its own
+            self.assertEqual(ours.counters, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0})
+
+            # An expired claim (a crashed worker) is taken over
+            self.assertTrue(other.claim("stale", lease=-1))
+            self.assertEqual(across_processes("stale", ours, lambda: "fresh", lease=30), "fresh")
+            self.assertTrue(ours.claim("stale", lease=30))
+
+
+@override_settings(GEMINI_API_KEY="test-key", LLM_CACHE_ENABLED=False, GEMINI_CONNECT_TIMEOUT=2.0, GEMINI_READ_TIMEOUT=30.0)
+class GeminiClientTests(TestCase):
+    def setUp(self):
+        self.fake = FakeGeminiServer(json.dumps({"shopping_list": []})).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(GEMINI_API_BASE_URL=self.fake.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(tracker.clear)  # these calls would otherwise steer later routing decisions
+
+    def test_get_client_returns_one_instance_per_process(self):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(get_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIs(get_client(), clients[0])
+        with override_settings(GEMINI_READ_TIMEOUT=10.0):  # rebuilt only when its settings change
+            self.assertIsNot(get_client(), clients[0])
+
+    def test_services_share_one_session_and_pass_connect_and_read_timeouts(self):
+        session = get_client().session
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(session, "post", wraps=session.post) as post:
+            image_path = Path(tmp) / "pantry.jpg"
+            image_path.write_bytes(make_photo().read())
+
+            send_to_gemini(None, "Weekly groceries")
+            plan_party_with_inventory(1, "Tacos", [{"name": "Salsa", "quantity": "1 jar"}])
+            fetch_price_estimates(["Milk 1 gallon"])
+            match_stock_with_list(make_photo(), 1, [{"name": "Milk", "quantity": "1 gallon"}])
+            describe_image(str(image_path))
+
+        self.assertIs(get_client().session, session)
+        self.assertEqual(post.call_count, 5)
+        self.assertEqual(len(self.fake.paths), 5)
+        for call in post.call_args_list:
+            connect_timeout, read_timeout = call.kwargs["timeout"]
+            self.assertEqual(connect_timeout, 2.0)
+            self.assertTrue(0 < read_timeout <= 30.0)
+
+    def test_unparseable_answers_are_logged_not_printed(self):
+        self.fake.text = "not a plan"
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+                self.assertLogs("api.Services", "WARNING") as logs:
+            self.assertIn("raw_output", send_to_gemini(None, "Weekly groceries"))
+            self.assertIn("raw_text", match_stock_with_list(make_photo(), 1, [{"name": "Milk", "quantity": "1"}]))
+
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertTrue(any("planning_list_gen:Failed to parse Gemini output" in line for line in logs.output))
+        self.assertTrue(any("stock_matching_service:Invalid JSON from Gemini" in line for line in logs.output))
+
+
+class OutboundPolicyTests(TestCase):
+    def flaky(self, *errors):
+        """Callable that raises ``errors`` in turn, then returns "ok"."""
+        errors = list(errors)
+
+        def call(remaining):
+            self.assertGreater(remaining, 0)
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+        return call
+
+    def test_retries_upstream_failures_with_backoff(self):
+        policy = OutboundPolicy(base_delay=0.01, max_attempts=3)
+        fn = self.flaky(GeminiAPIError(503, "busy"), GeminiAPIError(429, "slow down"))
+
+        self.assertEqual(policy.call("m", fn, is_retryable), "ok")
+        self.assertEqual(policy.stats()["m"], {"breaker": "closed", "attempts": 3, "failures": 2, "retries": 2, "successes": 1})
+
+        with self.assertRaises(GeminiAPIError):
+            policy.call("m", self.flaky(GeminiAPIError(400, "bad request")), is_retryable)
+        self.assertEqual(policy.stats()["m"]["attempts"], 4)
+
+    def test_retries_stop_at_the_deadline(self):
+        policy = OutboundPolicy(base_delay=10, max_delay=10, max_attempts=5, deadline=0.2)
+        # Full jitter could draw a delay under the deadline; take the largest one
+        with mock.patch.object(policy, "backoff", return_value=10), self.assertRaises(GeminiAPIError):
+            policy.call("m", self.flaky(*[GeminiAPIError(500, "boom")] * 5), is_retryable)
+        self.assertEqual(policy.stats()["m"]["attempts"], 1)
+
+    def test_breaker_opens_then_probes(self):
+        policy = OutboundPolicy(max_attempts=1, failure_threshold=2, reset_timeout=0.1)
+        for _ in range(2):
+            with self.assertRaises(GeminiAPIError):
+                policy.call("m", self.flaky(GeminiAPIError(503, "down")), is_retryable)
+
+        with self.assertRaises(OutboundRejected):
+            policy.call("m", lambda remaining: self.fail("called while open"), is_retryable)
+        self.assertEqual(policy.stats()["m"]["breaker"], "open")
+
+        time.sleep(0.1)
+        self.assertEqual(policy.call("m", self.flaky(), is_retryable), "ok")
+        self.assertEqual(policy.stats()["m"]["breaker"], "closed")
+
+    def test_concurrency_cap_per_model(self):
+        policy = OutboundPolicy(max_concurrency=1, queue_timeout=0.05)
+        holding, release = threading.Event(), threading.Event()
+
+        def hold(remaining):
+            holding.set()
+            release.wait()
+
+        thread = threading.Thread(target=policy.call, args=("m", hold, is_retryable))
+        thread.start()
+        holding.wait()
+        try:
+            with self.assertRaises(OutboundRejected):
+                policy.call("m", self.flaky(), is_retryable)
+            self.assertEqual(policy.call("other", self.flaky(), is_retryable), "ok")
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(policy.stats()["m"]["rejected_saturated"], 1)
+
+    @override_settings(
+        GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL="http://127.0.0.1:9/v1beta", LLM_CACHE_ENABLED=False,
+        GEMINI_MAX_ATTEMPTS=1, GEMINI_BREAKER_THRESHOLD=1, GEMINI_BREAKER_RESET=60,
+    )
+    def test_services_fail_fast_while_open(self):
+        self.assertIn("Request failed", send_to_gemini(None, "Weekly groceries")["error"])
+        self.assertEqual(send_to_gemini(None, "Weekly groceries"), {"error": "Gemini unavailable (circuit open)"})
+
+
+@override_settings(
+    GEMINI_ROUTING=True, GEMINI_ROUTES={"create_plan": ["primary", "fallback"]},
+    GEMINI_ROUTE_BUDGET=5.0, GEMINI_ROUTE_MIN_SAMPLES=3, GEMINI_ROUTE_LARGE_INPUT=100, GEMINI_LATENCY_WINDOW=60,
+)
+class RoutingTests(TestCase):
+    SMALL_PAYLOAD = {"contents": [{"parts": [{"text": "milk"}]}]}
+    LARGE_PAYLOAD = {"contents": [{"parts": [{"text": "milk"}, {"inlineData": {"data": "A" * 500}}]}]}
+
+    def setUp(self):
+        tracker.clear()
+        self.addCleanup(tracker.clear)
+
+    def test_routes_around_a_slow_model_per_input_size(self):
+        self.assertEqual(choose_model("create_plan", self.LARGE_PAYLOAD, "default"), "primary")
+        self.assertEqual(choose_model("unrouted", self.LARGE_PAYLOAD, "default"), "default")
+
+        for seconds in (9, 10, 11):
+            tracker.record("primary", LARGE, seconds)
+            tracker.record("fallback", LARGE, 2)
+        self.assertEqual(choose_model("create_plan", self.LARGE_PAYLOAD, "default"), "fallback")
+        self.assertEqual(choose_model("create_plan", self.SMALL_PAYLOAD, "default"), "primary")
+
+        with override_settings(GEMINI_LATENCY_WINDOW=0):  # slow samples aged out: try primary again
+            self.assertEqual(choose_model("create_plan", self.LARGE_PAYLOAD, "default"), "primary")
+
+    def test_hedged_call_returns_the_faster_answer(self):
+        calls = []
+
+        def generate():
+            calls.append(time.perf_counter())
+            if len(calls) == 1:
+                time.sleep(1)
+                return "slow"
+            return "fast"
+
+        before = hedge_stats()
+        started = time.perf_counter()
+        self.assertEqual(hedged(generate, delay=0.05), "fast")
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(hedged(lambda: "quick", delay=1), "quick")
+        after = hedge_stats()
+        self.assertEqual(after["launched"] - before.get("launched", 0), 1)
+        self.assertEqual(after["won"] - before.get("won", 0), 1)
+
+    def test_async_hedge_cancels_the_slower_call(self):
+        cancelled = []
+
+        async def generate(delay, answer):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(answer)
+                raise
+            return answer
+
+        delays = iter([(1, "slow"), (0, "fast")])
+        result = asyncio.run(ahedged(lambda: generate(*next(delays)), delay=0.05))
+        self.assertEqual(result, "fast")
+        self.assertEqual(cancelled, ["slow"])
+
+    def test_gemini_calls_feed_the_tracker(self):
+        with FakeGeminiServer(json.dumps({"shopping_list": []})) as fake, override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=fake.url, LLM_CACHE_ENABLED=False,
+            GEMINI_HEDGING=True, GEMINI_ROUTES={},
+        ):
+            for text in ("a", "b", "c"):
+                send_to_gemini(None, text)
+        self.assertEqual(tracker.snapshot()[f"gemini-2.0-flash/{LARGE}"]["count"], 3)  # the prompt alone is over 100 chars
+        self.assertEqual(len(fake.paths), 3)
+
+    def test_failed_attempts_count_as_at_least_their_deadline(self):
+        with FakeGeminiServer("{}", server_error_rate=1) as fake:
+            with self.assertRaises(GeminiAPIError):
+                GeminiClient("test-key", fake.url)._post_once("erroring", self.SMALL_PAYLOAD, remaining=2.0)
+            with self.assertRaises(GeminiAPIError):
+                asyncio.run(AsyncGeminiClient("test-key", fake.url)._post_once("erroring", self.SMALL_PAYLOAD, remaining=3.0))
+        with FakeGeminiServer("{}", latency=1) as fake, self.assertRaises(requests.Timeout):
+            GeminiClient("test-key", fake.url)._post_once("timing-out", self.SMALL_PAYLOAD, remaining=0.2)
+        with self.assertRaises(requests.ConnectionError):
+            GeminiClient("test-key", "http://127.0.0.1:9")._post_once("unreachable", self.SMALL_PAYLOAD, remaining=4.0)
+
+        self.assertEqual(tracker.percentile("erroring", SMALL, 0), 2.0)
+        self.assertEqual(tracker.percentile("erroring", SMALL, 100), 3.0)
+        self.assertGreaterEqual(tracker.percentile("timing-out", SMALL, 50), 0.2)
+        self.assertEqual(tracker.percentile("unreachable", SMALL, 50), 4.0)
+        with override_settings(GEMINI_ROUTES={"create_plan": ["erroring", "fallback"]}, GEMINI_ROUTE_BUDGET=1, GEMINI_ROUTE_MIN_SAMPLES=2):
+            self.assertEqual(choose_model("create_plan", self.SMALL_PAYLOAD, "default"), "fallback")
+
+
+    def test_request_errors_keep_their_real_duration(self):
+        for status_code in (400, 403, 404):
+            record_attempt("rejecting", self.SMALL_PAYLOAD, 0.05, 30.0, status_code)
+        record_attempt("throttled", self.SMALL_PAYLOAD, 0.05, 30.0, 429)
+        record_attempt("broken", self.SMALL_PAYLOAD, 0.05, 30.0, 501)
+
+        self.assertEqual(tracker.percentile("rejecting", SMALL, 100), 0.05)
+        self.assertEqual(tracker.percentile("throttled", SMALL, 50), 30.0)
+        self.assertEqual(tracker.percentile("broken", SMALL, 50), 30.0)
+
+class PromptEncodingTests(TestCase):
+    FOODS = ["Milk", "Eggs", "Basmati Rice", "Green Beans", "Olive Oil", "Cheddar Cheese", "Tortilla Chips", "Salsa"]
+    QUANTITIES = ["1 gallon", "12", "2 kg", "500 g", "1 bottle", "3 cans", "2 lbs", "1 jar", "1.5 L"]
+
+    def pantry(self, size):
+        rng = random.Random(size)
+        return [
+            {"name": f"{rng.choice(self.FOODS)} {index % (size // 2 + 1)}", "quantity": rng.choice(self.QUANTITIES)}
+            for index in range(size)
+        ]
+
+    def test_table_merges_duplicate_items(self):
+        items = [
+            {"name": "Eggs", "quantity": "12"}, {"name": "egg", "quantity": "dozen"},
+            {"name": "Rice", "quantity": "2 kg"}, {"name": "rice", "quantity": "3 bags"}, {"name": "rice", "quantity": "3 bags"},
+            {"name": "Salt | fine", "quantity": ""},
+        ]
+        self.assertEqual(
+            encode_inventory(items, "table"),
+            "item|quantity\nEggs|24 ea\nRice|2 kg + 3 bags\nSalt fine|",
+        )
+
+    def test_merged_totals_are_fixed_point(self):
+        items = [
+            {"name": "Flour", "quantity": "10 kg"}, {"name": "flour", "quantity": "2345 g"},
+            {"name": "Sugar", "quantity": "10000 g"}, {"name": "sugar", "quantity": "2345 g"},
+            {"name": "Milk", "quantity": "0.1 L"}, {"name": "milk", "quantity": "0.2 L"},
+        ]
+        self.assertEqual(
+            encode_inventory(items, "table"),
+            "item|quantity\nFlour|12.345 kg\nSugar|12345 g\nMilk|0.3 l",
+        )
+
+    def test_table_uses_fewest_tokens(self):
+        for size in (10, 100, 1000):
+            items = self.pantry(size)
+            tokens = {encoding: estimate_tokens(encode_inventory(items, encoding)) for encoding in ENCODINGS}
+            with self.subTest(size=size, tokens=tokens):
+                self.assertLess(tokens["table"], tokens["lines"])
+                self.assertLess(tokens["lines"], tokens["json"])
+                self.assertLess(tokens["table"], 0.4 * tokens["json"])
+
+    def test_token_usage_is_recorded_per_call(self):
+        items = self.pantry(100)
+        prompt_tokens = {}
+        with FakeGeminiServer(json.dumps({"party_shopping_list": [], "cheapest_info": {}})) as fake:
+            for encoding in ("lines", "table"):
+                with override_settings(
+                    GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=fake.url, LLM_CACHE_ENABLED=False,
+                    GEMINI_INVENTORY_ENCODING=encoding,
+                ), self.assertLogs("api.Services.gemini_client", "INFO") as logs:
+                    before = token_usage[("gemini-2.0-flash", "prompt_tokens")]
+                    plan_party_with_inventory(1, "Tacos for 8", items)
+                    prompt_tokens[encoding] = token_usage[("gemini-2.0-flash", "prompt_tokens")] - before
+                self.assertTrue(any("tokens: prompt=" in line for line in logs.output))
+
+        self.assertGreater(prompt_tokens["table"], 0)
+        self.assertLess(prompt_tokens["table"], prompt_tokens["lines"])
+
+
+class TelemetryTests(TestCase):
+    def setUp(self):
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+        self.fake = FakeGeminiServer(json.dumps({"stock_items": [], "cheapest_info": {"store": "Aldi"}})).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=self.fake.url, LLM_CACHE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        clear_index()
+        self.inventory_list = InventoryList.objects.create(name="Pantry")
+        self.inventory_list.inventory_items.add(InventoryItem.objects.create(name="Milk", quantity="1 gallon"))
+
+    def server_timing(self, response):
+        return dict(
+            (entry.split(";")[0], entry) for entry in response["Server-Timing"].split(", ")
+        )
+
+    def test_server_timing_breaks_down_stock_matching(self):
+        response = APIClient().post(
+            "/api/stock-matching/", {"image": make_photo(), "list_id": self.inventory_list.id}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        timing = self.server_timing(response)
+        for phase_name in ("parse", "hash", "encode", "gemini", "restock", "db", "render", "total"):
+            self.assertIn(phase_name, timing)
+        self.assertRegex(timing["db"], r'desc="\d+ queries"')
+
+    async def test_async_views_are_timed(self):
+        response = await self.async_client.post(
+            "/api/async/plan-party/", {"list_id": self.inventory_list.id, "party_prompt": "Tacos"},
+            content_type="application/json",
+        )
+        self.assertIn("gemini;dur=", response["Server-Timing"])
+
+    def test_metrics_endpoint(self):
+        APIClient().get(f"/api/inventory-lists/{self.inventory_list.id}/")
+        APIClient().post("/api/plan-party/", {"list_id": self.inventory_list.id, "party_prompt": "Tacos"}, format="json")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('smartshelf_request_duration_seconds_count{view="inventorylist-detail",method="GET",status="200"} 1', body)
+        self.assertIn('smartshelf_request_phase_seconds_count{view="plan-party",phase="gemini"} 1', body)
+        self.assertIn('smartshelf_gemini_call_duration_seconds_bucket{model="gemini-2.0-flash",status="200",le="+Inf"} 1', body)
+        self.assertIn('smartshelf_gemini_tokens_total{model="gemini-2.0-flash",kind="prompt_tokens"}', body)
+
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_token_is_required_when_set(self):
+        # e.g. behind a local reverse proxy, where every request comes from 127.0.0.1
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret").status_code, 200)
+        self.assertEqual(
+            self.client.get("/metrics", REMOTE_ADDR="10.1.2.3", HTTP_AUTHORIZATION="Bearer scrape-secret").status_code,
+            403,
+        )
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.profile_dir = Path(tmp.name)
+        settings_override = override_settings(PROFILE_DIR=tmp.name, PROFILE_KEEP=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = f"/api/inventory-lists/{InventoryList.objects.create(name='Pantry').id}/"
+
+    def test_unflagged_and_badly_signed_requests_are_not_profiled(self):
+        for extra in ({}, {"HTTP_X_PROFILE": "profile:forged:signature"}):
+            response = APIClient().get(self.url, **extra)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Profile-Capture", response)
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+    def test_signed_flag_captures_a_profile(self):
+        response = APIClient().get(self.url, HTTP_X_PROFILE=make_token())
+        name = response["X-Profile-Capture"]
+        self.assertTrue(name.endswith(".prof"))
+        stats = pstats.Stats(str(self.profile_dir / name))
+        self.assertTrue(any("views.py" in filename for filename, _, _ in stats.stats))
+
+        for _ in range(2):
+            APIClient().get(self.url, {"profile": make_token()})
+        self.assertEqual(len(list(self.profile_dir.glob("*.prof"))), 2)  # PROFILE_KEEP
+        self.assertFalse((self.profile_dir / name).exists())
+
+    def test_capture_listing_is_admin_only(self):
+        name = APIClient().get(self.url, HTTP_X_PROFILE=make_token())["X-Profile-Capture"]
+        client = APIClient()
+        self.assertEqual(client.get("/api/profiles/").status_code, 403)
+
+        client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        listing = client.get("/api/profiles/").json()
+        self.assertEqual([capture["name"] for capture in listing], [name])
+        download = client.get(f"/api/profiles/{name}/")
+        self.assertEqual(b"".join(download.streaming_content), (self.profile_dir / name).read_bytes())
+        self.assertEqual(client.get("/api/profiles/..%2Fdb.sqlite3/").status_code, 404)
+
+
+@override_settings(GEMINI_API_KEY="test-key", LLM_CACHE_ENABLED=False, GEMINI_MAX_ATTEMPTS=1, GEMINI_BREAKER_THRESHOLD=1000)
+class FakeGeminiTests(TestCase):
+    PLAN = json.dumps({"shopping_list": [{"item": "Milk", "quantity": "1 gallon"}]})
+
+    def test_latency_specs_and_seeded_draws(self):
+        rng = random.Random(0)
+        self.assertEqual(Latency.parse(0.25).sample(rng), 0.25)
+        self.assertEqual(Latency.parse("0.25").sample(rng), 0.25)
+        self.assertTrue(all(0.1 <= Latency.parse("uniform:0.1,0.3").sample(rng) <= 0.3 for _ in range(100)))
+        samples = sorted(Latency.parse("lognormal:0.5,0.3").sample(rng) for _ in range(1001))
+        self.assertAlmostEqual(samples[500], 0.5, delta=0.05)
+        with self.assertRaises(ValueError):
+            Latency.parse("gamma:1,2")
+
+        runs = []
+        for _ in range(2):
+            with FakeGeminiServer(latency="exponential:0.2", rate_limit_rate=0.2, server_error_rate=0.2, seed=7) as fake:
+                runs.append([fake.draw() for _ in range(50)])
+        self.assertEqual(runs[0], runs[1])
+        self.assertEqual({fault for _, fault in runs[0]}, {None, 429, 503})
+
+    def test_faults_surface_through_the_services(self):
+        for options, expected in (
+            ({"rate_limit_rate": 1}, "RESOURCE_EXHAUSTED"),
+            ({"server_error_rate": 1}, "UNAVAILABLE"),
+            ({"malformed_rate": 1}, "Failed to parse"),
+        ):
+            with FakeGeminiServer(self.PLAN, **options) as fake, override_settings(GEMINI_API_BASE_URL=fake.url):
+                self.assertIn(expected, send_to_gemini(None, "Weekly groceries")["error"])
+        with FakeGeminiServer(self.PLAN) as fake, override_settings(GEMINI_API_BASE_URL=fake.url):
+            self.assertEqual(send_to_gemini(None, "Weekly groceries"), json.loads(self.PLAN))
+        self.assertEqual(fake.served, {"ok": 1})
+
+    def test_canned_responses_by_prompt(self):
+        party = json.dumps({"party_shopping_list": ["chips 2 bags"], "cheapest_info": {}})
+        with FakeGeminiServer(self.PLAN, responses={"party": party}) as fake, override_settings(GEMINI_API_BASE_URL=fake.url):
+            self.assertEqual(plan_party_with_inventory(1, "Taco night for 6", [])["party_shopping_list"], ["chips 2 bags"])
+            self.assertEqual(send_to_gemini(None, "Weekly groceries"), json.loads(self.PLAN))
+
+    def test_records_upstream_answers_and_replays_them_offline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            recordings = Path(tmp) / "gemini.json"
+            with FakeGeminiServer(self.PLAN) as upstream, FakeGeminiServer(
+                recordings=recordings, upstream=upstream.url,
+            ) as recorder, override_settings(GEMINI_API_BASE_URL=recorder.url):
+                recorded = send_to_gemini(None, "Weekly groceries")
+            self.assertEqual(recorded, json.loads(self.PLAN))
+            self.assertEqual(recorder.served["recorded"], 1)
+            self.assertTrue(upstream.paths[0].endswith("?key=test-key"))
+
+            with FakeGeminiServer("{}", recordings=recordings) as replay, override_settings(GEMINI_API_BASE_URL=replay.url):
+                self.assertEqual(send_to_gemini(None, "Weekly groceries"), recorded)
+                self.assertEqual(send_to_gemini(None, "Something else"), {})
+            self.assertEqual(replay.served["replayed"], 1)
+
+
+class BenchmarkSeedTests(TestCase):
+    def test_seed_database_spreads_links_without_duplicates(self):
+        lists = seed_database(items=200, lists=30, links=1000, shopping=10)
+        Through = InventoryList.inventory_items.through
+        self.assertEqual(InventoryItem.objects.count(), 200)
+        self.assertEqual(Through.objects.count(), 1000)
+        self.assertEqual(Through.objects.values("inventorylist_id", "inventoryitem_id").distinct().count(), 1000)
+        self.assertEqual({inventory_list.inventory_items.count() for inventory_list in lists}, {33, 34})
+        self.assertEqual(InventoryItem.objects.filter(quantity="2 kg").exclude(unit="kg").count(), 0)
+
+
+class SqliteTuningTests(TestCase):
+    def test_pragmas_are_applied_on_connect(self):
+        pragmas = current_pragmas(connection)
+        self.assertEqual(pragmas["synchronous"], 1)  # NORMAL
+        self.assertEqual(pragmas["busy_timeout"], settings.SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(pragmas["cache_size"], settings.SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(pragmas["temp_store"], 2)  # MEMORY
+        self.assertEqual(connection.settings_dict["OPTIONS"].get("transaction_mode"), "IMMEDIATE")
+
+    def test_writes_inside_a_transaction_run_inline(self):
+        queue = WriteQueue()
+        self.assertIs(queue.run(threading.current_thread), threading.current_thread())
+        self.assertEqual(queue.counters["writes"], 0)
+
+
+class WriteQueueTests(TransactionTestCase):
+    def test_concurrent_writes_are_batched_and_isolated(self):
+        queue = WriteQueue(max_batch=8, max_wait=0.05)
+
+        def create(index):
+            if index == 3:
+                raise ValueError("bad row")
+            return InventoryItem.objects.create(name=f"Queued {index}", quantity="1 kg").id
+
+        futures = [queue.submit(create, index) for index in range(20)]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=10))
+            except ValueError:
+                results.append(None)
+
+        self.assertEqual(results.count(None), 1)
+        self.assertEqual(InventoryItem.objects.filter(name__startswith="Queued").count(), 19)
+        self.assertEqual(queue.counters["writes"], 20)
+        self.assertEqual(queue.counters["failed_writes"], 1)
+        self.assertLess(queue.counters["batches"], 20)
+
+    @override_settings(SQLITE_WRITE_QUEUE=True)
+    def test_viewset_and_plan_writes_go_through_the_queue(self):
+        before = write_queue.counters["writes"]
+        response = APIClient().post("/api/inventory-items/", {"name": "Flour", "quantity": "2 kg"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        body, status_code = plan_from_response("Bread", {"shopping_list": [{"item": "Flour", "quantity": "1 kg"}]})
+        self.assertEqual(status_code, 201)
+        self.assertEqual(InventoryItem.objects.get(name="Flour").quantity, "1 kg")
+        self.assertEqual(write_queue.counters["writes"] - before, 2)
+
+    @override_settings(SQLITE_WRITE_QUEUE=True, SQLITE_WRITE_TIMEOUT=5)
+    def test_a_batch_that_cannot_open_fails_every_write(self):
+        queue = WriteQueue(max_batch=8, max_wait=0.05)
+        locked = OperationalError("database is locked")  # e.g. BEGIN IMMEDIATE after busy_timeout
+        with mock.patch("api.write_queue.transaction.atomic", side_effect=locked), \
+                self.assertLogs("api.write_queue", "ERROR"):
+            futures = [queue.submit(InventoryItem.objects.create, name=f"Queued {index}") for index in range(3)]
+            for future in futures:
+                with self.assertRaises(OperationalError):
+                    future.result(timeout=5)
+            with self.assertRaises(OperationalError):
+                run_write(InventoryItem.objects.create, name="Flour")
+
+        # A crash outside the transaction does not strand the batch either
+        with mock.patch("api.write_queue.close_old_connections", side_effect=RuntimeError("boom")), \
+                self.assertLogs("api.write_queue", "ERROR") as logs:
+            with self.assertRaises(RuntimeError):
+                queue.run(InventoryItem.objects.create, name="Flour")
+        self.assertIn("SQLite writer failed", logs.output[0])
+        self.assertFalse(InventoryItem.objects.exists())
+        self.assertGreaterEqual(queue.counters["failed_batches"], 1)
+        self.assertEqual(queue.run(lambda: "still working"), "still working")
+
+    @override_settings(SQLITE_WRITE_TIMEOUT=0.1)
+    def test_callers_stop_waiting_after_the_write_timeout(self):
+        queue = WriteQueue(max_batch=1, max_wait=0)
+        release = threading.Event()
+        queue.submit(release.wait)  # holds the writer thread
+        with self.assertRaises(FutureTimeoutError):
+            queue.run(lambda: self.fail("ran after its caller gave up"))
+        release.set()
+        self.assertEqual(queue.run(lambda: "done"), "done")
+
+
+class ItemNameIndexTests(TestCase):
+    def test_plan_items_match_names_regardless_of_case_and_spacing(self):
+        beans = InventoryItem.objects.create(name="Green Beans", quantity="1 can")
+        self.assertEqual(beans.normalized_name, "green beans")
+        inventory_list = InventoryList.objects.create(name="Dinner")
+
+        created = save_plan_items(inventory_list, [{"item": "green  BEANS", "quantity": "3 cans"}])
+
+        self.assertEqual(created, [{"name": "Green Beans", "quantity": "3 cans"}])  # as stored
+        beans.refresh_from_db()
+        self.assertEqual((beans.name, beans.quantity, beans.amount), ("Green Beans", "3 cans", 3.0))
+        self.assertEqual(list(inventory_list.inventory_items.all()), [beans])
+        self.assertEqual(InventoryItem.objects.count(), 1)
+
+    def test_api_rejects_duplicate_names(self):
+        milk = InventoryItem.objects.create(name="Milk", quantity="1 gallon")
+        client = APIClient()
+        response = client.post("/api/inventory-items/", {"name": " MILK ", "quantity": "2 L"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("name", response.json())
+        response = client.patch(f"/api/inventory-items/{milk.id}/", {"name": "milk"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(InventoryItem.objects.get().normalized_name, "milk")
+
+    def test_lookups_and_newest_first_listing_use_indexes(self):
+        self.assertIn("USING INDEX", InventoryItem.objects.filter(normalized_name__in=["milk", "eggs"]).explain())
+        self.assertIn("USING INDEX", InventoryList.objects.order_by("-created_at")[:20].explain())
+
+
+class MergeDuplicateItemsMigrationTests(TransactionTestCase):
+    before, after = ("api", "0009_priceobservation"), ("api", "0010_inventoryitem_normalized_name_and_more")
+
+    def migrate(self, target=None):
+        executor = MigrationExecutor(connection)
+        targets = [target] if target else executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate()  # back to the latest state for the other tests
+
+    def test_duplicates_are_merged_into_the_oldest_item(self):
+        apps = self.migrate(self.before)
+        Item, List = apps.get_model("api", "InventoryItem"), apps.get_model("api", "InventoryList")
+        milk = Item.objects.create(name="Milk", quantity=None)
+        shouting = Item.objects.create(name="MILK ", quantity="2 L", brand="Horizon")
+        spaced = Item.objects.create(name="milk", quantity="1 gallon")
+        eggs = Item.objects.create(name="Eggs", quantity="12")
+        both, other = List.objects.create(name="Both"), List.objects.create(name="Other")
+        both.inventory_items.set([milk, shouting, eggs])
+        other.inventory_items.set([spaced])
+
+        self.migrate(self.after)
+
+        self.assertEqual(
+            list(InventoryItem.objects.order_by("id").values_list("id", "name", "normalized_name", "quantity", "brand")),
+            [(milk.id, "Milk", "milk", "2 L", "Horizon"), (eggs.id, "Eggs", "eggs", "12", None)],
+        )
+        self.assertEqual(sorted(InventoryList.objects.get(id=both.id).inventory_items.values_list("id", flat=True)), [milk.id, eggs.id])
+        self.assertEqual(list(InventoryList.objects.get(id=other.id).inventory_items.values_list("id", flat=True)), [milk.id])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for name, brand in [
+            ("Cherry Tomatoes", None), ("Tomato Paste", "Hunt's"), ("Tomatoes", None),
+            ("Crushed Tomatoes", "Cento"), ("Tortillas", "Mission"), ("Milk", "Horizon"),
+        ]:
+            InventoryItem.objects.create(name=name, quantity="1", brand=brand)
+
+    def ranked(self, text, limit=10, **kwargs):
+        ids = search_ids("items", text, limit, **kwargs)
+        rows = InventoryItem.objects.in_bulk(ids)
+        return [rows[pk].name for pk in ids]
+
+    def test_names_starting_with_the_query_rank_first(self):
+        ranked = self.ranked("toma", fuzzy=False)
+        self.assertEqual(set(ranked[:2]), {"Tomato Paste", "Tomatoes"})
+        self.assertEqual(set(ranked[2:]), {"Cherry Tomatoes", "Crushed Tomatoes"})
+
+    def test_matches_brands_and_every_term(self):
+        self.assertEqual(self.ranked("horiz", fuzzy=False), ["Milk"])
+        self.assertEqual(self.ranked("crush tomat", fuzzy=False), ["Crushed Tomatoes"])
+        self.assertEqual(self.ranked("crush tomat")[0], "Crushed Tomatoes")  # then the near misses
+
+    def test_typos_fall_back_to_trigram_similarity(self):
+        self.assertEqual(self.ranked("tomatos", fuzzy=False), [])
+        self.assertEqual(self.ranked("tomatos")[0], "Tomatoes")
+        self.assertNotIn("Tortillas", self.ranked("tomatos"))
+        self.assertEqual(self.ranked("tortilas"), ["Tortillas"])
+
+    def test_short_queries_match_name_prefixes(self):
+        self.assertEqual(self.ranked("to"), ["Tomato Paste", "Tomatoes", "Tortillas"])
+        self.assertEqual(self.ranked("to", limit=1), ["Tomato Paste"])
+
+    def test_index_follows_updates_deletes_and_bulk_upserts(self):
+        milk = InventoryItem.objects.get(name="Milk")
+        milk.name = "Oat Milk"
+        milk.save()
+        self.assertEqual(self.ranked("oat m"), ["Oat Milk"])
+        InventoryItem.objects.filter(name="Tortillas").delete()
+        self.assertEqual(self.ranked("tortil"), [])
+        save_plan_items(InventoryList.objects.create(name="Tacos"), [{"item": "Tortilla Chips", "quantity": "1 bag"}])
+        self.assertEqual(self.ranked("tortil"), ["Tortilla Chips"])
+        InventoryItem.objects.bulk_update([InventoryItem(id=milk.id, name="Almond Milk", brand=None)], ["name", "brand"])
+        self.assertEqual(self.ranked("almond"), ["Almond Milk"])
+        self.assertEqual(self.ranked("horizon"), [])
+
+    def test_prefix_steps_use_indexes(self):
+        chicken = ShoppingList.objects.create(item_name="Chicken Thighs", quantity_needed=1)
+        cheddar = ShoppingList.objects.create(item_name="cheddar", quantity_needed=1)
+        ShoppingList.objects.create(item_name="Milk", quantity_needed=1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(search_ids("shopping_lists", "CH", 10), [cheddar.id, chicken.id])  # any case, A-Z
+            search_ids("items", "to", 10)
+        for query in queries:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+            self.assertIn("USING COVERING INDEX", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_migrations_leave_the_sync_triggers_in_place(self):
+        # A later AlterField on these tables drops the triggers unless its migration re-creates them
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            triggers = {row[0] for row in cursor.fetchall()}
+        expected = {f"{fts}_{suffix}" for fts, *_ in INDEXES.values() for suffix in ("ai", "ad", "au")}
+        self.assertEqual(expected - triggers, set())
+
+    def test_endpoint_searches_items_and_shopping_lists(self):
+        ShoppingList.objects.create(item_name="Roma Tomatoes", quantity_needed=4)
+        ShoppingList.objects.create(item_name="Bread", quantity_needed=1)
+        with self.assertNumQueries(5):  # prefix + substring step per kind, one fetch per kind with hits
+            response = self.client.get("/api/search/", {"q": "roma", "fuzzy": "0"})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["query"], "roma")
+        self.assertEqual([row["item_name"] for row in body["shopping_lists"]], ["Roma Tomatoes"])
+        self.assertEqual(body["items"], [])
+
+        response = self.client.get("/api/search/", {"q": "tomat", "type": "items", "limit": 2})
+        self.assertEqual(list(response.json()), ["query", "items"])
+        self.assertEqual(len(response.json()["items"]), 2)
+        self.assertEqual(set(response.json()["items"][0]), {"id", "name", "quantity", "brand", "amount", "unit"})
+
+    def test_endpoint_validates_parameters(self):
+        for params in [{}, {"q": "  "}, {"q": "milk", "type": "lists"}, {"q": "milk", "limit": "ten"}]:
+            response = self.client.get("/api/search/", params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+        with self.settings(SEARCH_MAX_LIMIT=1):
+            response = self.client.get("/api/search/", {"q": "tomat", "type": "items", "limit": 100})
+        self.assertEqual(len(response.json()["items"]), 1)
+
+
+class JobTests(TransactionTestCase):
+    PLAN = json.dumps({"shopping_list": [{"item": "Milk", "quantity": "5L"}]})
+
+    def setUp(self):
+        self.fake = FakeGeminiServer(self.PLAN).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            GEMINI_API_KEY="test-key", GEMINI_API_BASE_URL=self.fake.url, LLM_CACHE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def submit(self, **headers):
+        response = self.client.post("/api/create_plan/?async=1", {"text": "Weekly groceries"}, **headers)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Location"], response.json()["poll_url"])
+        self.assertTrue(response["Location"].endswith(f"/api/jobs/{response.json()['job_id']}/"))
+        return response["Location"]
+
+    @override_settings(API_JOBS_EAGER=True)
+    def test_eager_job_succeeds(self):
+        body = self.client.get(self.submit(HTTP_PREFER="respond-async")).json()
+        self.assertEqual((body["status"], body["status_code"]), (JobStatus.SUCCEEDED, 201))
+        self.assertEqual(body["result"]["inventory_list"]["items"], [{"name": "Milk", "quantity": "5L"}])
+        self.assertIsNotNone(body["finished_at"])
+
+    @override_settings(API_JOBS_EAGER=True)
+    def test_eager_job_fails(self):
+        self.fake.text = "not a plan"
+        body = self.client.get(self.submit()).json()
+        self.assertEqual((body["status"], body["status_code"]), (JobStatus.FAILED, 500))
+        self.assertIn("error", body["result"])
+
+    def held_worker(self):
+        """
+        Give the test its own one-thread job pool, kept busy until the returned
+        event is set. The in-memory test database fails (rather than waits) when
+        the worker writes while a request reads, so tests only poll around it.
+        """
+        patcher = mock.patch.object(jobs, "_executor", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with override_settings(API_JOB_WORKERS=1):
+            executor = jobs.get_executor()
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        executor.submit(release.wait)
+        return executor, release
+
+    @override_settings(API_JOBS_EAGER=False)
+    def test_worker_job_goes_from_pending_to_succeeded(self):
+        executor, release = self.held_worker()
+        url = self.submit()
+        self.assertEqual(self.client.get(url).json()["status"], JobStatus.PENDING)
+
+        release.set()
+        executor.shutdown(wait=True)
+        body = self.client.get(url).json()
+        self.assertEqual((body["status"], body["status_code"]), (JobStatus.SUCCEEDED, 201))
+        self.assertTrue(InventoryList.objects.filter(inventory_items__name="Milk").exists())
+
+    @override_settings(API_JOBS_EAGER=False)
+    def test_worker_job_fails(self):
+        self.fake.text = "not a plan"
+        executor, release = self.held_worker()
+        url = self.submit()
+        release.set()
+        executor.shutdown(wait=True)
+        body = self.client.get(url).json()
+        self.assertEqual((body["status"], body["status_code"]), (JobStatus.FAILED, 500))
+
+    def test_unknown_job_is_404(self):
+        response = self.client.get(f"/api/jobs/{uuid.uuid4()}/")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "Job not found"})
+
+    @override_settings(API_JOB_TIMEOUT=60)
+    def test_stale_jobs_are_failed(self):
+        lost = Job.objects.create(kind=JobKind.CREATE_PLAN, status=JobStatus.RUNNING)
+        waiting = Job.objects.create(kind=JobKind.CREATE_PLAN)
+        fresh = Job.objects.create(kind=JobKind.CREATE_PLAN)
+        Job.objects.filter(pk__in=[lost.pk, waiting.pk]).update(created_at=timezone.now() - timedelta(minutes=5))
+
+        body = self.client.get(f"/api/jobs/{lost.pk}/").json()  # polling fails the polled job
+        self.assertEqual((body["status"], body["status_code"]), (JobStatus.FAILED, 500))
+        self.assertIn("60 seconds", body["result"]["error"])
+
+        with mock.patch.object(jobs, "_executor", None):  # a process starting its pool fails the rest
+            jobs.get_executor().shutdown()
+        self.assertEqual(Job.objects.get(pk=waiting.pk).status, JobStatus.FAILED)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, JobStatus.PENDING)
+
+        jobs._run_job(waiting.pk, lambda: ({}, 200), (), {})  # a late worker does not revive it
+        self.assertEqual(Job.objects.get(pk=waiting.pk).status, JobStatus.FAILED)
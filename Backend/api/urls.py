@@ -7,9 +7,16 @@ from .views import (
     InventoryListViewSet,
     ShoppingListViewSet,
     CreatePlanView, 
+    CreatePlanStreamView,
       InventoryListItemsView,  # <- keep import
-      StockMatchingView
+      StockMatchingView,
+      PartyPlanningView,
+      JobDetailView,
+      SearchView,
+      ProfileCaptureListView,
+      ProfileCaptureDetailView,
 )
+from .async_views import AsyncCreatePlanView, AsyncStockMatchingView, AsyncPartyPlanningView
 
 # Router for ViewSets only
 router = DefaultRouter()
@@ -21,6 +28,17 @@ router.register(r'shopping-lists', ShoppingListViewSet, basename='shoppinglist')
 urlpatterns = [
     path('', include(router.urls)),                  # all router-based endpoints
     path('create_plan/', CreatePlanView.as_view(), name='create_plan'),  # <-- direct APIView
+    path('create_plan/stream/', CreatePlanStreamView.as_view(), name='create_plan_stream'),  # <-- SSE / NDJSON
     path('stock-matching/', StockMatchingView.as_view(), name='stock-matching'),  # <-- direct APIView
+    path('plan-party/', PartyPlanningView.as_view(), name='plan-party'),  # <-- direct APIView
     path('inventory-lists-all/', InventoryListItemsView.as_view(), name='inventory_lists_all'),
+    path('jobs/<uuid:job_id>/', JobDetailView.as_view(), name='job-detail'),  # <-- async job polling
+    path('search/', SearchView.as_view(), name='search'),  # <-- FTS5 item search / autocomplete
+    path('profiles/', ProfileCaptureListView.as_view(), name='profile-list'),  # <-- admin: request profiles
+    path('profiles/<str:name>/', ProfileCaptureDetailView.as_view(), name='profile-detail'),
+
+    # Async (ASGI) variants of the Gemini-backed endpoints
+    path('async/create_plan/', AsyncCreatePlanView.as_view(), name='async-create_plan'),
+    path('async/stock-matching/', AsyncStockMatchingView.as_view(), name='async-stock-matching'),
+    path('async/plan-party/', AsyncPartyPlanningView.as_view(), name='async-plan-party'),
 ]
@@ -1,40 +1,147 @@
+import requests
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.db.models import Count
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import UnidentifiedImageError
 from rest_framework import viewsets, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import InventoryItem, InventoryList, ShoppingList
+from .enums import JobKind, JobStatus
+from .jobs import fail_stale_jobs, stale_cutoff, submit_job
+from .models import InventoryItem, InventoryList, ShoppingList, Job
+from .profiling import capture_path, list_captures
+from .photo_index import find_recent_match, hash_upload, items_digest, record_photo
+from .price_catalog import restock_estimate
+from .pagination import CreatedAtCursorPagination, IdCursorPagination
+from .renderers import EventStreamRenderer, NDJSONRenderer
+from .search import INDEXES, search
+from .telemetry import phase, render_metrics
+from .write_queue import run_write
 from .serializers import (
+    requested_fields,
     InventoryItemSerializer,
     InventoryListSerializer,
+    InventoryListSummarySerializer,
     ShoppingListSerializer,
     CreatePlanSerializer,
     StockListMatchingSerializer,
-    PartyPlanningSerializer
+    PartyPlanningSerializer,
+    JobSerializer
 )
-from .Services.planning_list_gen import send_to_gemini
+from .Services.gemini_client import GeminiAPIError
+from .Services.planning_list_gen import send_to_gemini, stream_plan_items
 
 from .Services.stock_matching_service import match_stock_with_list
 
 from .Services.feastbeast import plan_party_with_inventory
+from .Services.restock_engine import diff_inventory_list, restock_lines
+from .Services.units import fold_name
+
+
+def query_params(request):
+    """DRF ``query_params`` or, for plain Django (async) views, ``GET``."""
+    return getattr(request, "query_params", request.GET)
+
+
+def use_llm_cache(request):
+    """
+    Per-request LLM cache bypass: ``?no_cache=1`` or a
+    ``Cache-Control: no-cache`` header forces a fresh Gemini call.
+    """
+    if query_params(request).get("no_cache") in ("1", "true", "yes"):
+        return False
+    return "no-cache" not in request.headers.get("Cache-Control", "")
+
+
+def wants_async(request):
+    """
+    Opt-in async mode: ``?async=1`` or a ``Prefer: respond-async`` header
+    makes the view answer 202 with a job id instead of waiting on Gemini.
+    """
+    if query_params(request).get("async") in ("1", "true", "yes"):
+        return True
+    return "respond-async" in request.headers.get("Prefer", "")
+
+
+def wants_summary(request):
+    """``?summary=1`` returns lists with an item count instead of nested items."""
+    return request.query_params.get("summary") in ("1", "true", "yes")
+
+
+def detach_upload(image_file):
+    """
+    Copy an upload into memory so it outlives the request that
+    received it (the worker thread reads it after the response is sent).
+    """
+    if not image_file:
+        return None
+    image_file.seek(0)
+    return SimpleUploadedFile(image_file.name, image_file.read(), content_type=image_file.content_type)
+
+
+def job_accepted_response(request, job):
+    poll_url = request.build_absolute_uri(reverse("job-detail", args=[job.pk]))
+    return Response({
+        "message": "Job accepted",
+        "job_id": str(job.pk),
+        "status": job.status,
+        "poll_url": poll_url
+    }, status=status.HTTP_202_ACCEPTED, headers={"Location": poll_url})
+
+
+class QueuedWritesMixin:
+    """Route ModelViewSet writes through the SQLite write queue (api/write_queue.py)."""
+
+    def perform_create(self, serializer):
+        run_write(serializer.save)
+
+    def perform_update(self, serializer):
+        run_write(serializer.save)
+
+    def perform_destroy(self, instance):
+        run_write(instance.delete)
+
 
 # --- Inventory Item CRUD ---
-class InventoryItemViewSet(viewsets.ModelViewSet):
+class InventoryItemViewSet(QueuedWritesMixin, viewsets.ModelViewSet):
     queryset = InventoryItem.objects.all()
     serializer_class = InventoryItemSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = IdCursorPagination
 
 
 # --- Inventory List CRUD ---
-class InventoryListViewSet(viewsets.ModelViewSet):
-    queryset = InventoryList.objects.all()
+class InventoryListViewSet(QueuedWritesMixin, viewsets.ModelViewSet):
+    queryset = InventoryList.objects.prefetch_related('inventory_items')
     serializer_class = InventoryListSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        if self.action == 'list' and wants_summary(self.request):
+            return InventoryList.objects.annotate(item_count=Count('inventory_items'))
+        fields = requested_fields(self.request)
+        if fields is not None and 'inventory_items' not in fields:
+            # Sparse fieldset without nested items: skip the prefetch query
+            return InventoryList.objects.all()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list' and wants_summary(self.request):
+            return InventoryListSummarySerializer
+        return super().get_serializer_class()
 
 
 # --- Shopping List CRUD ---
-class ShoppingListViewSet(viewsets.ModelViewSet):
+class ShoppingListViewSet(QueuedWritesMixin, viewsets.ModelViewSet):
     queryset = ShoppingList.objects.all()
     serializer_class = ShoppingListSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = CreatedAtCursorPagination
 
 
 # --- AI Plan Creation ---
@@ -42,57 +149,216 @@ class CreatePlanView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, *args, **kwargs):
-        serializer = CreatePlanSerializer(data=request.data)
-        if not serializer.is_valid():
+        with phase("parse"):
+            serializer = CreatePlanSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         text_input = serializer.validated_data.get('text')
         image_file = serializer.validated_data.get('image', None)
+        use_cache = use_llm_cache(request)
+
+        if wants_async(request):
+            job = submit_job(JobKind.CREATE_PLAN, create_plan, text_input, detach_upload(image_file), use_cache)
+            return job_accepted_response(request, job)
+
+        body, status_code = create_plan(text_input, image_file, use_cache)
+        return Response(body, status=status_code)
+
 
-        # ✅ Send to Gemini
-        gemini_response = send_to_gemini(image_file, text_input)
+def create_plan(text_input, image_file, use_cache=True):
+    """
+    Generate a plan with Gemini and persist it as an InventoryList.
+    Returns a ``(body, status_code)`` tuple so it can run either inside
+    the request or on the job worker pool.
+    """
+    # ✅ Send to Gemini
+    gemini_response = send_to_gemini(image_file, text_input, use_cache=use_cache)
+    return plan_from_response(text_input, gemini_response)
+
+
+def plan_from_response(text_input, gemini_response):
+    """Validate a Gemini plan and persist it; shared by the sync and async views."""
+    if "error" in gemini_response:
+        return gemini_response, status.HTTP_500_INTERNAL_SERVER_ERROR
 
-        if "error" in gemini_response:
-            return Response(gemini_response, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    shopping_data = gemini_response.get("shopping_list", [])
+    if not shopping_data:
+        return {"error": "No shopping list returned from Gemini"}, status.HTTP_400_BAD_REQUEST
 
-        shopping_data = gemini_response.get("shopping_list", [])
-        if not shopping_data:
-            return Response({"error": "No shopping list returned from Gemini"}, status=status.HTTP_400_BAD_REQUEST)
+    inventory_list, created_items = run_write(persist_plan, text_input, shopping_data)
 
-        # ✅ Create InventoryList
+    return {
+        "message": "Plan created successfully",
+        "inventory_list": {
+            "id": inventory_list.id,
+            "name": inventory_list.name,
+            "purpose": inventory_list.purpose,
+            "created_at": inventory_list.created_at,
+            "items": created_items
+        }
+    }, status.HTTP_201_CREATED
+
+
+def persist_plan(text_input, shopping_data):
+    """Create the InventoryList for a plan and its items in one transaction."""
+    with transaction.atomic():
         inventory_list = InventoryList.objects.create(
             name=text_input[:50],
             purpose=text_input[:150]
         )
+        return inventory_list, save_plan_items(inventory_list, shopping_data)
 
-        created_items = []
-        for item_data in shopping_data:
-            name = item_data.get("item", "").strip()
-            quantity = item_data.get("quantity", "").strip()
-            if not name:
-                continue
 
-            item_obj, _ = InventoryItem.objects.get_or_create(name=name)
-            item_obj.quantity = quantity
-            item_obj.save()
-            inventory_list.inventory_items.add(item_obj)
-            created_items.append({
-                "name": item_obj.name,
-                "quantity": item_obj.quantity
-            })
-
-        inventory_list.save()
-
-        return Response({
-            "message": "Plan created successfully",
-            "inventory_list": {
-                "id": inventory_list.id,
-                "name": inventory_list.name,
-                "purpose": inventory_list.purpose,
-                "created_at": inventory_list.created_at,
-                "items": created_items
-            }
-        }, status=status.HTTP_201_CREATED)
+class CreatePlanStreamView(APIView):
+    """
+    POST /api/create_plan/stream/
+    Same input as create_plan/, but items are sent back (and saved) one by
+    one while Gemini is still writing the list. Server-Sent Events by
+    default, NDJSON with ``Accept: application/x-ndjson``.
+
+    Events: ``list`` (the new list, before its first item), ``item`` per
+    row, then ``done`` with the full plan or ``error``.
+    """
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [EventStreamRenderer, NDJSONRenderer]
+
+    def post(self, request, *args, **kwargs):
+        with phase("parse"):
+            serializer = CreatePlanSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        text_input = serializer.validated_data.get('text')
+        image_file = detach_upload(serializer.validated_data.get('image', None))
+        renderer = request.accepted_renderer
+
+        events = stream_plan(text_input, image_file, use_llm_cache(request))
+        response = StreamingHttpResponse(
+            (renderer.render_event(event, data) for event, data in events),
+            content_type=renderer.media_type,
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # keep reverse proxies from buffering the stream
+        return response
+
+
+def stream_plan(text_input, image_file, use_cache=True):
+    """
+    Streaming counterpart of ``create_plan``: yields ``(event, data)``
+    pairs. The list is created when the first item arrives and each item
+    is saved in its own short transaction, so the database is never
+    locked for the whole generation. A failed stream keeps the items
+    saved so far; one that fails before any item leaves no list behind.
+    """
+    if not settings.GEMINI_API_KEY:
+        yield "error", {"error": "Missing GEMINI_API_KEY in settings"}
+        return
+
+    inventory_list = None
+    created_items = {}
+    try:
+        for row in stream_plan_items(image_file, text_input, use_cache=use_cache):
+            if not str(row.get("item") or "").strip():
+                continue
+            new_list = inventory_list is None
+            with transaction.atomic():
+                if new_list:
+                    inventory_list = InventoryList.objects.create(
+                        name=text_input[:50],
+                        purpose=text_input[:150]
+                    )
+                saved = save_plan_items(inventory_list, [row])
+            if new_list:
+                yield "list", plan_list_data(inventory_list)
+            for item in saved:
+                created_items[item["name"]] = item
+                yield "item", item
+    except GeminiAPIError as e:
+        yield "error", error_data(e.text, inventory_list)
+        return
+    except requests.exceptions.Timeout:
+        yield "error", error_data("Request to Gemini timed out", inventory_list)
+        return
+    except requests.exceptions.RequestException as e:
+        yield "error", error_data(f"Request failed: {str(e)}", inventory_list)
+        return
+
+    if not created_items:
+        yield "error", error_data("No shopping list returned from Gemini", inventory_list)
+        return
+
+    yield "done", {
+        "message": "Plan created successfully",
+        "inventory_list": {**plan_list_data(inventory_list), "items": list(created_items.values())}
+    }
+
+
+def plan_list_data(inventory_list):
+    return {
+        "id": inventory_list.id,
+        "name": inventory_list.name,
+        "purpose": inventory_list.purpose,
+        "created_at": inventory_list.created_at,
+    }
+
+
+def error_data(message, inventory_list=None):
+    data = {"error": message}
+    if inventory_list is not None:
+        data["inventory_list_id"] = inventory_list.id
+    return data
+
+
+def save_plan_items(inventory_list, shopping_data):
+    """
+    Persist Gemini plan rows onto ``inventory_list`` in three queries: one
+    upsert of the items on their unique ``normalized_name`` (new names are
+    inserted, known ones get the new quantity), one bulk insert into the
+    M2M table and one read of the stored names. Names match regardless of
+    case and spacing, and an existing item keeps its spelling, which is
+    also what the returned rows report; if a name repeats, the last
+    quantity wins.
+    """
+    rows = {}
+    for item_data in shopping_data:
+        name = str(item_data.get("item") or "").strip()
+        quantity = str(item_data.get("quantity") or "").strip()
+        if not name:
+            continue
+        rows.setdefault(fold_name(name), [name, quantity])[1] = quantity
+
+    if not rows:
+        return []
+
+    # bulk_create skips save(), so fill the derived fields explicitly
+    items = []
+    for name, quantity in rows.values():
+        item_obj = InventoryItem(name=name, quantity=quantity)
+        item_obj.normalize_name()
+        item_obj.parse_quantity()
+        items.append(item_obj)
+    InventoryItem.objects.bulk_create(
+        items,
+        update_conflicts=True,
+        unique_fields=["normalized_name"],
+        update_fields=["quantity", "amount", "unit"],
+    )
+
+    Membership = InventoryList.inventory_items.through
+    Membership.objects.bulk_create([
+        Membership(inventorylist_id=inventory_list.id, inventoryitem_id=item_obj.id)
+        for item_obj in items
+    ], ignore_conflicts=True)
+
+    # The upsert returns only ids, and a merged item kept its stored spelling
+    stored_names = dict(InventoryItem.objects.filter(pk__in=[item_obj.id for item_obj in items]).values_list("id", "name"))
+    return [
+        {"name": stored_names.get(item_obj.id, item_obj.name), "quantity": item_obj.quantity}
+        for item_obj in items
+    ]
 
 
 # --- GET all lists or items of specific list ---
@@ -100,6 +366,9 @@ class InventoryListItemsView(APIView):
     """
     GET /api/inventory-lists-all/  -> returns all inventory lists
     GET /api/inventory-lists-all/?list_id=3  -> returns all items of a specific list
+    GET /api/inventory-lists-all/?summary=1  -> returns all lists with item counts only
+    GET /api/inventory-lists-all/?page_size=50  -> newest lists first, one cursor page at a time
+                                                   (follow "next"); ?fields=id,name trims fields
     """
     permission_classes = [permissions.AllowAny]
 
@@ -114,7 +383,7 @@ class InventoryListItemsView(APIView):
                 return Response({"error": "List not found"}, status=status.HTTP_404_NOT_FOUND)
 
             items = inventory_list.inventory_items.all()
-            items_data = InventoryItemSerializer(items, many=True).data
+            items_data = InventoryItemSerializer(items, many=True, context={"request": request}).data
 
             return Response({
                 "list_id": inventory_list.id,
@@ -125,13 +394,33 @@ class InventoryListItemsView(APIView):
             }, status=status.HTTP_200_OK)
 
         # Otherwise → return all lists
-        all_lists = InventoryList.objects.all().order_by("-created_at")
-        lists_data = InventoryListSerializer(all_lists, many=True).data
-
-        return Response({
+        if wants_summary(request):
+            all_lists = InventoryList.objects.annotate(item_count=Count("inventory_items")).order_by("-created_at")
+            serializer_class = InventoryListSummarySerializer
+        else:
+            all_lists = InventoryList.objects.order_by("-created_at")
+            fields = requested_fields(request)
+            if fields is None or "inventory_items" in fields:
+                all_lists = all_lists.prefetch_related("inventory_items")
+            serializer_class = InventoryListSerializer
+
+        # Pagination is opt-in here to keep the original response shape for existing clients
+        paginator = None
+        if "cursor" in request.query_params or "page_size" in request.query_params:
+            paginator = CreatedAtCursorPagination()
+            all_lists = paginator.paginate_queryset(all_lists, request, view=self)
+
+        lists_data = serializer_class(all_lists, many=True, context={"request": request}).data
+
+        body = {
             "count": len(lists_data),
             "inventory_lists": lists_data
-        }, status=status.HTTP_200_OK)
+        }
+        if paginator is not None:
+            body["next"] = paginator.get_next_link()
+            body["previous"] = paginator.get_previous_link()
+
+        return Response(body, status=status.HTTP_200_OK)
 
 
 
@@ -150,8 +439,10 @@ class StockMatchingView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, *args, **kwargs):
-        serializer = StockListMatchingSerializer(data=request.data)
-        if not serializer.is_valid():
+        with phase("parse"):
+            serializer = StockListMatchingSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         image_file = serializer.validated_data.get('image', None)
@@ -189,31 +480,97 @@ class StockMatchingView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Send to Gemini for stock matching
-        gemini_response = match_stock_with_list(
-            image_file=image_file,
-            list_id=list_id,
-            inventory_list_items=items_data
-        )
-
-        if "error" in gemini_response:
-            return Response(
-                gemini_response,
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        use_cache = use_llm_cache(request)
+        if wants_async(request):
+            job = submit_job(
+                JobKind.STOCK_MATCHING, match_stock,
+                detach_upload(image_file), list_id, inventory_list.name, items_data, use_cache
             )
+            return job_accepted_response(request, job)
+
+        body, status_code = match_stock(image_file, list_id, inventory_list.name, items_data, use_cache)
+        return Response(body, status=status_code)
+
+
+def match_stock(image_file, list_id, list_name, items_data, use_cache=True):
+    """
+    Run stock matching for an already validated list: Gemini lists what
+    the photo shows, the missing/low diff against the list is computed
+    locally. Returns a ``(body, status_code)`` tuple (see ``create_plan``).
+
+    A photo that is a near duplicate (by perceptual hash) of a recent photo
+    for the same, unchanged list reuses that photo's result instead of
+    calling Gemini again, unless the cache is bypassed.
+    """
+    photo_hash, digest = stock_photo_key(image_file, items_data)
+
+    if use_cache:
+        reused = reused_match(list_id, list_name, photo_hash, digest)
+        if reused is not None:
+            return reused, status.HTTP_200_OK
+
+    # Send to Gemini for stock matching
+    gemini_response = match_stock_with_list(
+        image_file=image_file,
+        list_id=list_id,
+        inventory_list_items=items_data,
+        use_cache=use_cache
+    )
+    return stock_match_from_response(list_id, list_name, gemini_response, photo_hash, digest)
+
+
+def stock_photo_key(image_file, items_data):
+    """Perceptual hash of the photo (None if undecodable) and the list digest."""
+    try:
+        with phase("hash"):
+            photo_hash = hash_upload(image_file)
+    except (UnidentifiedImageError, OSError):
+        photo_hash = None
+    return photo_hash, items_digest(items_data)
+
+
+def reused_match(list_id, list_name, photo_hash, digest):
+    """Body of a recent near-duplicate photo's result, or None."""
+    if photo_hash is None:
+        return None
+    previous = find_recent_match(list_id, photo_hash, digest)
+    if previous is None:
+        return None
+    return stock_matching_body(
+        list_id, list_name, previous.restock_list, previous.cheapest_info, deduplicated=True
+    )
+
+
+def stock_match_from_response(list_id, list_name, gemini_response, photo_hash, digest):
+    """
+    Diff the stock Gemini saw against the list (``restock_engine``), price
+    the shortfall from the catalog, and remember the photo. Returns
+    ``(body, status_code)``.
+    """
+    if "error" in gemini_response:
+        return gemini_response, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    with phase("restock"):
+        restock_list = restock_lines(diff_inventory_list(list_id, gemini_response["stock_items"]))
+        cheapest_info = restock_estimate(restock_list)
+
+    if photo_hash is not None:
+        record_photo(list_id, photo_hash, digest, restock_list, cheapest_info)
+
+    return stock_matching_body(list_id, list_name, restock_list, cheapest_info), status.HTTP_200_OK
 
-        # Validate response structure
-        restock_list = gemini_response.get("restock_list", [])
-        cheapest_info = gemini_response.get("cheapest_info", {})
 
-        return Response({
-            "message": "Stock matching completed successfully",
-            "list_id": list_id,
-            "list_name": inventory_list.name,
-            "restock_list": restock_list,
-            "cheapest_info": cheapest_info,
-            "total_missing_items": len(restock_list)
-        }, status=status.HTTP_200_OK)
+def stock_matching_body(list_id, list_name, restock_list, cheapest_info, deduplicated=False):
+    return {
+        "message": "Stock matching completed successfully",
+        "list_id": list_id,
+        "list_name": list_name,
+        "restock_list": restock_list,
+        "cheapest_info": cheapest_info,
+        "total_missing_items": len(restock_list),
+        "deduplicated": deduplicated
+    }
+
 
 class PartyPlanningView(APIView):
     """
@@ -227,8 +584,10 @@ class PartyPlanningView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request, *args, **kwargs):
-        serializer = PartyPlanningSerializer(data=request.data)
-        if not serializer.is_valid():
+        with phase("parse"):
+            serializer = PartyPlanningSerializer(data=request.data)
+            valid = serializer.is_valid()
+        if not valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         list_id = serializer.validated_data.get("list_id")
@@ -251,17 +610,134 @@ class PartyPlanningView(APIView):
         gemini_response = plan_party_with_inventory(
             list_id=list_id,
             party_prompt=party_prompt,
-            inventory_list_items=items_data
+            inventory_list_items=items_data,
+            use_cache=use_llm_cache(request)
         )
 
-        if "error" in gemini_response:
-            return Response(gemini_response, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        return Response({
-            "message": "Party planning completed successfully",
-            "list_id": list_id,
-            "list_name": inventory_list.name,
-            "party_shopping_list": gemini_response.get("party_shopping_list", []),
-            "cheapest_info": gemini_response.get("cheapest_info", {}),
-            "total_missing_items": len(gemini_response.get("party_shopping_list", []))
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        body, status_code = party_plan_from_response(list_id, inventory_list.name, gemini_response)
+        return Response(body, status=status_code)
+
+
+def party_plan_from_response(list_id, list_name, gemini_response):
+    if "error" in gemini_response:
+        return gemini_response, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    return {
+        "message": "Party planning completed successfully",
+        "list_id": list_id,
+        "list_name": list_name,
+        "party_shopping_list": gemini_response.get("party_shopping_list", []),
+        "cheapest_info": gemini_response.get("cheapest_info", {}),
+        "total_missing_items": len(gemini_response.get("party_shopping_list", []))
+    }, status.HTTP_200_OK
+
+
+# --- Async job polling ---
+class JobDetailView(APIView):
+    """
+    GET /api/jobs/<job_id>/
+    Returns the status of an async create_plan / stock-matching job and,
+    once finished, its result and the HTTP status the sync call would have had.
+    Unfinished jobs older than ``API_JOB_TIMEOUT`` are reported as failed.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, job_id, *args, **kwargs):
+        try:
+            job = Job.objects.get(pk=job_id)
+        except Job.DoesNotExist:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Only a job that is already past the timeout costs a write; polls of live jobs stay reads
+        unfinished = job.status in (JobStatus.PENDING, JobStatus.RUNNING)
+        if unfinished and job.created_at < stale_cutoff() and fail_stale_jobs(Job.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+# --- Item search / autocomplete ---
+class SearchView(APIView):
+    """
+    GET /api/search/?q=tom  -> inventory items and shopping list rows matching "tom"
+    GET /api/search/?q=tomatos&type=items&limit=5  -> one kind only, typo-tolerant
+    GET /api/search/?q=tom&fuzzy=0  -> substring matches only
+
+    ``q`` is matched as a substring of item names (and inventory item
+    brands), best matches first; see ``api/search.py``. ``limit``
+    defaults to ``SEARCH_DEFAULT_LIMIT`` and is capped at ``SEARCH_MAX_LIMIT``.
+    """
+    permission_classes = [permissions.AllowAny]
+    serializers = {"items": InventoryItemSerializer, "shopping_lists": ShoppingListSerializer}
+
+    def get(self, request, *args, **kwargs):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        kind = request.query_params.get("type")
+        if kind is not None and kind not in INDEXES:
+            return Response(
+                {"error": f"type must be one of {', '.join(INDEXES)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get("limit", settings.SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.SEARCH_MAX_LIMIT))
+        fuzzy = request.query_params.get("fuzzy") not in ("0", "false", "no")
+
+        body = {"query": text}
+        for name in [kind] if kind else INDEXES:
+            rows = search(name, text, limit, fuzzy)
+            body[name] = self.serializers[name](rows, many=True, context={"request": request}).data
+        return Response(body, status=status.HTTP_200_OK)
+
+
+# --- Profiler captures ---
+class ProfileCaptureListView(APIView):
+    """
+    GET /api/profiles/
+    Lists recent cProfile captures of requests sent with a profiling
+    token (newest first). Admin only.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        captures = [
+            {**capture, "url": request.build_absolute_uri(reverse("profile-detail", args=[capture["name"]]))}
+            for capture in list_captures()
+        ]
+        return Response(captures, status=status.HTTP_200_OK)
+
+
+class ProfileCaptureDetailView(APIView):
+    """
+    GET /api/profiles/<name>/
+    Downloads one capture (pstats format: ``snakeviz <file>``). Admin only.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, name, *args, **kwargs):
+        path = capture_path(name)
+        if path is None:
+            return Response({"error": "Capture not found"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(path.open("rb"), as_attachment=True, filename=name)
+
+
+# --- Metrics ---
+def metrics(request):
+    """
+    GET /metrics
+    Request and Gemini histograms and counters in the Prometheus text
+    format, for scrapers on ``METRICS_ALLOWED_IPS`` only that also send
+    ``METRICS_TOKEN`` as a bearer token when one is configured.
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,134 @@
+# api/write_queue.py
+"""
+In-process write serialization for SQLite.
+
+SQLite has one writer at a time. With many request threads each
+committing a small transaction, most of the time goes on taking and
+handing over the write lock and on the commit itself. With
+``SQLITE_WRITE_QUEUE`` on, ``run_write(fn, ...)`` hands ``fn`` to a
+single writer thread instead. That thread runs up to
+``SQLITE_WRITE_BATCH`` queued writes in one transaction, waiting
+``SQLITE_WRITE_BATCH_WAIT`` seconds for more to arrive. Each write gets
+its own savepoint, so one failing write does not undo the others. The
+caller blocks until the batch has committed and then gets ``fn``'s
+result or exception. If the batch transaction cannot be opened or
+committed, every write in it fails with that error. A caller waits at
+most ``SQLITE_WRITE_TIMEOUT`` seconds; a write still queued by then is
+cancelled.
+
+Calls made inside a transaction run inline, because the writer would
+wait on the caller's lock. With the queue off, every call runs inline.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    def __init__(self, max_batch=None, max_wait=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.counters = {"writes": 0, "batches": 0, "failed_writes": 0, "failed_batches": 0}
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)``; returns a ``Future`` resolved after its batch commits."""
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        self._ensure_worker()
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        if connection.in_atomic_block or threading.current_thread() is self._thread:
+            return fn(*args, **kwargs)
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=settings.SQLITE_WRITE_TIMEOUT)
+        except TimeoutError:
+            future.cancel()  # only takes effect while it is still queued
+            raise
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        max_batch = self.max_batch or settings.SQLITE_WRITE_BATCH
+        max_wait = self.max_wait if self.max_wait is not None else settings.SQLITE_WRITE_BATCH_WAIT
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _count(self, **increments):
+        with self._counters_lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                close_old_connections()  # honours CONN_MAX_AGE / health checks between batches
+                self._run_batch(batch)
+            except Exception as e:  # never leave a caller waiting on a batch that died
+                logger.exception("SQLite writer failed on a batch of %d", len(batch))
+                self._fail_pending(batch, e)
+
+    def _fail_pending(self, batch, error):
+        for future, _, _, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run_batch(self, batch):
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, fn, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:  # BEGIN or COMMIT failed: nothing in the batch was written
+            logger.exception("SQLite write batch of %d failed", len(batch))
+            self._count(failed_batches=1)
+            self._fail_pending(batch, e)
+            return
+
+        failed = sum(error is not None for _, _, error in outcomes)
+        self._count(batches=1, writes=len(outcomes), failed_writes=failed)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+write_queue = WriteQueue()
+
+
+def run_write(fn, *args, **kwargs):
+    """Run a write through the queue when ``SQLITE_WRITE_QUEUE`` is on, else inline."""
+    if not settings.SQLITE_WRITE_QUEUE:
+        return fn(*args, **kwargs)
+    return write_queue.run(fn, *args, **kwargs)
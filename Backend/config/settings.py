@@ -36,6 +36,87 @@ ALLOWED_HOSTS = []
 
 GEMINI_API_KEY = env("GEMINI_API_KEY", default=None)
 
+# Shared pooled Gemini client (api/Services/gemini_client.py)
+GEMINI_API_BASE_URL = env("GEMINI_API_BASE_URL", default="https://generativelanguage.googleapis.com/v1beta")
+GEMINI_CONNECT_TIMEOUT = env.float("GEMINI_CONNECT_TIMEOUT", default=5.0)
+GEMINI_READ_TIMEOUT = env.float("GEMINI_READ_TIMEOUT", default=90.0)
+GEMINI_POOL_MAXSIZE = env.int("GEMINI_POOL_MAXSIZE", default=10)
+GEMINI_ASYNC_MAX_CONNECTIONS = env.int("GEMINI_ASYNC_MAX_CONNECTIONS", default=200)  # per event loop (api/async_views.py)
+
+# Outbound limits, retries and circuit breaker for Gemini (api/Services/outbound.py)
+GEMINI_MAX_CONCURRENCY = env.int("GEMINI_MAX_CONCURRENCY", default=10)  # per model and process; async calls use GEMINI_ASYNC_MAX_CONNECTIONS
+GEMINI_MODEL_CONCURRENCY = env.dict("GEMINI_MODEL_CONCURRENCY", cast={"value": int}, default={})  # e.g. gemini-2.0-flash=16;gemini-2.5-pro=4
+GEMINI_QUEUE_TIMEOUT = env.float("GEMINI_QUEUE_TIMEOUT", default=5.0)  # max wait for a free slot
+GEMINI_MAX_ATTEMPTS = env.int("GEMINI_MAX_ATTEMPTS", default=3)
+GEMINI_RETRY_BASE_DELAY = env.float("GEMINI_RETRY_BASE_DELAY", default=0.5)
+GEMINI_RETRY_MAX_DELAY = env.float("GEMINI_RETRY_MAX_DELAY", default=8.0)
+GEMINI_REQUEST_DEADLINE = env.float("GEMINI_REQUEST_DEADLINE", default=120.0)  # all attempts together
+GEMINI_BREAKER_THRESHOLD = env.int("GEMINI_BREAKER_THRESHOLD", default=5)  # consecutive failures
+GEMINI_BREAKER_RESET = env.float("GEMINI_BREAKER_RESET", default=30.0)  # seconds open before a probe
+
+# Latency-based model routing and hedged requests (api/Services/routing.py)
+GEMINI_ROUTING = env.bool("GEMINI_ROUTING", default=True)
+GEMINI_ROUTES = {  # endpoint -> candidate models, most preferred first
+    "create_plan": ["gemini-2.0-flash", "gemini-2.0-flash-lite"],
+    "plan_party": ["gemini-2.0-flash", "gemini-2.0-flash-lite"],
+    "stock_matching": ["gemini-2.0-flash", "gemini-2.0-flash-lite"],
+    "describe_image": ["gemini-2.5-flash", "gemini-2.0-flash"],
+    "price_search": ["gemini-2.5-flash", "gemini-2.0-flash"],
+}
+GEMINI_ROUTE_BUDGET = env.float("GEMINI_ROUTE_BUDGET", default=20.0)  # p90 seconds before falling back
+GEMINI_ROUTE_LARGE_INPUT = env.int("GEMINI_ROUTE_LARGE_INPUT", default=20_000)  # chars of text + base64 image
+GEMINI_ROUTE_MIN_SAMPLES = env.int("GEMINI_ROUTE_MIN_SAMPLES", default=20)
+GEMINI_LATENCY_WINDOW = env.float("GEMINI_LATENCY_WINDOW", default=300.0)  # seconds of samples kept
+GEMINI_HEDGING = env.bool("GEMINI_HEDGING", default=False)
+GEMINI_HEDGE_PERCENTILE = env.float("GEMINI_HEDGE_PERCENTILE", default=90.0)
+
+# Image preprocessing before upload (api/Services/image_preprocess.py)
+GEMINI_IMAGE_PREPROCESS = env.bool("GEMINI_IMAGE_PREPROCESS", default=True)
+GEMINI_IMAGE_MAX_EDGE = env.int("GEMINI_IMAGE_MAX_EDGE", default=1536)
+GEMINI_IMAGE_FORMAT = env("GEMINI_IMAGE_FORMAT", default="JPEG")  # JPEG or WEBP
+GEMINI_IMAGE_QUALITY = env.int("GEMINI_IMAGE_QUALITY", default=85)
+
+# How inventory lists are written into prompts (api/Services/prompt_encoding.py)
+GEMINI_INVENTORY_ENCODING = env("GEMINI_INVENTORY_ENCODING", default="table")  # table, lines or json
+
+# Content-addressed LLM response cache (api/Services/llm_cache.py)
+LLM_CACHE_ENABLED = env.bool("LLM_CACHE_ENABLED", default=True)
+LLM_CACHE_MAX_ENTRIES = env.int("LLM_CACHE_MAX_ENTRIES", default=512)
+LLM_CACHE_TTL = env.int("LLM_CACHE_TTL", default=60 * 60 * 24)
+LLM_CACHE_PATH = env("LLM_CACHE_PATH", default=str(BASE_DIR / "llm_cache.sqlite3"))
+LLM_SINGLE_FLIGHT = env.bool("LLM_SINGLE_FLIGHT", default=True)  # coalesce identical in-flight calls (api/Services/single_flight.py)
+
+# Near-duplicate stock photo reuse (api/photo_index.py)
+STOCK_PHOTO_DEDUP_WINDOW = env.int("STOCK_PHOTO_DEDUP_WINDOW", default=30 * 60)  # seconds
+STOCK_PHOTO_DEDUP_DISTANCE = env.int("STOCK_PHOTO_DEDUP_DISTANCE", default=6)  # of 64 bits
+STOCK_PHOTO_INDEX_MAX_LISTS = env.int("STOCK_PHOTO_INDEX_MAX_LISTS", default=1000)  # in-process indexes kept per worker
+
+# Store price catalog fed by bestBuy.py (api/price_catalog.py)
+PRICE_CATALOG_TTL = env.int("PRICE_CATALOG_TTL", default=3 * 24 * 60 * 60)  # seconds
+
+# Item search / autocomplete (/api/search/, api/search.py)
+SEARCH_DEFAULT_LIMIT = env.int("SEARCH_DEFAULT_LIMIT", default=10)
+SEARCH_MAX_LIMIT = env.int("SEARCH_MAX_LIMIT", default=50)
+SEARCH_FUZZY_MIN_SIMILARITY = env.float("SEARCH_FUZZY_MIN_SIMILARITY", default=0.5)  # share of the query's trigrams
+SEARCH_CANDIDATES = env.int("SEARCH_CANDIDATES", default=200)  # FTS matches ranked per substring/fuzzy step
+
+# Local Prometheus scrape endpoint (/metrics, api/telemetry.py)
+# The IP check sees the direct peer (REMOTE_ADDR). Behind a reverse proxy on the same host every
+# request comes from 127.0.0.1, so either block /metrics at the proxy or set METRICS_TOKEN; when
+# set, scrapers must also send "Authorization: Bearer <token>".
+METRICS_ALLOWED_IPS = env.list("METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"])
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# Opt-in cProfile capture of single requests (api/profiling.py)
+PROFILE_DIR = env("PROFILE_DIR", default=str(BASE_DIR / "profiles"))  # not under MEDIA_ROOT: media is served publicly
+PROFILE_KEEP = env.int("PROFILE_KEEP", default=50)  # newest captures kept
+PROFILE_TOKEN_MAX_AGE = env.int("PROFILE_TOKEN_MAX_AGE", default=60 * 60)  # seconds
+
+# Async job mode for create_plan / stock-matching (api/jobs.py)
+API_JOB_WORKERS = env.int("API_JOB_WORKERS", default=4)
+API_JOBS_EAGER = env.bool("API_JOBS_EAGER", default=False)
+API_JOB_TIMEOUT = env.int("API_JOB_TIMEOUT", default=900)  # seconds before an unfinished job counts as lost
+
 
 # Application definition
 
@@ -52,6 +133,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.TimingMiddleware',  # first, so its total covers everything below
+    'api.middleware.ProfilingMiddleware',
      'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,10 +168,30 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuning applied on every new connection (api/sqlite_tuning.py)
+SQLITE_TUNING = env.bool("SQLITE_TUNING", default=True)
+SQLITE_PRAGMAS = {
+    "journal_mode": env("SQLITE_JOURNAL_MODE", default="WAL"),  # readers no longer block the writer
+    "synchronous": env("SQLITE_SYNCHRONOUS", default="NORMAL"),  # safe with WAL; fsync on checkpoint only
+    "busy_timeout": env.int("SQLITE_BUSY_TIMEOUT", default=5000),  # ms to wait for the write lock
+    "cache_size": env.int("SQLITE_CACHE_SIZE", default=-64_000),  # negative = KiB, per connection
+    "mmap_size": env.int("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),  # bytes
+    "temp_store": "MEMORY",
+}
+SQLITE_WRITE_QUEUE = env.bool("SQLITE_WRITE_QUEUE", default=False)  # serialize writes on one thread (api/write_queue.py)
+SQLITE_WRITE_BATCH = env.int("SQLITE_WRITE_BATCH", default=32)  # writes per transaction, at most
+SQLITE_WRITE_BATCH_WAIT = env.float("SQLITE_WRITE_BATCH_WAIT", default=0.002)  # seconds to wait for more writes
+SQLITE_WRITE_TIMEOUT = env.float("SQLITE_WRITE_TIMEOUT", default=30.0)  # seconds a caller waits for its batch
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': env.int("DB_CONN_MAX_AGE", default=600),  # seconds; 0 reconnects per request
+        'CONN_HEALTH_CHECKS': True,
+        # BEGIN IMMEDIATE takes the write lock up front, so busy_timeout applies instead of
+        # an immediate "database is locked" when two read-then-write transactions collide
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if SQLITE_TUNING else {},
     }
 }
 
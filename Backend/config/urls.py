@@ -20,9 +20,12 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 
+from api.views import metrics
+
 
 urlpatterns = [
 path("admin/", admin.site.urls),
 path("api/", include('api.urls')),
 path("api-auth/", include("rest_framework.urls")), 
+path("metrics", metrics, name="metrics"),
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file